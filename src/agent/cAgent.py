@@ -1,36 +1,89 @@
+import time
+
+import numpy as np
 import torch
 import torch.optim as optim
+from agent.cReplayBuffer import ReplayBuffer
+from model.cFeatureSchema import FEATURE_SCHEMA
 from model.cModel import NeuralNetwork
-from utils.preprocessing import prepare_input
+from utils.cMetrics import Metrics
 
 
 class Agent:
-    def __init__(self, input_size: int, hidden_size: int, output_size: int, learning_rate: float) -> None:
+    def __init__(self, hidden_size: int, output_size: int, learning_rate: float, input_size: int = FEATURE_SCHEMA.size,
+                 num_threads: int = None, buffer_capacity: int = 100000, batch_size: int = 256,
+                 num_updates: int = 1, prioritized: bool = False) -> None:
+        if input_size != FEATURE_SCHEMA.size:
+            raise ValueError(
+                f"input_size {input_size} does not match the feature schema ({FEATURE_SCHEMA.size} features)")
         self.model = NeuralNetwork(input_size, hidden_size, output_size)
         self.optimizer = optim.Adam(self.model.parameters(), lr=learning_rate)
 
-    def train(self, data: dict, rewards: dict) -> None:
+        # Rows of every game played so far, trained on by minibatches of batch_size
+        self.replay_buffer = ReplayBuffer(buffer_capacity, input_size)
+        self.batch_size = batch_size
+        self.num_updates = num_updates
+        self.prioritized = prioritized
+
+        # Module used by predict, the model itself or its TorchScript version (same parameters)
+        self.inference_model = self.model
+        if num_threads is not None:
+            torch.set_num_threads(num_threads)
+
+    def compile(self) -> None:
+        # The scripted module shares the parameters of self.model, so training keeps it up to date
+        self.inference_model = torch.jit.script(self.model)
 
-        output = self.model(prepare_input(data))
+    def predict(self, features) -> np.ndarray:
+        # One forward pass without autograd over a (batch, input_size) array of pending decisions
+        inputs = torch.as_tensor(np.asarray(features, dtype=np.float32))
+        with torch.no_grad():
+            return self.inference_model(inputs).numpy()
 
-        round_rewards = torch.tensor(
-            rewards['round_rewards'], dtype=torch.float)
-        game_rewards = torch.tensor(
-            rewards['game_rewards'], dtype=torch.float)
+    def train(self, features: torch.tensor, targets: torch.tensor) -> None:
+        # Timed only when the metrics are enabled
+        metrics = Metrics.active
+        if metrics is None:
+            self.update(features, targets)
+            return
 
-        loss = self.calculate_loss(output, round_rewards, game_rewards)
+        start = time.perf_counter_ns()
+        self.update(features, targets)
+        metrics.add_time('train', time.perf_counter_ns() - start)
 
-        self.optimizer.zero_grad()
-        loss.backward()
-        self.optimizer.step()
+    def update(self, features: torch.tensor, targets: torch.tensor) -> None:
 
-    def prepare_input(self, preprocessed_data: dict) -> torch.tensor:
-        input_data = preprocessed_data
+        self.replay_buffer.append(features, targets)
+        # A hand can end without any action (every other player busted or folded)
+        if len(self.replay_buffer) == 0:
+            return
 
-        return input_data
+        for _ in range(self.num_updates):
+            features, targets, indices, weights = self.replay_buffer.sample(
+                self.batch_size, self.prioritized)
+
+            output = self.model(features)
+            if weights is None:
+                loss = self.calculate_loss(
+                    output, targets[:, :1], targets[:, 1:])
+            else:
+                errors = self.calculate_errors(
+                    output, targets[:, :1], targets[:, 1:])
+                self.replay_buffer.update_priorities(
+                    indices, errors.detach() + 1e-6)
+                loss = torch.mean(weights * errors)
+
+            self.optimizer.zero_grad()
+            loss.backward()
+            self.optimizer.step()
 
     def calculate_loss(self, output: torch.tensor, round_rewards: torch.tensor, game_rewards: torch.tensor) -> torch.tensor:
         # Calculez la perte entre les prédictions du modèle et les récompenses réelles
         loss = torch.mean((output - round_rewards) ** 2 +
                           (output - game_rewards) ** 2)
         return loss
+
+    def calculate_errors(self, output: torch.tensor, round_rewards: torch.tensor, game_rewards: torch.tensor) -> torch.tensor:
+        # Same error as calculate_loss, kept per row for prioritized sampling
+        return torch.mean((output - round_rewards) ** 2 +
+                          (output - game_rewards) ** 2, dim=1)
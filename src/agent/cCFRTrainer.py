@@ -0,0 +1,686 @@
+# Description: This file contains the class CFRTrainer which learns a strategy by Monte Carlo counterfactual regret minimization.
+# Author: Maxime Cornaton
+# Date: 2023
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+
+import numpy as np
+
+from environment.cHandIndexer import HandIndexer
+from environment.cPokerGame import PokerGame
+from environment.cShowdown import Showdown
+from environment.eGameType import GameType
+from environment.ePlayerAction import PlayerAction
+from utils.cMetrics import Metrics
+
+CHECKPOINT_PATH = "data/cfr/checkpoint.npz"
+
+# Actions of the infosets, indexed like the action masks of PokerGame
+ACTIONS = list(PlayerAction)
+NUM_ACTIONS = len(ACTIONS)
+
+SAMPLINGS = ('external', 'outcome')
+
+
+class CFRTrainer:
+
+    """
+    _summary_ : Class used to learn a strategy by Monte Carlo counterfactual regret minimization.
+    _description_ : This class is used to run MCCFR on hands of a PokerGame : the legal actions, the amounts
+        and the end of each betting round come from the game itself (get_action_mask, apply_action), its state
+        being saved and restored around each explored action, and the pot is shared by Showdown.
+        Each iteration deals one hand per player and traverses it for that player. With external sampling
+        every action of the traverser is explored and one action of the other players is sampled ; with
+        outcome sampling a single path is sampled, the traverser exploring with probability epsilon.
+        An action of the infosets is one of the 6 actions of PokerGame, a BET or a RAISE putting bet_fraction
+        of the pot on top of the call. FOLD is left out when CHECK is legal.
+        An infoset is keyed by bytes : the card bucket of the player on the street, then the actions of the hand
+        so far (the game being deterministic, they also give the street and the player to act). The card bucket
+        is the bucket of card_abstraction when given, else the exact index of the hand up to suits (see
+        HandIndexer), only practical for small games. Each key is given a row of two float32 arrays, the
+        regrets and the sums of the strategies, grown by doubling : an infoset costs 48 bytes of table and
+        its key in the index.
+        Iterations can be run by several processes : each one runs a batch of iterations from the same copy
+        of the tables, and the changes of the rows are added to the tables after each batch.
+    _attributes_ :
+        - num_players : Number of players.
+        - small_blind : Small blind amount.
+        - big_blind : Big blind amount.
+        - max_rounds : Maximum number of rounds.
+        - chips : Stack of every player at the start of a hand.
+        - game_type : Variant played (see GameType).
+        - sampling : 'external' or 'outcome'.
+        - bet_fraction : Fraction of the pot of a BET or a RAISE, after calling.
+        - epsilon : Exploration of the traverser, in outcome sampling.
+        - card_abstraction : CardAbstraction giving the buckets, None for the exact indexes.
+        - seed : Seed of the deals and of the sampled actions.
+    _returns_ : None
+    """
+
+    def __init__(self, num_players: int, small_blind: int, big_blind: int, max_rounds: int, chips: int = 1000,
+                 game_type: str = GameType.TEXAS_HOLDEM.value, sampling: str = 'external', bet_fraction: float = 1.0,
+                 epsilon: float = 0.6, card_abstraction=None, seed=None) -> None:
+        if sampling not in SAMPLINGS:
+            raise ValueError(f"Unknown sampling {sampling}, expected one of {SAMPLINGS}")
+        if card_abstraction is not None and GameType(game_type) is not GameType.TEXAS_HOLDEM:
+            raise ValueError("The card abstraction only has buckets for Texas Hold'em")
+        self.config = {
+            'num_players': num_players,
+            'small_blind': small_blind,
+            'big_blind': big_blind,
+            'max_rounds': max_rounds,
+            'chips': chips,
+            'game_type': game_type,
+            'sampling': sampling,
+            'bet_fraction': bet_fraction,
+            'epsilon': epsilon,
+            'card_abstraction': card_abstraction is not None,
+        }
+        self.chips = chips
+        self.sampling = sampling
+        self.bet_fraction = bet_fraction
+        self.epsilon = epsilon
+        self.card_abstraction = card_abstraction
+
+        # Seeds of the deals, of the actions, then of the workers
+        self.seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        game_seed, action_seed = self.seed_sequence.spawn(2)
+        self.game = PokerGame(num_players=num_players, small_blind=small_blind, big_blind=big_blind,
+                              max_rounds=max_rounds, seed=game_seed, game_type=game_type)
+        self.game.init(agent=None)
+        self.rng = np.random.default_rng(action_seed)
+
+        # Key to row of the tables
+        self.infosets = {}
+        self.regrets = np.zeros((1024, NUM_ACTIONS), dtype=np.float32)
+        self.strategy_sums = np.zeros((1024, NUM_ACTIONS), dtype=np.float32)
+
+        self.iteration = 0
+        self.nodes = 0
+        self.elapsed = 0.0
+        self.iterations_done = 0
+
+    """
+    _summary_ : Get the number of infosets.
+    _description_ : This method is used to count the infosets seen so far.
+    _attributes_ : None
+    _returns_ : Number of infosets.
+    """
+
+    @property
+    def num_infosets(self) -> int:
+        return len(self.infosets)
+
+    """
+    _summary_ : Get the row of an infoset.
+    _description_ : This method is used to find the row of an infoset, a new row being given to a new key.
+    _attributes_ :
+        - key : Key of the infoset.
+    _returns_ : Row of the tables.
+    """
+
+    def row(self, key: bytes) -> int:
+        row = self.infosets.get(key)
+        if row is None:
+            row = len(self.infosets)
+            if row == len(self.regrets):
+                self.regrets = np.concatenate((self.regrets, np.zeros_like(self.regrets)))
+                self.strategy_sums = np.concatenate((self.strategy_sums, np.zeros_like(self.strategy_sums)))
+            self.infosets[key] = row
+        return row
+
+    """
+    _summary_ : Get the current strategy of an infoset.
+    _description_ : This method is used to match the regrets : each legal action is played in proportion to
+        its positive regret, uniformly when none is positive.
+    _attributes_ :
+        - row : Row of the infoset.
+        - legal : Legal actions (list of booleans).
+    _returns_ : List of NUM_ACTIONS probabilities.
+    """
+
+    def current_strategy(self, row: int, legal: list) -> list:
+        positive = [regret if regret > 0 and is_legal else 0.0
+                    for regret, is_legal in zip(self.regrets[row].tolist(), legal)]
+        total = sum(positive)
+        if total > 0:
+            return [regret / total for regret in positive]
+        num_legal = sum(legal)
+        return [1.0 / num_legal if is_legal else 0.0 for is_legal in legal]
+
+    """
+    _summary_ : Get the average strategy of an infoset.
+    _description_ : This method is used to get the strategy learnt for an infoset, the average of its
+        strategies over the iterations. It is the strategy that converges.
+    _attributes_ :
+        - key : Key of the infoset.
+    _returns_ : Array of NUM_ACTIONS probabilities, None for an infoset never seen.
+    """
+
+    def average_strategy(self, key: bytes) -> np.ndarray:
+        row = self.infosets.get(key)
+        if row is None:
+            return None
+        sums = self.strategy_sums[row].astype(np.float64)
+        total = sums.sum()
+        if total <= 0:
+            return np.full(NUM_ACTIONS, 1.0 / NUM_ACTIONS)
+        return sums / total
+
+    """
+    _summary_ : Sample an action.
+    _description_ : This method is used to draw an action from a strategy.
+    _attributes_ :
+        - probabilities : List of NUM_ACTIONS probabilities.
+    _returns_ : Index of the action.
+    """
+
+    def sample(self, probabilities: list) -> int:
+        threshold = self.rng.random()
+        last = 0
+        for action, probability in enumerate(probabilities):
+            if probability > 0:
+                last = action
+                threshold -= probability
+                if threshold < 0:
+                    return action
+        # Rounding left the threshold above the total
+        return last
+
+    """
+    _summary_ : Deal a hand.
+    _description_ : This method is used to deal a hand on the game with full stacks, the whole board being
+        turned over at once (the infosets only see the cards of their street), to compute the strength of
+        each hand at showdown and the card key of each player on each street.
+    _attributes_ : None
+    _returns_ : None
+    """
+
+    def deal(self) -> None:
+        game = self.game
+        game.reset()
+        for player in game.players:
+            player.chips = self.chips
+        game.deal_cards()
+
+        board_sizes = [0]
+        for round_num in range(1, game.max_rounds):
+            game.deal_community_cards(min(3 if round_num == 1 else 1, 5 - len(game.community_cards)))
+            board_sizes.append(len(game.community_cards))
+        self.strengths = game.get_strengths()
+
+        self.card_keys = []
+        for player in game.players:
+            keys = []
+            for board_size in board_sizes:
+                board = game.community_cards[:board_size]
+                if self.card_abstraction is not None:
+                    bucket, size = self.card_abstraction.bucket(player.hand, board), 1 << 16
+                else:
+                    hand_indexer = HandIndexer.get([len(player.hand), board_size] if board_size else [len(player.hand)])
+                    bucket = hand_indexer.index([player.hand, board] if board_size else [player.hand])
+                    size = hand_indexer.size
+                keys.append(bucket.to_bytes(((size - 1).bit_length() + 7) // 8, 'little'))
+            self.card_keys.append(keys)
+
+    """
+    _summary_ : Save the state of the hand.
+    _description_ : This method is used to copy what an action changes in the game, to explore another action after it.
+    _attributes_ : None
+    _returns_ : State of the hand.
+    """
+
+    def save_state(self) -> tuple:
+        game = self.game
+        return (game.pot, game.bets[:], game.folded[:], game.all_in[:], game.acted[:], game.current_bet,
+                game.min_raise, game.num_live, game.num_active, [player.chips for player in game.players])
+
+    def restore_state(self, state: tuple) -> None:
+        game = self.game
+        (game.pot, bets, folded, all_in, acted, game.current_bet, game.min_raise,
+         game.num_live, game.num_active, chips) = state
+        game.bets[:] = bets
+        game.folded[:] = folded
+        game.all_in[:] = all_in
+        game.acted[:] = acted
+        for player, stack in zip(game.players, chips):
+            player.chips = stack
+
+    """
+    _summary_ : Find the next decision.
+    _description_ : This method is used to move to the next player to act as PokerGame.play_round does,
+        starting the next rounds when the current one is over.
+    _attributes_ :
+        - round_num : Round number.
+        - position : Position of the next player in turn.
+        - to_act : Number of players left to act in the round.
+    _returns_ : Round number, position and players left to act of the decision, None when the hand is over.
+    """
+
+    def next_decision(self, round_num: int, position: int, to_act: int) -> tuple:
+        game = self.game
+        num_players = len(game.players)
+        while game.num_live > 1:
+            if to_act > 0 and game.num_active > 0:
+                while game.folded[position] or game.all_in[position]:
+                    position = (position + 1) % num_players
+                if not (game.num_active == 1 and game.current_bet == game.bets[position]):
+                    return round_num, position, to_act
+
+            round_num += 1
+            if round_num == game.max_rounds:
+                return None
+            game.bets[:] = [0] * num_players
+            game.acted[:] = [False] * num_players
+            game.current_bet = 0
+            game.min_raise = game.big_blind
+            position = game.first_position(round_num)
+            to_act = game.num_active
+        return None
+
+    """
+    _summary_ : Play an action.
+    _description_ : This method is used to apply an action of the infosets to the game.
+    _attributes_ :
+        - position : Position of the player.
+        - action : Index of the action.
+        - to_act : Number of players left to act in the round.
+    _returns_ : Position of the next player in turn and players left to act.
+    """
+
+    def play(self, position: int, action: int, to_act: int) -> (int, int):
+        game = self.game
+        to_call = game.current_bet - game.bets[position]
+        current_bet, min_raise = game.current_bet, game.min_raise
+        game.apply_action(position, ACTIONS[action], to_call + int(self.bet_fraction * (game.pot + to_call)))
+        return (position + 1) % len(game.players), game.count_to_act(position, to_act, current_bet, min_raise)
+
+    """
+    _summary_ : Get the utility of the hand.
+    _description_ : This method is used to get the chips won by a player at the end of the hand, in big blinds.
+    _attributes_ :
+        - traverser : Position of the player.
+    _returns_ : Utility of the player.
+    """
+
+    def utility(self, traverser: int) -> float:
+        game = self.game
+        contributions = [self.chips - player.chips for player in game.players]
+        if game.num_live == 1:
+            won = game.pot if not game.folded[traverser] else 0
+        else:
+            live = [not folded for folded in game.folded]
+            won = Showdown.resolve(self.strengths, contributions, live)[traverser]
+        return (won - contributions[traverser]) / game.big_blind
+
+    """
+    _summary_ : Get the legal actions.
+    _description_ : This method is used to get the actions of an infoset from the action mask of the game.
+    _attributes_ :
+        - position : Position of the player.
+    _returns_ : List of NUM_ACTIONS booleans.
+    """
+
+    def legal_actions(self, position: int) -> list:
+        legal = self.game.get_action_mask(position)
+        if legal[PokerGame.CHECK]:
+            legal[PokerGame.FOLD] = False
+        return legal
+
+    """
+    _summary_ : Traverse with external sampling.
+    _description_ : This method is used to explore every action of the traverser and one sampled action of
+        the other players, updating the regrets of the traverser and the strategy sums of the others.
+    _attributes_ :
+        - traverser : Position of the traverser.
+        - node : Round number, position and players left to act of the decision, None at the end of the hand.
+        - history : Actions of the hand so far.
+    _returns_ : Utility of the traverser.
+    """
+
+    def traverse_external(self, traverser: int, node: tuple, history: bytes) -> float:
+        if node is None:
+            return self.utility(traverser)
+        self.nodes += 1
+        round_num, position, to_act = node
+        legal = self.legal_actions(position)
+        row = self.row(self.card_keys[position][round_num] + history)
+        strategy = self.current_strategy(row, legal)
+
+        if position != traverser:
+            self.strategy_sums[row] += strategy
+            action = self.sample(strategy)
+            next_position, next_to_act = self.play(position, action, to_act)
+            return self.traverse_external(traverser, self.next_decision(round_num, next_position, next_to_act),
+                                          history + bytes((action,)))
+
+        state = self.save_state()
+        utilities = [0.0] * NUM_ACTIONS
+        for action in range(NUM_ACTIONS):
+            if not legal[action]:
+                continue
+            next_position, next_to_act = self.play(position, action, to_act)
+            utilities[action] = self.traverse_external(
+                traverser, self.next_decision(round_num, next_position, next_to_act), history + bytes((action,)))
+            self.restore_state(state)
+
+        value = sum(probability * utility for probability, utility in zip(strategy, utilities))
+        self.regrets[row] += [utility - value if is_legal else 0.0 for utility, is_legal in zip(utilities, legal)]
+        return value
+
+    """
+    _summary_ : Traverse with outcome sampling.
+    _description_ : This method is used to sample a single path, the traverser exploring with probability epsilon,
+        and to update the regrets and the strategy sums of the traverser weighted by the inverse of the
+        probability of sampling the path.
+    _attributes_ :
+        - traverser : Position of the traverser.
+        - node : Round number, position and players left to act of the decision, None at the end of the hand.
+        - history : Actions of the hand so far.
+        - reach : Probability of the traverser playing to the node.
+        - opponents_reach : Probability of the other players playing to the node.
+        - sample_reach : Probability of sampling the node.
+    _returns_ : Sampled utility of the traverser and probability of playing from the node to the end.
+    """
+
+    def traverse_outcome(self, traverser: int, node: tuple, history: bytes, reach: float, opponents_reach: float,
+                         sample_reach: float) -> (float, float):
+        if node is None:
+            return self.utility(traverser) / sample_reach, 1.0
+        self.nodes += 1
+        round_num, position, to_act = node
+        legal = self.legal_actions(position)
+        row = self.row(self.card_keys[position][round_num] + history)
+        strategy = self.current_strategy(row, legal)
+
+        if position == traverser:
+            num_legal = sum(legal)
+            probabilities = [self.epsilon / num_legal * is_legal + (1 - self.epsilon) * probability
+                             for probability, is_legal in zip(strategy, legal)]
+        else:
+            probabilities = strategy
+        action = self.sample(probabilities)
+        next_position, next_to_act = self.play(position, action, to_act)
+
+        if position == traverser:
+            utility, tail = self.traverse_outcome(
+                traverser, self.next_decision(round_num, next_position, next_to_act), history + bytes((action,)),
+                reach * strategy[action], opponents_reach, sample_reach * probabilities[action])
+            weight = utility * opponents_reach * tail
+            self.regrets[row] += [weight * ((a == action) - strategy[action]) if legal[a] else 0.0
+                                  for a in range(NUM_ACTIONS)]
+            self.strategy_sums[row] += [reach / sample_reach * probability for probability in strategy]
+        else:
+            utility, tail = self.traverse_outcome(
+                traverser, self.next_decision(round_num, next_position, next_to_act), history + bytes((action,)),
+                reach, opponents_reach * strategy[action], sample_reach * probabilities[action])
+        return utility, tail * strategy[action]
+
+    """
+    _summary_ : Run an iteration.
+    _description_ : This method is used to deal and traverse one hand for each player.
+    _attributes_ : None
+    _returns_ : None
+    """
+
+    def run_iteration(self) -> None:
+        game = self.game
+        for traverser in range(len(game.players)):
+            self.deal()
+            game.blind_bets()
+            node = self.next_decision(0, game.first_position(0), game.num_active)
+            if self.sampling == 'external':
+                self.traverse_external(traverser, node, b"")
+            else:
+                self.traverse_outcome(traverser, node, b"", 1.0, 1.0, 1.0)
+        self.iteration += 1
+
+    """
+    _summary_ : Train the strategy.
+    _description_ : This method is used to run iterations, in this process or in batches of batch_size
+        iterations per worker, and to save a checkpoint every checkpoint_every iterations.
+    _attributes_ :
+        - num_iterations : Number of iterations.
+        - num_workers : Number of processes, 1 to run in this process.
+        - batch_size : Number of iterations of a worker between two merges of the tables.
+        - checkpoint_path : Path of the checkpoint, None for no checkpoint.
+        - checkpoint_every : Number of iterations between two checkpoints.
+    _returns_ : None
+    """
+
+    def train(self, num_iterations: int, num_workers: int = 1, batch_size: int = 100, checkpoint_path: str = None,
+              checkpoint_every: int = 1000) -> None:
+        metrics = Metrics.active
+        start = time.perf_counter()
+        nodes = self.nodes
+        last_checkpoint = self.iteration
+        target = self.iteration + num_iterations
+
+        pool = mp.Pool(num_workers) if num_workers > 1 else None
+        try:
+            while self.iteration < target:
+                if pool is None:
+                    self.run_iteration()
+                else:
+                    self.run_batch(pool, num_workers, min(batch_size, -(-(target - self.iteration) // num_workers)),
+                                   target)
+                if checkpoint_path is not None and self.iteration - last_checkpoint >= checkpoint_every:
+                    self.save(checkpoint_path)
+                    last_checkpoint = self.iteration
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        if checkpoint_path is not None and self.iteration > last_checkpoint:
+            self.save(checkpoint_path)
+        self.elapsed = time.perf_counter() - start
+        self.iterations_done = num_iterations
+        if metrics is not None:
+            metrics.count('cfr_iterations', num_iterations)
+            metrics.count('cfr_nodes', self.nodes - nodes)
+            metrics.add_time('cfr_train', int(self.elapsed * 1e9))
+
+    """
+    _summary_ : Run a batch of iterations in the workers.
+    _description_ : This method is used to run batch_size iterations in each worker from a copy of the tables,
+        then to add the changes of every worker to the tables.
+    _attributes_ :
+        - pool : Pool of worker processes.
+        - num_workers : Number of workers.
+        - batch_size : Number of iterations per worker.
+        - target : Iteration not to go past.
+    _returns_ : None
+    """
+
+    def run_batch(self, pool, num_workers: int, batch_size: int, target: int) -> None:
+        num_infosets = self.num_infosets
+        tables = (list(self.infosets), self.regrets[:num_infosets], self.strategy_sums[:num_infosets])
+        seeds = self.seed_sequence.spawn(num_workers)
+        sizes = [min(batch_size, max(target - self.iteration - batch_size * worker, 0)) for worker in range(num_workers)]
+        jobs = [(self.config, tables, seed, size) for seed, size in zip(seeds, sizes) if size > 0]
+
+        for keys, regrets, strategy_sums, nodes in pool.map(run_worker, jobs):
+            rows = [self.row(key) for key in keys]
+            self.regrets[rows] += regrets
+            self.strategy_sums[rows] += strategy_sums
+            self.nodes += nodes
+        self.iteration += sum(sizes)
+
+    """
+    _summary_ : Get the memory per infoset.
+    _description_ : This method is used to measure the bytes used by an infoset : its rows in the tables, its key
+        and its entry in the index.
+    _attributes_ : None
+    _returns_ : Bytes per infoset.
+    """
+
+    def memory_per_infoset(self) -> float:
+        if not self.infosets:
+            return 0.0
+        table_bytes = 2 * self.num_infosets * NUM_ACTIONS * self.regrets.itemsize
+        index_bytes = sys.getsizeof(self.infosets) + sum(sys.getsizeof(key) for key in self.infosets)
+        return (table_bytes + index_bytes) / self.num_infosets
+
+    """
+    _summary_ : Get the throughput.
+    _description_ : This method is used to get the iterations per second of the last training.
+    _attributes_ : None
+    _returns_ : Iterations per second.
+    """
+
+    def iterations_per_second(self) -> float:
+        return self.iterations_done / self.elapsed if self.elapsed else 0.0
+
+    """
+    _summary_ : Save a checkpoint.
+    _description_ : This method is used to save the tables, the keys (concatenated, with their offsets) and the
+        settings, to a temporary file renamed once written.
+    _attributes_ :
+        - path : Path of the checkpoint (.npz).
+    _returns_ : None
+    """
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        keys = list(self.infosets)
+        temporary = path[:-len(".npz")] + ".tmp.npz" if path.endswith(".npz") else path + ".tmp.npz"
+        np.savez(temporary,
+                 config=np.array(json.dumps(self.config)),
+                 iteration=np.array(self.iteration),
+                 key_data=np.frombuffer(b"".join(keys), dtype=np.uint8),
+                 key_offsets=np.cumsum([0] + [len(key) for key in keys]),
+                 regrets=self.regrets[:len(keys)],
+                 strategy_sums=self.strategy_sums[:len(keys)])
+        os.replace(temporary, path)
+
+    """
+    _summary_ : Load a checkpoint.
+    _description_ : This method is used to resume from a checkpoint saved with the same settings.
+    _attributes_ :
+        - path : Path of the checkpoint (.npz).
+    _returns_ : None
+    """
+
+    def load(self, path: str) -> None:
+        with np.load(path) as checkpoint:
+            config = json.loads(str(checkpoint['config']))
+            if config != self.config:
+                raise ValueError(f"{path} was trained with {config}, not {self.config}")
+            key_data = checkpoint['key_data'].tobytes()
+            offsets = checkpoint['key_offsets'].tolist()
+            self.infosets = {key_data[offsets[row]:offsets[row + 1]]: row for row in range(len(offsets) - 1)}
+            capacity = max(1024, 1 << (len(self.infosets) - 1).bit_length())
+            self.regrets = np.zeros((capacity, NUM_ACTIONS), dtype=np.float32)
+            self.strategy_sums = np.zeros((capacity, NUM_ACTIONS), dtype=np.float32)
+            self.regrets[:len(self.infosets)] = checkpoint['regrets']
+            self.strategy_sums[:len(self.infosets)] = checkpoint['strategy_sums']
+            self.iteration = int(checkpoint['iteration'])
+
+
+"""
+_summary_ : Run the iterations of a worker.
+_description_ : This method is used, in a worker process, to run iterations from a copy of the tables and to
+    send back the changes of the rows.
+_attributes_ :
+    - job : Settings, tables (keys, regrets, strategy sums), seed and number of iterations.
+_returns_ : Keys of the changed rows, their changes of regrets and of strategy sums, and the nodes visited.
+"""
+
+
+def run_worker(job: tuple) -> tuple:
+    config, (keys, regrets, strategy_sums), seed, num_iterations = job
+    if config['card_abstraction']:
+        from environment.cCardAbstraction import CardAbstraction
+        card_abstraction = CardAbstraction.get()
+    else:
+        card_abstraction = None
+    trainer = CFRTrainer(**{**config, 'card_abstraction': card_abstraction}, seed=seed)
+    trainer.infosets = {key: row for row, key in enumerate(keys)}
+    capacity = max(1024, 1 << max(len(keys) - 1, 0).bit_length())
+    trainer.regrets = np.zeros((capacity, NUM_ACTIONS), dtype=np.float32)
+    trainer.strategy_sums = np.zeros((capacity, NUM_ACTIONS), dtype=np.float32)
+    trainer.regrets[:len(keys)] = regrets
+    trainer.strategy_sums[:len(keys)] = strategy_sums
+
+    for _ in range(num_iterations):
+        trainer.run_iteration()
+
+    num_infosets = trainer.num_infosets
+    regret_changes = trainer.regrets[:num_infosets].copy()
+    regret_changes[:len(keys)] -= regrets
+    strategy_changes = trainer.strategy_sums[:num_infosets].copy()
+    strategy_changes[:len(keys)] -= strategy_sums
+    changed = np.flatnonzero((regret_changes != 0).any(axis=1) | (strategy_changes != 0).any(axis=1))
+
+    all_keys = list(trainer.infosets)
+    return ([all_keys[row] for row in changed.tolist()], regret_changes[changed], strategy_changes[changed],
+            trainer.nodes)
+
+
+"""
+_summary_ : Benchmark the trainer.
+_description_ : This method is used to measure the iterations per second and the memory per infoset of
+    each sampling on a heads-up game.
+_attributes_ :
+    - num_iterations : Number of iterations per sampling.
+    - num_rounds : Maximum number of rounds.
+    - seed : Seed of the trainers.
+_returns_ : Measures of each sampling.
+"""
+
+
+def benchmark(num_iterations: int = 200, num_rounds: int = 4, seed: int = 0) -> dict:
+    results = {}
+    for sampling in SAMPLINGS:
+        trainer = CFRTrainer(num_players=2, small_blind=5, big_blind=10, max_rounds=num_rounds, chips=200,
+                             sampling=sampling, seed=seed)
+        trainer.train(num_iterations)
+        results[sampling] = {
+            'iterations_per_second': trainer.iterations_per_second(),
+            'nodes_per_iteration': trainer.nodes / num_iterations,
+            'infosets': trainer.num_infosets,
+            'bytes_per_infoset': trainer.memory_per_infoset(),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    from utils.config_manager import load_config
+
+    parser = argparse.ArgumentParser(description="Train a strategy with Monte Carlo CFR.")
+    parser.add_argument("--config", default="configs/game_configs/texas_holdem.json")
+    parser.add_argument("--iterations", type=int, default=10000)
+    parser.add_argument("--chips", type=int, default=1000)
+    parser.add_argument("--sampling", default='external', choices=SAMPLINGS)
+    parser.add_argument("--bet-fraction", type=float, default=1.0)
+    parser.add_argument("--abstraction", action="store_true", help="Use the buckets of the card abstraction.")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    parser.add_argument("--checkpoint-every", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    game_config = load_config(args.config)
+    card_abstraction = None
+    if args.abstraction:
+        from environment.cCardAbstraction import CardAbstraction
+        card_abstraction = CardAbstraction.get()
+
+    trainer = CFRTrainer(num_players=game_config['num_players'], small_blind=game_config['small_blind'],
+                         big_blind=game_config['big_blind'], max_rounds=game_config['max_rounds'], chips=args.chips,
+                         game_type=game_config['game_type'], sampling=args.sampling, bet_fraction=args.bet_fraction,
+                         card_abstraction=card_abstraction, seed=args.seed)
+    if os.path.exists(args.checkpoint):
+        trainer.load(args.checkpoint)
+        print(f"Resumed {args.checkpoint} at iteration {trainer.iteration}")
+    trainer.train(args.iterations, num_workers=args.workers, batch_size=args.batch_size,
+                  checkpoint_path=args.checkpoint, checkpoint_every=args.checkpoint_every)
+    print(f"{trainer.iteration} iterations, {trainer.iterations_per_second():,.1f} iterations/s, "
+          f"{trainer.num_infosets:,} infosets, {trainer.memory_per_infoset():.0f} bytes/infoset")
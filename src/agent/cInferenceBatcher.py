@@ -0,0 +1,212 @@
+# Description: This file contains the class InferenceBatcher which groups pending decisions into batched forward passes.
+# Author: Maxime Cornaton
+# Date: 2023
+
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+from agent.cAgent import Agent
+from model.cFeatureSchema import FEATURE_SCHEMA
+
+
+class InferenceBatcher:
+
+    """
+    _summary_ : Class used to batch the decisions of many seats or tables.
+    _description_ : This class is used to collect the feature rows submitted by many callers and to run
+        them through Agent.predict as one batch. A batch is sent as soon as it holds max_batch_size rows
+        or max_latency seconds after its first row arrived, whichever comes first.
+    _attributes_ :
+        - agent : Agent used for the forward passes.
+        - max_batch_size : Maximum number of rows per forward pass.
+        - max_latency : Maximum time in seconds a row waits for the batch to fill.
+        - history_size : Number of latencies kept for the percentiles.
+    _returns_ : None
+    """
+
+    def __init__(self, agent: Agent, max_batch_size: int = 256, max_latency: float = 0.002,
+                 history_size: int = 10000) -> None:
+        self.agent = agent
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+
+        self.requests = queue.Queue()
+        self.latencies = deque(maxlen=history_size)
+        self.num_requests = 0
+        self.num_batches = 0
+        self.busy_time = 0.0
+
+        self.thread = None
+        self.running = False
+
+    """
+    _summary_ : Start the batcher.
+    _description_ : This method is used to start the background thread running the forward passes.
+    _attributes_ : None
+    _returns_ : None
+    """
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    """
+    _summary_ : Stop the batcher.
+    _description_ : This method is used to answer the pending rows and stop the background thread.
+    _attributes_ : None
+    _returns_ : None
+    """
+
+    def stop(self) -> None:
+        if not self.running:
+            return
+        self.running = False
+        self.requests.put(None)
+        self.thread.join()
+
+    """
+    _summary_ : Submit a decision.
+    _description_ : This method is used to queue one feature row.
+    _attributes_ :
+        - features : Feature row of the decision (input_size,).
+    _returns_ : Future resolved with the output row of the model.
+    """
+
+    def submit(self, features: np.ndarray) -> Future:
+        future = Future()
+        self.requests.put((time.perf_counter(), np.asarray(features, dtype=np.float32), future))
+        return future
+
+    """
+    _summary_ : Predict a decision.
+    _description_ : This method is used to submit one feature row and wait for its output.
+    _attributes_ :
+        - features : Feature row of the decision (input_size,).
+    _returns_ : Output row of the model.
+    """
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        return self.submit(features).result()
+
+    """
+    _summary_ : Run the batcher.
+    _description_ : This method is used, in the background thread, to gather the rows into batches.
+    _attributes_ : None
+    _returns_ : None
+    """
+
+    def run(self) -> None:
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+
+            batch = [request]
+            deadline = request[0] + self.max_latency
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                try:
+                    request = self.requests.get(timeout=timeout) if timeout > 0 else self.requests.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    self.requests.put(None)
+                    break
+                batch.append(request)
+
+            self.process(batch)
+
+    """
+    _summary_ : Process a batch.
+    _description_ : This method is used to run one forward pass over a batch and resolve its futures.
+    _attributes_ :
+        - batch : List of (submit time, features, future).
+    _returns_ : None
+    """
+
+    def process(self, batch: list) -> None:
+        start = time.perf_counter()
+        try:
+            outputs = self.agent.predict(np.stack([features for _, features, _ in batch]))
+        except Exception as exception:
+            for _, _, future in batch:
+                future.set_exception(exception)
+            return
+
+        end = time.perf_counter()
+        for (submitted, _, future), output in zip(batch, outputs):
+            future.set_result(output)
+            self.latencies.append(end - submitted)
+
+        self.num_requests += len(batch)
+        self.num_batches += 1
+        self.busy_time += end - start
+
+    """
+    _summary_ : Get the statistics.
+    _description_ : This method is used to get the latency percentiles and the throughput of the batcher.
+    _attributes_ : None
+    _returns_ : Dictionary of statistics, latencies in seconds.
+    """
+
+    def get_stats(self) -> dict:
+        latencies = np.array(self.latencies) if self.latencies else np.zeros(1)
+        return {
+            'requests': self.num_requests,
+            'batches': self.num_batches,
+            'mean_batch_size': self.num_requests / max(self.num_batches, 1),
+            'throughput': self.num_requests / self.busy_time if self.busy_time else 0.0,
+            'latency_p50': float(np.percentile(latencies, 50)),
+            'latency_p90': float(np.percentile(latencies, 90)),
+            'latency_p99': float(np.percentile(latencies, 99)),
+        }
+
+
+"""
+_summary_ : Benchmark the batcher.
+_description_ : This method is used to measure the latency and throughput seen by many concurrent seats.
+_attributes_ :
+    - num_seats : Number of threads submitting decisions.
+    - num_decisions : Number of decisions per seat.
+    - compile : Whether the model is compiled with TorchScript.
+_returns_ : Statistics of the batcher.
+"""
+
+
+def benchmark(num_seats: int = 64, num_decisions: int = 200, compile: bool = False) -> dict:
+    agent = Agent(hidden_size=128, output_size=3, learning_rate=0.001, num_threads=1)
+    if compile:
+        agent.compile()
+    batcher = InferenceBatcher(agent)
+    batcher.start()
+
+    def seat(seed: int) -> None:
+        features = np.random.default_rng(seed).random(FEATURE_SCHEMA.size, dtype=np.float32)
+        for _ in range(num_decisions):
+            batcher.predict(features)
+
+    threads = [threading.Thread(target=seat, args=(i,)) for i in range(num_seats)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    batcher.stop()
+
+    stats = batcher.get_stats()
+    stats['decisions_per_second'] = num_seats * num_decisions / elapsed
+    return stats
+
+
+if __name__ == "__main__":
+    for compile in (False, True):
+        print("TorchScript" if compile else "Eager", benchmark(compile=compile))
@@ -0,0 +1,138 @@
+# Description: This file contains the class ReplayBuffer which stores the experience the agent trains on.
+# Author: Maxime Cornaton
+# Date: 2023
+
+import torch
+
+
+class ReplayBuffer:
+
+    """
+    _summary_ : Class used to store training rows in a fixed-size ring buffer.
+    _description_ : This class is used to keep the last capacity rows (features and reward targets) of many
+        games in contiguous float32 tensors allocated once. Appending a trajectory writes it in place over
+        the oldest rows, and minibatches are gathered into preallocated output tensors, so the memory
+        footprint never changes while training.
+    _attributes_ :
+        - capacity : Maximum number of rows.
+        - feature_size : Number of features per row.
+        - target_size : Number of reward targets per row.
+        - alpha : Priority exponent used by prioritized sampling (0 is uniform).
+        - beta : Importance-sampling exponent used by prioritized sampling.
+        - seed : Seed of the sampling generator.
+    _returns_ : None
+    """
+
+    def __init__(self, capacity: int, feature_size: int, target_size: int = 2, alpha: float = 0.6,
+                 beta: float = 0.4, seed: int = None) -> None:
+        self.capacity = capacity
+        self.alpha = alpha
+        self.beta = beta
+
+        self.features = torch.zeros((capacity, feature_size), dtype=torch.float32)
+        self.targets = torch.zeros((capacity, target_size), dtype=torch.float32)
+        self.priorities = torch.zeros(capacity, dtype=torch.float32)
+
+        self.position = 0
+        self.size = 0
+        self.max_priority = 1.0
+
+        self.generator = torch.Generator()
+        if seed is not None:
+            self.generator.manual_seed(seed)
+
+        self.batch_size = 0
+        self.batch_features = None
+        self.batch_targets = None
+
+    def __len__(self) -> int:
+        return self.size
+
+    """
+    _summary_ : Append a trajectory.
+    _description_ : This method is used to write the rows of a trajectory after the last ones,
+        evicting the oldest rows once the buffer is full.
+    _attributes_ :
+        - features : Features of the rows (n, feature_size).
+        - targets : Reward targets of the rows (n, target_size).
+    _returns_ : None
+    """
+
+    def append(self, features: torch.Tensor, targets: torch.Tensor) -> None:
+        num_rows = len(features)
+        if num_rows > self.capacity:
+            features, targets = features[-self.capacity:], targets[-self.capacity:]
+            num_rows = self.capacity
+
+        first = min(num_rows, self.capacity - self.position)
+        self.write(self.position, features[:first], targets[:first])
+        if first < num_rows:
+            self.write(0, features[first:], targets[first:])
+
+        self.position = (self.position + num_rows) % self.capacity
+        self.size = min(self.size + num_rows, self.capacity)
+
+    def write(self, start: int, features: torch.Tensor, targets: torch.Tensor) -> None:
+        end = start + len(features)
+        self.features[start:end] = features
+        self.targets[start:end] = targets
+        # New rows get the highest priority seen so far, so they are sampled at least once
+        self.priorities[start:end] = self.max_priority
+
+    """
+    _summary_ : Sample a minibatch.
+    _description_ : This method is used to draw rows uniformly or proportionally to their priority.
+        The returned tensors are reused by the next call with the same batch size.
+    _attributes_ :
+        - batch_size : Number of rows.
+        - prioritized : Whether rows are drawn proportionally to priority ** alpha.
+    _returns_ : Features, targets, indices of the rows and importance-sampling weights (None when uniform).
+    """
+
+    def sample(self, batch_size: int, prioritized: bool = False) -> (torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor):
+        if self.size == 0:
+            raise ValueError("Cannot sample from an empty replay buffer")
+
+        if batch_size != self.batch_size:
+            self.batch_size = batch_size
+            self.batch_features = torch.empty((batch_size, self.features.shape[1]), dtype=torch.float32)
+            self.batch_targets = torch.empty((batch_size, self.targets.shape[1]), dtype=torch.float32)
+
+        weights = None
+        if prioritized:
+            probabilities = self.priorities[:self.size] ** self.alpha
+            probabilities /= probabilities.sum()
+            indices = torch.multinomial(probabilities, batch_size, replacement=True, generator=self.generator)
+            weights = (self.size * probabilities[indices]) ** -self.beta
+            weights /= weights.max()
+        else:
+            indices = torch.randint(self.size, (batch_size,), generator=self.generator)
+
+        torch.index_select(self.features, 0, indices, out=self.batch_features)
+        torch.index_select(self.targets, 0, indices, out=self.batch_targets)
+        return self.batch_features, self.batch_targets, indices, weights
+
+    """
+    _summary_ : Update priorities.
+    _description_ : This method is used to set the priority of sampled rows, typically to their last error.
+    _attributes_ :
+        - indices : Indices of the rows.
+        - priorities : New priorities (positive).
+    _returns_ : None
+    """
+
+    def update_priorities(self, indices: torch.Tensor, priorities: torch.Tensor) -> None:
+        self.priorities[indices] = priorities
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+
+    """
+    _summary_ : Clear the buffer.
+    _description_ : This method is used to evict every row, the storage being kept.
+    _attributes_ : None
+    _returns_ : None
+    """
+
+    def clear(self) -> None:
+        self.position = 0
+        self.size = 0
+        self.max_priority = 1.0
@@ -0,0 +1,210 @@
+# Description: This file contains the class SelfPlayRunner which plays episodes in parallel worker processes.
+# Author: Maxime Cornaton
+# Date: 2023
+
+import multiprocessing as mp
+import queue as queue_module
+import time
+
+import numpy as np
+import torch
+
+from agent.cAgent import Agent
+from environment.cPokerGame import PokerGame
+from utils.preprocessing import preprocess_game_data
+
+
+"""
+_summary_ : Play the episodes of a worker.
+_description_ : This method is used, in a worker process, to play a shard of the episodes with its own
+    PokerGame and a read-only copy of the agent, and to send each trajectory back through the queue.
+    The stacks are refilled before each episode, so that every episode is dealt from the same distribution.
+_attributes_ :
+    - worker_id : Id of the worker.
+    - seed : Seed of the worker.
+    - game_config : Game configuration.
+    - agent_config : Agent configuration.
+    - state_dict : Snapshot of the agent weights.
+    - episode_ids : Ids of the episodes to play.
+    - queue : Bounded queue to the learner.
+_returns_ : None
+"""
+
+
+def run_worker(worker_id: int, seed: int, game_config: dict, agent_config: dict, state_dict: dict,
+               episode_ids: list, queue) -> None:
+    torch.set_num_threads(1)
+    np.random.seed(seed % 2 ** 32)
+    torch.manual_seed(seed)
+
+    agent = Agent(
+        hidden_size=agent_config['hidden_size'],
+        output_size=agent_config['output_size'],
+        learning_rate=agent_config['learning_rate'],
+        buffer_capacity=1
+    )
+    agent.model.load_state_dict(state_dict)
+    agent.model.eval()
+
+    environment = PokerGame(
+        num_players=game_config['num_players'],
+        small_blind=game_config['small_blind'],
+        big_blind=game_config['big_blind'],
+        max_rounds=game_config['max_rounds'],
+        seed=seed,
+        game_type=game_config['game_type']
+    )
+    environment.init(agent=agent)
+    # Every episode starts from the stacks of the first one, as main does with a new init per episode
+    starting_stacks = [(player, player.chips) for player in environment.players]
+
+    for id in episode_ids:
+        for player, chips in starting_stacks:
+            player.chips = chips
+        environment.play()
+        features, targets = preprocess_game_data(environment)
+        # Sent as arrays : tensors would go through shared memory owned by this short-lived process
+        queue.put({'id': id, 'worker': worker_id, 'features': features.numpy(), 'targets': targets.numpy(),
+                   'history': environment.history.to_columns(id)})
+        environment.reset()
+
+    queue.put(None)
+
+
+class SelfPlayRunner:
+
+    """
+    _summary_ : Class used to play self-play episodes in parallel.
+    _description_ : This class is used to shard episodes across worker processes. Each worker owns its
+        PokerGame and a snapshot of the agent weights taken when run() is called, and streams finished
+        trajectories to the learner through a bounded queue, so workers block instead of piling up
+        trajectories when the learner falls behind.
+    _attributes_ :
+        - game_config : Game configuration.
+        - agent_config : Agent configuration.
+        - num_workers : Number of worker processes.
+        - queue_size : Maximum number of trajectories waiting for the learner.
+        - seed : Seed from which the worker seeds are derived.
+        - hands : Number of hands received during the last run.
+        - elapsed : Duration of the last run in seconds.
+    _returns_ : None
+    """
+
+    def __init__(self, game_config: dict, agent_config: dict, num_workers: int = None, queue_size: int = 64,
+                 seed: int = 0) -> None:
+        self.game_config = game_config
+        self.agent_config = agent_config
+
+        self.num_workers = num_workers or mp.cpu_count()
+        self.queue_size = queue_size
+        self.seed = seed
+
+        self.hands = 0
+        self.elapsed = 0.0
+
+    """
+    _summary_ : Get the seeds of the workers.
+    _description_ : This method is used to derive one independent, deterministic seed per worker.
+    _attributes_ : None
+    _returns_ : List of seeds.
+    """
+
+    def worker_seeds(self) -> list:
+        return [int(child.generate_state(1, dtype=np.uint64)[0])
+                for child in np.random.SeedSequence(self.seed).spawn(self.num_workers)]
+
+    """
+    _summary_ : Run the episodes.
+    _description_ : This method is used to play num_episodes episodes with the current weights of the agent
+        and yield the trajectories as soon as they are finished.
+    _attributes_ :
+        - agent : Agent whose weights are played.
+        - num_episodes : Number of episodes.
+    _returns_ : Generator of trajectories {'id', 'worker', 'features', 'targets', 'history'}.
+    """
+
+    def run(self, agent: Agent, num_episodes: int):
+        state_dict = {name: tensor.detach().clone()
+                      for name, tensor in agent.model.state_dict().items()}
+        queue = mp.Queue(maxsize=self.queue_size)
+        workers = [mp.Process(target=run_worker,
+                              args=(worker_id, seed, self.game_config, self.agent_config, state_dict,
+                                    list(range(worker_id, num_episodes, self.num_workers)), queue),
+                              daemon=True)
+                   for worker_id, seed in enumerate(self.worker_seeds())]
+
+        self.hands = 0
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+
+        try:
+            finished = 0
+            while finished < len(workers):
+                try:
+                    trajectory = queue.get(timeout=1.0)
+                except queue_module.Empty:
+                    if not any(worker.is_alive() for worker in workers):
+                        raise RuntimeError("Self-play workers exited without finishing their episodes")
+                    continue
+                if trajectory is None:
+                    finished += 1
+                    continue
+                self.hands += 1
+                self.elapsed = time.perf_counter() - start
+                trajectory['features'] = torch.from_numpy(trajectory['features'])
+                trajectory['targets'] = torch.from_numpy(trajectory['targets'])
+                yield trajectory
+        finally:
+            self.elapsed = time.perf_counter() - start
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+                worker.join()
+
+    """
+    _summary_ : Get the throughput.
+    _description_ : This method is used to get the hands per second of the last run.
+    _attributes_ : None
+    _returns_ : Hands per second.
+    """
+
+    def hands_per_second(self) -> float:
+        return self.hands / self.elapsed if self.elapsed else 0.0
+
+
+"""
+_summary_ : Benchmark the scaling of the runner.
+_description_ : This method is used to measure the hands per second from 1 to max_workers workers.
+_attributes_ :
+    - game_config : Game configuration.
+    - agent_config : Agent configuration.
+    - max_workers : Largest number of workers.
+    - num_episodes : Number of episodes per measure.
+_returns_ : Hands per second for each number of workers.
+"""
+
+
+def benchmark(game_config: dict, agent_config: dict, max_workers: int = None, num_episodes: int = 2000) -> dict:
+    agent = Agent(
+        hidden_size=agent_config['hidden_size'],
+        output_size=agent_config['output_size'],
+        learning_rate=agent_config['learning_rate']
+    )
+
+    results = {}
+    for num_workers in range(1, (max_workers or mp.cpu_count()) + 1):
+        runner = SelfPlayRunner(game_config, agent_config, num_workers=num_workers)
+        for _ in runner.run(agent, num_episodes):
+            pass
+        results[num_workers] = runner.hands_per_second()
+    return results
+
+
+if __name__ == "__main__":
+    from utils.config_manager import load_config
+
+    game_config = load_config('configs/game_configs/texas_holdem.json')
+    agent_config = load_config('configs/agent_configs/neural_network.json')
+    for num_workers, hands_per_second in benchmark(game_config, agent_config).items():
+        print(f"{num_workers:>3} workers: {hands_per_second:,.0f} hands/s")
@@ -0,0 +1,338 @@
+# Description: This file contains the class CardAbstraction which groups the hands of each street into buckets.
+# Author: Maxime Cornaton
+# Date: 2023
+
+import argparse
+import multiprocessing as mp
+import os
+import time
+from itertools import combinations
+
+import numpy as np
+
+from environment.cHandIndexer import HandIndexer
+from environment.cPreflopEquityTable import PreflopEquityTable
+from environment.cRange import COMBOS, Range
+from utils.cards import CARD_BIT_ARRAY, NUM_CARDS, RANK_MASK
+
+ABSTRACTION_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                     '..', '..', 'data', 'tables', 'abstraction')
+
+# Number of community cards of each street with buckets built by k-means
+STREETS = {'flop': 3, 'turn': 4, 'river': 5}
+
+STREET_NAMES = {size: street for street, size in STREETS.items()}
+
+SUIT_SHIFTS = 13 * np.arange(4, dtype=np.int64)
+
+# Bucket of the indexes left out of a trial build
+NO_BUCKET = np.iinfo(np.uint16).max
+
+
+class CardAbstraction:
+
+    """
+    _summary_ : Class giving the bucket of a hand on each street.
+    _description_ : This class is used to look up which bucket of strategically similar hands a hand belongs
+        to, from tables built once by build() and memory-mapped when loaded. Preflop, the buckets are the
+        169 canonical starting hands (see PreflopEquityTable.canonical_index).
+        Hands equal up to a permutation of the suits share their bucket, so the table of a street holds
+        the bucket of each canonical hand at its index (see HandIndexer, the hole cards and the board being
+        its two rounds) : a query indexes the hand and reads one entry.
+    _attributes_ :
+        - directory : Directory of the tables.
+    _returns_ : None
+    """
+
+    _instance = None
+
+    def __init__(self, directory: str = ABSTRACTION_DIRECTORY) -> None:
+        self.hand_indexers = {street: street_indexer(street) for street in STREETS}
+        self.buckets = {}
+        self.centers = {}
+        for street in STREETS:
+            buckets_path = os.path.join(directory, f"{street}_buckets.npy")
+            if not os.path.exists(buckets_path):
+                raise FileNotFoundError(
+                    f"{buckets_path} not found, build it with: python -m environment.cCardAbstraction")
+            self.buckets[street] = np.load(buckets_path, mmap_mode='r')
+            if len(self.buckets[street]) != self.hand_indexers[street].size:
+                raise ValueError(f"{buckets_path} has {len(self.buckets[street])} entries instead of "
+                                 f"{self.hand_indexers[street].size}, build it again")
+            self.centers[street] = np.load(os.path.join(directory, f"{street}_centers.npy"))
+
+    """
+    _summary_ : Get the shared abstraction.
+    _description_ : This method is used to map the table files once per process and share them.
+    _attributes_ : None
+    _returns_ : Shared CardAbstraction instance.
+    """
+
+    @classmethod
+    def get(cls) -> 'CardAbstraction':
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    """
+    _summary_ : Get the number of buckets of a street.
+    _description_ : This method is used to size the tables indexed by bucket.
+    _attributes_ :
+        - street : Street ('preflop', 'flop', 'turn' or 'river').
+    _returns_ : Number of buckets.
+    """
+
+    def num_buckets(self, street: str) -> int:
+        if street == 'preflop':
+            return PreflopEquityTable.NUM_HANDS
+        return len(self.centers[street])
+
+    """
+    _summary_ : Get the bucket of a hand.
+    _description_ : This method is used to find the bucket of a hand given the community cards.
+    _attributes_ :
+        - hand : Hand of the player (card ints).
+        - community_cards : Community cards already dealt (card ints, 0 or 3 to 5).
+    _returns_ : Bucket of the hand.
+    """
+
+    def bucket(self, hand: list, community_cards: list) -> int:
+        if not community_cards:
+            return PreflopEquityTable.canonical_index(hand)
+
+        street = STREET_NAMES[len(community_cards)]
+        bucket = int(self.buckets[street][self.hand_indexers[street].index([hand, community_cards])])
+        if bucket == NO_BUCKET:
+            raise ValueError(f"No bucket for hand {hand} on board {community_cards}")
+        return bucket
+
+    """
+    _summary_ : Get the bucket of a player in a game.
+    _description_ : This method is used to get the bucket of a player with the community cards dealt so far.
+    _attributes_ :
+        - game : Game of poker.
+        - player : Player of the game.
+    _returns_ : Bucket of the hand.
+    """
+
+    def lookup_game(self, game, player) -> int:
+        return self.bucket(player.hand, game.community_cards)
+
+    """
+    _summary_ : Build the tables.
+    _description_ : This method is used to compute the features of every canonical hand, cluster them with
+        k-means and save the tables of each street.
+        The work is split into chunks of canonical boards (every canonical hand has a representative on a
+        canonical board) played by a pool of processes. Each chunk is saved as soon as it is done and the
+        chunks already saved with the same bins, runouts and seed are skipped, so a build stopped at any point
+        resumes where it stopped.
+    _attributes_ :
+        - directory : Directory of the tables.
+        - streets : Streets to build.
+        - num_buckets : Number of buckets per street.
+        - num_bins : Number of bins of the equity distributions (flop and turn).
+        - num_workers : Number of processes.
+        - chunk_size : Number of boards per chunk.
+        - max_runouts : Largest number of runouts enumerated before sampling.
+        - max_boards : Number of canonical boards used per street, all by default (smaller for a trial build).
+        - seed : Seed of the sampled runouts and of k-means.
+    _returns_ : None
+    """
+
+    @classmethod
+    def build(cls, directory: str = ABSTRACTION_DIRECTORY, streets: list = tuple(STREETS), num_buckets: int = 200,
+              num_bins: int = 8, num_workers: int = None, chunk_size: int = 64, max_runouts: int = 2000,
+              max_boards: int = None, seed: int = 0) -> None:
+        for street in streets:
+            start = time.perf_counter()
+            boards = canonical_boards(STREETS[street])[:max_boards]
+            # One directory per feature settings, so a build never resumes from chunks made with others
+            checkpoint_directory = os.path.join(directory, 'checkpoints', street,
+                                                f"bins{num_bins}-runouts{max_runouts}-seed{seed}")
+            os.makedirs(checkpoint_directory, exist_ok=True)
+
+            # Named by their range of boards, so a trial build never passes for part of a full one
+            chunks = [(os.path.join(checkpoint_directory, f"{first:06d}-{min(first + chunk_size, len(boards)):06d}.npz"),
+                       boards[first:first + chunk_size], num_bins, max_runouts, seed)
+                      for first in range(0, len(boards), chunk_size)]
+            pending = [chunk for chunk in chunks if not os.path.exists(chunk[0])]
+            print(f"{street}: {len(boards)} boards, {len(chunks) - len(pending)}/{len(chunks)} chunks done")
+
+            with mp.Pool(num_workers) as pool:
+                for done, _ in enumerate(pool.imap_unordered(build_chunk, pending), 1):
+                    if done % 10 == 0 or done == len(pending):
+                        print(f"{street}: {done}/{len(pending)} chunks in {time.perf_counter() - start:.0f}s")
+
+            indexes, features = [], []
+            for path, *_ in chunks:
+                with np.load(path) as chunk:
+                    indexes.append(chunk['indexes'])
+                    features.append(chunk['features'])
+            indexes, first = np.unique(np.concatenate(indexes), return_index=True)
+            features = np.concatenate(features)[first]
+
+            centers = kmeans(features, num_buckets, seed=seed)
+            buckets = np.full(street_indexer(street).size, NO_BUCKET, dtype=np.uint16)
+            buckets[indexes] = assign(features, centers)
+
+            for name, values in (('buckets', buckets), ('centers', centers)):
+                temporary = os.path.join(directory, f".{street}_{name}.tmp.npy")
+                np.save(temporary, values)
+                os.replace(temporary, os.path.join(directory, f"{street}_{name}.npy"))
+            print(f"{street}: {len(indexes)}/{len(buckets)} canonical hands in {len(centers)} buckets, "
+                  f"{time.perf_counter() - start:.0f}s")
+
+
+"""
+_summary_ : Get the indexer of a street.
+_description_ : This method is used to get the indexer of the hands of a street, the hole cards and the board
+    being its two rounds.
+_attributes_ :
+    - street : Street ('flop', 'turn' or 'river').
+_returns_ : Shared HandIndexer instance.
+"""
+
+
+def street_indexer(street: str) -> HandIndexer:
+    return HandIndexer.get([2, STREETS[street]])
+
+
+"""
+_summary_ : Get the canonical boards.
+_description_ : This method is used to list one board of each class of boards equal up to a permutation
+    of the suits, the board being rewritten with its suits sorted by ranks.
+_attributes_ :
+    - board_size : Number of community cards.
+_returns_ : Array of card ints (num_boards, board_size), sorted by canonical board mask.
+"""
+
+
+def canonical_boards(board_size: int) -> np.ndarray:
+    boards = np.array(list(combinations(range(NUM_CARDS), board_size)), dtype=np.intp)
+    suits = CARD_BIT_ARRAY[boards].sum(axis=1)[:, None] >> SUIT_SHIFTS & RANK_MASK
+    masks = np.unique((-np.sort(-suits, axis=1) << SUIT_SHIFTS).sum(axis=1))
+
+    bits = (masks[:, None] >> np.arange(NUM_CARDS)) & 1
+    return np.nonzero(bits)[1].reshape(len(masks), board_size)
+
+
+"""
+_summary_ : Build a chunk.
+_description_ : This method is used, in a worker process, to compute the features of every canonical hand
+    of some boards and save them. On the river the feature is the equity of the hand against a random hand ;
+    before, it is the cumulative distribution of that final equity over the runouts of the board (the L2
+    distance between cumulative distributions follows the earth mover's distance between the distributions).
+_attributes_ :
+    - chunk : Path of the chunk, boards, number of bins, maximum number of runouts and seed.
+_returns_ : Number of canonical hands of the chunk.
+"""
+
+
+def build_chunk(chunk: tuple) -> int:
+    path, boards, num_bins, max_runouts, seed = chunk
+    full_range = Range.full()
+    hand_indexer = HandIndexer.get([2, boards.shape[1]])
+
+    indexes, features = [], []
+    for board in boards.tolist():
+        combos = np.flatnonzero(~Range.blocked(board))
+        equities = full_range.runout_equities(full_range, board, max_runouts, seed)[:, combos]
+
+        if len(board) == 5:
+            board_features = equities.T
+        else:
+            # A runout meeting a card of the combo leaves a NaN, counted in no bin
+            valid = ~np.isnan(equities)
+            bins = np.minimum(np.where(valid, equities, 0.0) * num_bins, num_bins - 1).astype(np.intp)
+            counts = np.zeros((len(combos), num_bins))
+            np.add.at(counts, (np.broadcast_to(np.arange(len(combos)), bins.shape)[valid], bins[valid]), 1.0)
+            board_features = np.cumsum(counts, axis=1) / counts.sum(axis=1, keepdims=True)
+
+        board_indexes, first = np.unique(
+            hand_indexer.index_batch([COMBOS[combos], np.broadcast_to(board, (len(combos), len(board)))]),
+            return_index=True)
+        indexes.append(board_indexes)
+        features.append(board_features[first].astype(np.float32))
+
+    temporary = path[:-len(".npz")] + ".tmp.npz"
+    np.savez(temporary, indexes=np.concatenate(indexes), features=np.concatenate(features))
+    os.replace(temporary, path)
+    return sum(len(board_indexes) for board_indexes in indexes)
+
+
+"""
+_summary_ : Cluster features with k-means.
+_description_ : This method is used to find num_clusters centers with Lloyd iterations on a sample of the
+    features, started from k-means++. The centers are sorted by their mean feature, so that on the river
+    bucket order is equity order.
+_attributes_ :
+    - features : Features (N, D).
+    - num_clusters : Number of clusters.
+    - num_iterations : Number of Lloyd iterations.
+    - sample_size : Largest number of features used.
+    - seed : Seed of the sample and of the initial centers.
+_returns_ : Centers (num_clusters, D), fewer when there are fewer distinct features.
+"""
+
+
+def kmeans(features: np.ndarray, num_clusters: int, num_iterations: int = 25, sample_size: int = 200000,
+           seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    if len(features) > sample_size:
+        features = features[rng.choice(len(features), sample_size, replace=False)]
+    features = features.astype(np.float64)
+    num_clusters = min(num_clusters, len(np.unique(features, axis=0)))
+
+    centers = [features[rng.integers(len(features))]]
+    distances = ((features - centers[0]) ** 2).sum(axis=1)
+    for _ in range(num_clusters - 1):
+        centers.append(features[rng.choice(len(features), p=distances / distances.sum())])
+        distances = np.minimum(distances, ((features - centers[-1]) ** 2).sum(axis=1))
+    centers = np.array(centers)
+
+    for _ in range(num_iterations):
+        labels = assign(features, centers)
+        counts = np.bincount(labels, minlength=num_clusters)
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, features)
+        # A center left without features keeps its place
+        centers = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centers)
+
+    return centers[np.argsort(centers.mean(axis=1), kind='stable')]
+
+
+"""
+_summary_ : Assign features to centers.
+_description_ : This method is used to find the nearest center of every feature, chunk by chunk.
+_attributes_ :
+    - features : Features (N, D).
+    - centers : Centers (K, D).
+    - chunk_rows : Number of features per chunk.
+_returns_ : Index of the nearest center of each feature (N,).
+"""
+
+
+def assign(features: np.ndarray, centers: np.ndarray, chunk_rows: int = 65536) -> np.ndarray:
+    labels = np.empty(len(features), dtype=np.intp)
+    squared_norms = (centers ** 2).sum(axis=1)
+    for start in range(0, len(features), chunk_rows):
+        chunk = features[start:start + chunk_rows].astype(np.float64)
+        labels[start:start + chunk_rows] = np.argmin(squared_norms - 2 * chunk @ centers.T, axis=1)
+    return labels
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the card abstraction tables.")
+    parser.add_argument("--directory", default=ABSTRACTION_DIRECTORY)
+    parser.add_argument("--streets", nargs="+", default=list(STREETS), choices=list(STREETS))
+    parser.add_argument("--buckets", type=int, default=200)
+    parser.add_argument("--bins", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=64)
+    parser.add_argument("--runouts", type=int, default=2000)
+    parser.add_argument("--boards", type=int, default=None, help="Boards per street, all by default.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    CardAbstraction.build(args.directory, args.streets, args.buckets, args.bins, args.workers,
+                          args.chunk_size, args.runouts, args.boards, args.seed)
@@ -0,0 +1,133 @@
+# Description: This file contains the class Dealer which draws the cards of the hands.
+# Author: Maxime Cornaton
+# Date: 2023
+
+import time
+
+import numpy as np
+
+from utils.cards import NUM_CARDS
+
+
+class Dealer:
+
+    """
+    _summary_ : Class used to deal cards from its own random stream.
+    _description_ : This class is used to draw only the cards a hand needs (2 per player and 5 for the
+        board) with a partial Fisher-Yates shuffle of a card array allocated once : drawing k cards costs
+        k swaps, the deck is never rebuilt. The permutation left by a draw is as good a starting deck as
+        the sorted one, so it is kept from hand to hand.
+        Every dealer owns a NumPy Generator : dealers spawned from one seed (one per table or per worker)
+        give independent and reproducible streams, and never share the global random state.
+    _attributes_ :
+        - seed : Seed of the generator, an int or a SeedSequence (None for a random one).
+    _returns_ : None
+    """
+
+    SWAP_ROWS = 1024
+
+    def __init__(self, seed=None) -> None:
+        self.rng = np.random.default_rng(seed)
+        self.cards = list(range(NUM_CARDS))
+
+        # Swap positions drawn ahead for SWAP_ROWS single deals, one generator call per refill
+        self.swaps = []
+        self.swaps_position = 0
+
+        self.batch_cards = None
+
+    """
+    _summary_ : Spawn dealers.
+    _description_ : This method is used to create dealers with independent streams derived from one seed.
+    _attributes_ :
+        - seed : Seed from which the streams are derived.
+        - num_dealers : Number of dealers.
+    _returns_ : List of dealers.
+    """
+
+    @classmethod
+    def spawn(cls, seed: int, num_dealers: int) -> list:
+        return [cls(child) for child in np.random.SeedSequence(seed).spawn(num_dealers)]
+
+    """
+    _summary_ : Deal cards.
+    _description_ : This method is used to draw num_cards distinct cards uniformly at random.
+    _attributes_ :
+        - num_cards : Number of cards.
+    _returns_ : List of card ints (see utils.cards).
+    """
+
+    def deal(self, num_cards: int) -> list:
+        if self.swaps_position == len(self.swaps) or len(self.swaps[0]) != num_cards:
+            # Position i swaps with a position in [i, 52)
+            self.swaps = self.rng.integers(np.arange(num_cards), NUM_CARDS,
+                                           size=(self.SWAP_ROWS, num_cards)).tolist()
+            self.swaps_position = 0
+        swaps = self.swaps[self.swaps_position]
+        self.swaps_position += 1
+
+        cards = self.cards
+        for i, j in enumerate(swaps):
+            cards[i], cards[j] = cards[j], cards[i]
+        return cards[:num_cards]
+
+    """
+    _summary_ : Deal a batch of hands.
+    _description_ : This method is used to draw num_cards distinct cards for each of num_hands hands at once,
+        with the partial Fisher-Yates shuffle applied to every row of a card array kept between calls
+        (grown when a larger batch is asked).
+    _attributes_ :
+        - num_hands : Number of hands.
+        - num_cards : Number of cards per hand.
+        - deck : Cards to draw from (all 52 by default).
+    _returns_ : Array of card ints (num_hands, num_cards), taken from deck.
+    """
+
+    def deal_batch(self, num_hands: int, num_cards: int, deck: np.ndarray = None) -> np.ndarray:
+        deck_size = NUM_CARDS if deck is None else len(deck)
+        if self.batch_cards is None or len(self.batch_cards) < num_hands or self.batch_cards.shape[1] != deck_size:
+            self.batch_cards = np.tile(np.arange(deck_size, dtype=np.int64), (num_hands, 1))
+        cards = self.batch_cards[:num_hands]
+        rows = np.arange(num_hands)
+
+        swaps = self.rng.integers(np.arange(num_cards), deck_size, size=(num_hands, num_cards))
+        for i in range(num_cards):
+            j = swaps[:, i]
+            picked = cards[rows, j]
+            cards[rows, j] = cards[:, i]
+            cards[:, i] = picked
+
+        picks = cards[:, :num_cards]
+        return picks.copy() if deck is None else np.asarray(deck)[picks]
+
+
+"""
+_summary_ : Benchmark the dealer.
+_description_ : This method is used to measure the hands dealt per second, one by one and in batch.
+_attributes_ :
+    - num_players : Number of players per hand.
+    - num_hands : Number of hands.
+    - seed : Seed of the dealer.
+_returns_ : Hands per second for each way of dealing.
+"""
+
+
+def benchmark(num_players: int = 6, num_hands: int = 100000, seed: int = 0) -> dict:
+    dealer = Dealer(seed)
+    num_cards = 2 * num_players + 5
+
+    start = time.perf_counter()
+    for _ in range(num_hands // 10):
+        dealer.deal(num_cards)
+    single = num_hands // 10 / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    dealer.deal_batch(num_hands, num_cards)
+    batch = num_hands / (time.perf_counter() - start)
+
+    return {'single': single, 'batch': batch}
+
+
+if __name__ == "__main__":
+    for name, hands_per_second in benchmark().items():
+        print(f"{name:>6}: {hands_per_second:,.0f} hands/s")
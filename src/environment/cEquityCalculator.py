@@ -0,0 +1,254 @@
+# Description: This file contains the class EquityCalculator which is used to estimate the equity of a hand.
+# Author: Maxime Cornaton
+# Date: 2023
+
+import time
+from itertools import combinations
+from math import comb
+
+import numpy as np
+
+from environment.cDealer import Dealer
+from environment.cHandEvaluator import HandEvaluator
+from environment.cHandIndexer import HandIndexer
+from utils.cards import CARD_BIT_ARRAY, NUM_CARDS, cards_to_mask, mask_to_cards
+
+FULL_DECK_MASK = (1 << NUM_CARDS) - 1
+
+
+class EquityCalculator:
+
+    """
+    _summary_ : Class used to estimate the equity of a hand.
+    _description_ : This class is used to get the share of the pot a hand wins on average against
+        random opponent hands, given the known board. When the remaining deals are few (turn, river)
+        they are enumerated exhaustively, otherwise they are sampled. Either way the deals are scored
+        in batches through HandEvaluator.evaluate_mask_batch.
+        With cache_size set, the equities of the queries without dead cards are kept by canonical index
+        (see HandIndexer) : a query equal to a previous one up to a permutation of the suits is not scored
+        again, the oldest entry being dropped when the cache is full.
+    _attributes_ :
+        - num_samples : Number of sampled deals per query (upper bound when time_budget is set).
+        - time_budget : Time in seconds after which sampling stops, None to only use num_samples.
+        - exhaustive_limit : Largest enumeration size accepted before falling back to sampling.
+        - batch_size : Number of sampled deals scored per batch.
+        - seed : Seed of the dealer drawing the sampled deals.
+        - cache_size : Largest number of cached equities, 0 for no cache.
+        - samples : Number of deals scored by the last query (0 when read from the cache).
+        - samples_per_second : Throughput of the last query.
+    _returns_ : None
+    """
+
+    def __init__(self, num_samples: int = 10000, time_budget: float = None, exhaustive_limit: int = 250000,
+                 batch_size: int = 4096, seed: int = None, cache_size: int = 0) -> None:
+        if num_samples is None and time_budget is None:
+            raise ValueError("Either num_samples or time_budget must be set")
+        self.hand_evaluator = HandEvaluator()
+
+        self.num_samples = num_samples
+        self.time_budget = time_budget
+        self.exhaustive_limit = exhaustive_limit
+        self.batch_size = batch_size
+        self.dealer = Dealer(seed)
+        self.cache_size = cache_size
+        # (number of community cards, number of opponents, canonical index) to equity
+        self.cache = {}
+
+        self.samples = 0
+        self.samples_per_second = 0.0
+
+    """
+    _summary_ : Compute the equity of a hand.
+    _description_ : This method is used to compute the equity of a hand against random opponent hands.
+    _attributes_ :
+        - hand : Hand of the player (card ints).
+        - community_cards : Community cards already dealt (card ints).
+        - num_opponents : Number of opponents.
+        - dead_cards : Cards known to be out of the deck.
+    _returns_ : Equity, between 0 and 1, ties counted as split pots.
+    """
+
+    def equity(self, hand: list, community_cards: list, num_opponents: int, dead_cards: list = ()) -> float:
+        return self.equity_mask(cards_to_mask(hand), cards_to_mask(community_cards),
+                                num_opponents, cards_to_mask(dead_cards))
+
+    """
+    _summary_ : Compute the equity of a player in a game.
+    _description_ : This method is used to compute the equity of a player from the dealt state of the game,
+        against every other player still in the hand. A player left alone in the hand wins the pot.
+    _attributes_ :
+        - game : Game of poker.
+        - player : Player of the game.
+    _returns_ : Equity, between 0 and 1.
+    """
+
+    def equity_from_game(self, game, player) -> float:
+        if game.num_live < 2:
+            return 1.0
+        return self.equity_mask(player.hand_mask, game.community_mask, game.num_live - 1)
+
+    """
+    _summary_ : Compute the equity of a mask of cards.
+    _description_ : This method is used to compute the equity of a hand mask given the board mask.
+    _attributes_ :
+        - hand_mask : Mask of the hand.
+        - board_mask : Mask of the community cards (at most 5).
+        - num_opponents : Number of opponents.
+        - dead_mask : Mask of the cards known to be out of the deck.
+    _returns_ : Equity, between 0 and 1.
+    """
+
+    def equity_mask(self, hand_mask: int, board_mask: int, num_opponents: int, dead_mask: int = 0) -> float:
+        if num_opponents < 1:
+            raise ValueError("At least one opponent is needed to compute an equity")
+
+        key = None
+        if self.cache_size and not dead_mask:
+            board = mask_to_cards(board_mask)
+            hand_indexer = HandIndexer.get([2, len(board)] if board else [2])
+            key = (len(board), num_opponents,
+                   hand_indexer.index([mask_to_cards(hand_mask), board] if board else [mask_to_cards(hand_mask)]))
+            if key in self.cache:
+                self.samples = 0
+                return self.cache[key]
+
+        start = time.perf_counter()
+        unseen = np.array(mask_to_cards(FULL_DECK_MASK & ~(hand_mask | board_mask | dead_mask)), dtype=np.intp)
+        missing = 5 - board_mask.bit_count()
+        if missing + 2 * num_opponents > len(unseen):
+            raise ValueError("Not enough cards left to deal every opponent")
+
+        if self.exhaustive_size(len(unseen), missing, num_opponents) <= self.exhaustive_limit:
+            shares = self.score(hand_mask, board_mask,
+                                *self.enumerate_deals(unseen, missing, num_opponents))
+            total, count = float(shares.sum()), len(shares)
+        else:
+            total, count = 0.0, 0
+            while self.num_samples is None or count < self.num_samples:
+                size = self.batch_size if self.num_samples is None else min(self.batch_size, self.num_samples - count)
+                shares = self.score(hand_mask, board_mask,
+                                    *self.sample_deals(unseen, missing, num_opponents, size))
+                total += float(shares.sum())
+                count += size
+                if self.time_budget is not None and time.perf_counter() - start >= self.time_budget:
+                    break
+
+        self.samples = count
+        self.samples_per_second = count / max(time.perf_counter() - start, 1e-9)
+        if key is not None:
+            if len(self.cache) >= self.cache_size:
+                del self.cache[next(iter(self.cache))]
+            self.cache[key] = total / count
+        return total / count
+
+    """
+    _summary_ : Get the size of an exhaustive enumeration.
+    _description_ : This method is used to bound the number of deals built by enumerate_deals.
+    _attributes_ :
+        - num_unseen : Number of cards left in the deck.
+        - missing : Number of community cards left to deal.
+        - num_opponents : Number of opponents.
+    _returns_ : Upper bound of the number of deals.
+    """
+
+    def exhaustive_size(self, num_unseen: int, missing: int, num_opponents: int) -> int:
+        return comb(num_unseen, missing) * comb(num_unseen, 2) ** num_opponents
+
+    """
+    _summary_ : Enumerate the deals.
+    _description_ : This method is used to list every board completion and every ordered assignment
+        of opponent hands that does not reuse a card.
+    _attributes_ :
+        - unseen : Array of the cards left in the deck.
+        - missing : Number of community cards left to deal.
+        - num_opponents : Number of opponents.
+    _returns_ : Board completion masks (R,) and opponent hand masks (R, num_opponents).
+    """
+
+    def enumerate_deals(self, unseen: np.ndarray, missing: int, num_opponents: int) -> (np.ndarray, np.ndarray):
+        bits = CARD_BIT_ARRAY[unseen].tolist()
+        boards = np.array([sum(cards) for cards in combinations(bits, missing)], dtype=np.int64)
+        pairs = np.array([first | second for first, second in combinations(bits, 2)], dtype=np.int64)
+
+        used = boards
+        opponents = np.zeros((len(boards), 0), dtype=np.int64)
+        for _ in range(num_opponents):
+            rows, columns = np.nonzero(used[:, None] & pairs[None, :] == 0)
+            used = used[rows] | pairs[columns]
+            boards = boards[rows]
+            opponents = np.concatenate((opponents[rows], pairs[columns, None]), axis=1)
+        return boards, opponents
+
+    """
+    _summary_ : Sample the deals.
+    _description_ : This method is used to draw random board completions and opponent hands,
+        every card of a deal being distinct.
+    _attributes_ :
+        - unseen : Array of the cards left in the deck.
+        - missing : Number of community cards left to deal.
+        - num_opponents : Number of opponents.
+        - size : Number of deals.
+    _returns_ : Board completion masks (size,) and opponent hand masks (size, num_opponents).
+    """
+
+    def sample_deals(self, unseen: np.ndarray, missing: int, num_opponents: int, size: int) -> (np.ndarray, np.ndarray):
+        needed = missing + 2 * num_opponents
+        bits = CARD_BIT_ARRAY[self.dealer.deal_batch(size, needed, unseen)]
+        boards = bits[:, :missing].sum(axis=1)
+        opponents = bits[:, missing:].reshape(size, num_opponents, 2).sum(axis=2)
+        return boards, opponents
+
+    """
+    _summary_ : Score the deals.
+    _description_ : This method is used to get the share of the pot won by the hand on each deal.
+    _attributes_ :
+        - hand_mask : Mask of the hand.
+        - board_mask : Mask of the known community cards.
+        - boards : Board completion masks (R,).
+        - opponents : Opponent hand masks (R, num_opponents).
+    _returns_ : Share of the pot won on each deal (R,).
+    """
+
+    def score(self, hand_mask: int, board_mask: int, boards: np.ndarray, opponents: np.ndarray) -> np.ndarray:
+        boards = boards | board_mask
+        hero = self.hand_evaluator.evaluate_mask_batch(boards | hand_mask)
+        villains = self.hand_evaluator.evaluate_mask_batch(opponents | boards[:, None])
+
+        best = villains.max(axis=1)
+        ties = (villains == hero[:, None]).sum(axis=1)
+        return np.where(hero > best, 1.0, np.where(hero == best, 1.0 / (ties + 1), 0.0))
+
+
+"""
+_summary_ : Benchmark the equity calculator.
+_description_ : This method is used to measure the samples per second of the calculator on each street.
+_attributes_ :
+    - num_queries : Number of random queries per street.
+    - num_opponents : Number of opponents.
+    - seed : Seed of the random queries.
+_returns_ : Samples per second and number of samples per query, for each street.
+"""
+
+
+def benchmark(num_queries: int = 20, num_opponents: int = 1, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    equity_calculator = EquityCalculator(seed=seed)
+
+    results = {}
+    for street, board_size in (("preflop", 0), ("flop", 3), ("turn", 4), ("river", 5)):
+        samples, elapsed = 0, 0.0
+        for _ in range(num_queries):
+            cards = rng.permutation(NUM_CARDS)[:2 + board_size].tolist()
+            start = time.perf_counter()
+            equity_calculator.equity(cards[:2], cards[2:], num_opponents)
+            elapsed += time.perf_counter() - start
+            samples += equity_calculator.samples
+        results[street] = {'samples_per_second': samples / elapsed,
+                           'samples_per_query': samples / num_queries}
+    return results
+
+
+if __name__ == "__main__":
+    for street, result in benchmark().items():
+        print(f"{street:>8}: {result['samples_per_second']:,.0f} samples/s "
+              f"({result['samples_per_query']:,.0f} samples/query)")
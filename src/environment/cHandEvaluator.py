@@ -2,17 +2,44 @@
 # Author: Maxime Cornaton
 # Date: 2023
 
+import random
+import time
+from itertools import combinations
+
+import numpy as np
+
+from environment.cLookupTables import LookupTables
+from utils.cards import CARD_BIT, CARD_BIT_ARRAY, NUM_CARDS, RANK_MASK, decode_cards, encode_card
+
+
 class HandEvaluator:
 
     """
     _summary_ : Class used to evaluate the strength of a hand.
     _description_ : This class is used to evaluate the strength of a hand.
+        In "lookup" mode (default) the strength comes from precomputed rank tables and is totally
+        ordered, kickers included, so two hands compare with a single integer comparison.
+        In "predicate" mode the strength is only the category and ties need tiebreaker_rank.
+        Cards are ints in 0-51 (see utils.cards).
     _attributes_ :
+        - mode : Evaluation mode, "lookup" or "predicate".
         - hand_rankings : Dictionary containing the different hand rankings.
     _returns_ : None
     """
 
-    def __init__(self) -> None:
+    MODES = ("lookup", "predicate")
+
+    # Omaha hands use exactly 2 of the 4 hole cards and 3 of the board cards (all of them below 3) :
+    # index of the 6 hole pairs, and of the board triples for each board size
+    OMAHA_HOLE_INDEX = np.array(list(combinations(range(4), 2)))
+    OMAHA_BOARD_INDEX = [np.array(list(combinations(range(size), min(size, 3))), dtype=np.intp) for size in range(6)]
+
+    def __init__(self, mode: str = "lookup") -> None:
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown evaluation mode: {mode}")
+        self.mode = mode
+        self.tables = LookupTables.get() if mode == "lookup" else None
+
         self.hand_rankings = {
             "High Card": 0,
             "One Pair": 1,
@@ -36,7 +63,10 @@ class HandEvaluator:
     """
 
     def evaluate_hand(self, hand: list, community_cards: list) -> int:
-        all_cards = hand + community_cards
+        if self.mode == "lookup":
+            return self.evaluate_strength(hand, community_cards)
+
+        all_cards = decode_cards(hand + community_cards)
         all_cards.sort(key=lambda card: self.card_value_key(card['value']))
 
         for method_name in self.hand_rankings:
@@ -47,6 +77,120 @@ class HandEvaluator:
 
         return self.hand_rankings["High Card"]
 
+    """
+    _summary_ : Evaluate the strength of a hand with the lookup tables.
+    _description_ : This method is used to get the totally ordered strength of the best 5-card hand.
+    _attributes_ :
+        - hand : Hand of the player.
+        - community_cards : Community cards.
+    _returns_ : Strength of the hand, kickers included.
+    """
+
+    def evaluate_strength(self, hand: list, community_cards: list) -> int:
+        mask = 0
+        for card in hand:
+            mask |= CARD_BIT[card]
+        for card in community_cards:
+            mask |= CARD_BIT[card]
+        return self.evaluate_mask(mask)
+
+    """
+    _summary_ : Evaluate the strength of a mask of cards.
+    _description_ : This method is used to get the totally ordered strength of the best 5-card hand
+        contained in a 64-bit mask of up to 7 cards.
+    _attributes_ :
+        - mask : Mask of the hand and community cards.
+    _returns_ : Strength of the hand, kickers included.
+    """
+
+    def evaluate_mask(self, mask: int) -> int:
+        tables = self.tables or LookupTables.get()
+        spread = tables.spread
+
+        hearts = mask & RANK_MASK
+        diamonds = mask >> 13 & RANK_MASK
+        clubs = mask >> 26 & RANK_MASK
+        spades = mask >> 39 & RANK_MASK
+        strength = tables.rank[spread[hearts] + spread[diamonds] +
+                               spread[clubs] + spread[spades]]
+
+        for suit_mask in (hearts, diamonds, clubs, spades):
+            if suit_mask.bit_count() >= 5:
+                return max(strength, tables.flush[suit_mask])
+        return strength
+
+    """
+    _summary_ : Evaluate the strength of a batch of hands.
+    _description_ : This method is used to evaluate many hands in one vectorized call, without
+        going through evaluate_hand.
+    _attributes_ :
+        - hands : Array of card ints of shape (N, hand size).
+        - boards : Array of card ints of shape (N, board size), hand size + board size <= 7.
+    _returns_ : Array of N strengths, equal to evaluate_hand row by row.
+    """
+
+    def evaluate_batch(self, hands: np.ndarray, boards: np.ndarray) -> np.ndarray:
+        cards = np.concatenate((np.asarray(hands, dtype=np.intp),
+                                np.asarray(boards, dtype=np.intp).reshape(len(hands), -1)), axis=1)
+        return self.evaluate_mask_batch(CARD_BIT_ARRAY[cards].sum(axis=1))
+
+    """
+    _summary_ : Evaluate the strength of a batch of masks.
+    _description_ : This method is used to evaluate many 64-bit masks of up to 7 cards at once :
+        the rank multiset key is gathered suit by suit from the spread table and looked up in the
+        sorted rank keys, the suit masks are gathered from the flush table.
+    _attributes_ :
+        - masks : Array of N masks (int64).
+    _returns_ : Array of N strengths, equal to evaluate_mask element by element.
+    """
+
+    def evaluate_mask_batch(self, masks: np.ndarray) -> np.ndarray:
+        tables = self.tables or LookupTables.get()
+        masks = np.asarray(masks, dtype=np.int64)
+
+        keys = np.zeros(masks.shape, dtype=np.int64)
+        flush_strengths = np.zeros(masks.shape, dtype=np.uint32)
+        for suit in range(4):
+            suit_masks = masks >> (13 * suit) & RANK_MASK
+            keys += tables.spread_array[suit_masks]
+            np.maximum(flush_strengths, tables.flush_array[suit_masks], out=flush_strengths)
+
+        strengths = tables.rank_array[np.searchsorted(tables.rank_keys, keys)]
+        return np.maximum(strengths, flush_strengths)
+
+    """
+    _summary_ : Evaluate the strength of a batch of Omaha hands.
+    _description_ : This method is used to evaluate many Omaha hands at once : the masks of every hole pair
+        and every board triple come from the combination indexes, and the 60 (6 x 10) combined masks of
+        all the hands go through evaluate_mask_batch in one call.
+    _attributes_ :
+        - hands : Array of card ints of shape (N, 4).
+        - boards : Array of card ints of shape (N, board size).
+    _returns_ : Array of N strengths, the best of the combinations of each hand.
+    """
+
+    def evaluate_omaha_batch(self, hands: np.ndarray, boards: np.ndarray) -> np.ndarray:
+        hands = np.asarray(hands, dtype=np.intp)
+        boards = np.asarray(boards, dtype=np.intp).reshape(len(hands), -1)
+
+        pairs = CARD_BIT_ARRAY[hands][:, self.OMAHA_HOLE_INDEX].sum(axis=2)
+        triples = CARD_BIT_ARRAY[boards][:, self.OMAHA_BOARD_INDEX[boards.shape[1]]].sum(axis=2)
+        masks = pairs[:, :, None] | triples[:, None, :]
+        return self.evaluate_mask_batch(masks.reshape(len(hands), -1)).max(axis=1)
+
+    """
+    _summary_ : Get the category of a strength.
+    _description_ : This method is used to get the hand ranking of a strength returned by evaluate_hand.
+    _attributes_ :
+        - strength : Strength of the hand.
+    _returns_ : Category of the hand (see hand_rankings).
+    """
+
+    def get_category(self, strength: int) -> int:
+        if self.mode == "lookup":
+            return LookupTables.category(strength)
+        return strength
+
     """
     _summary_ : Evaluate the strength of a hand.
     _description_ : This method is used to evaluate the strength of a hand.
@@ -57,7 +201,7 @@ class HandEvaluator:
     """
 
     def tiebreaker_rank(self, hand: list, community_cards: list) -> int:
-        all_cards = hand + community_cards
+        all_cards = decode_cards(hand + community_cards)
         all_cards.sort(key=lambda card: self.card_value_key(card['value']))
 
         value_counts = self.get_value_counts(all_cards)
@@ -228,10 +372,50 @@ class HandEvaluator:
         return any(card['value'] == 'Ace' for card in cards)
 
 
+"""
+_summary_ : Benchmark the evaluation modes.
+_description_ : This method is used to measure the hands per second of each evaluation mode on random 7-card hands.
+_attributes_ :
+    - num_hands : Number of hands to evaluate.
+    - seed : Seed of the random hands.
+_returns_ : Hands per second of each mode.
+"""
+
+
+def benchmark(num_hands: int = 100000, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    deck = list(range(NUM_CARDS))
+    deals = [rng.sample(deck, 7) for _ in range(num_hands)]
+
+    results = {}
+    for mode in HandEvaluator.MODES:
+        hand_evaluator = HandEvaluator(mode)
+        start = time.perf_counter()
+        for cards in deals:
+            hand_evaluator.evaluate_hand(cards[:2], cards[2:])
+        results[mode] = num_hands / (time.perf_counter() - start)
+
+    cards = np.array(deals, dtype=np.int16)
+    hand_evaluator = HandEvaluator()
+    start = time.perf_counter()
+    hand_evaluator.evaluate_batch(cards[:, :2], cards[:, 2:])
+    results["batch"] = num_hands / (time.perf_counter() - start)
+
+    omaha_deals = np.array([rng.sample(deck, 9) for _ in range(num_hands)], dtype=np.int16)
+    start = time.perf_counter()
+    hand_evaluator.evaluate_omaha_batch(omaha_deals[:, :4], omaha_deals[:, 4:])
+    results["omaha batch"] = num_hands / (time.perf_counter() - start)
+    return results
+
+
 if __name__ == "__main__":
     hand_evaluator = HandEvaluator()
-    hand = [{'suit': 'Hearts', 'value': '6'}, {'suit': 'Clubs', 'value': '6'}]
-    community_cards = [{'suit': 'Diamonds', 'value': '2'}, {
-        'suit': 'Spades', 'value': '8'}, {'suit': 'Clubs', 'value': '10'}]
+    hand = [encode_card({'suit': 'Hearts', 'value': '6'}),
+            encode_card({'suit': 'Clubs', 'value': '6'})]
+    community_cards = [encode_card({'suit': 'Diamonds', 'value': '2'}), encode_card({
+        'suit': 'Spades', 'value': '8'}), encode_card({'suit': 'Clubs', 'value': '10'})]
     hand_strength = hand_evaluator.evaluate_hand(hand, community_cards)
     print("Hand strength:", hand_strength)
+
+    for mode, hands_per_second in benchmark().items():
+        print(f"{mode:>10}: {hands_per_second:,.0f} hands/s")
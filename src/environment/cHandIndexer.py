@@ -0,0 +1,408 @@
+# Description: This file contains the class HandIndexer which maps hands to a dense index up to suit isomorphism.
+# Author: Maxime Cornaton
+# Date: 2023
+
+import time
+from itertools import product
+from math import comb
+
+import numpy as np
+
+from utils.cards import NUM_CARDS, RANK_MASK
+
+NUM_SUITS = 4
+NUM_RANKS = 13
+
+# Number of ranks set in each 13-bit rank mask
+POPCOUNT = np.array([bin(mask).count("1") for mask in range(1 << NUM_RANKS)], dtype=np.int64)
+
+# Colex index of each rank mask among the masks with as many ranks : sum of comb(rank, i + 1) over its ranks
+COLEX = np.array([sum(comb(rank, i + 1) for i, rank in enumerate(r for r in range(NUM_RANKS) if mask >> r & 1))
+                  for mask in range(1 << NUM_RANKS)], dtype=np.int64)
+
+# Same tables as lists, faster to read one value at a time
+POPCOUNTS = POPCOUNT.tolist()
+COLEXES = COLEX.tolist()
+
+
+class HandIndexer:
+
+    """
+    _summary_ : Class used to index hands up to a permutation of the suits.
+    _description_ : This class is used to map the cards of a hand, dealt in rounds (e.g. [2, 3] for the hole
+        cards and the flop), to an index in [0, size) shared by every hand equal up to a permutation of the
+        suits, and back : the indexes are dense, so any table of the street is an array of size entries.
+        Each suit of a hand is described by how many cards it has in each round (its configuration) and by
+        which ranks (its index, the colex index of its ranks round after round among the ranks left).
+        Suits with different configurations are told apart by their configuration, sorted in a canonical
+        order ; suits with the same configuration are interchangeable, so only the multiset of their indexes
+        counts. The index of a hand is the offset of its sorted configurations plus the mixed-radix number
+        of the multiset indexes of its groups of equal suits (see Waugh, A Fast and Optimal Hand Isomorphism
+        Algorithm, 2013).
+        Holdem sizes : 169 for [2], 1,286,792 for [2, 3], 55,190,538 for [2, 3, 1], 2,428,287,420 for [2, 3, 1, 1].
+    _attributes_ :
+        - cards_per_round : Number of cards dealt in each round.
+    _returns_ : None
+    """
+
+    _instances = {}
+
+    def __init__(self, cards_per_round: list) -> None:
+        self.cards_per_round = tuple(cards_per_round)
+        self.num_rounds = len(self.cards_per_round)
+        if sum(self.cards_per_round) > NUM_CARDS:
+            raise ValueError(f"Cannot deal {sum(self.cards_per_round)} cards from a deck of {NUM_CARDS}")
+
+        # Canonical configurations : the configuration of each suit, sorted in decreasing order
+        configurations = set()
+        for suits in product(*(self.splits(cards) for cards in self.cards_per_round)):
+            per_suit = tuple(tuple(split[suit] for split in suits) for suit in range(NUM_SUITS))
+            if all(sum(configuration) <= NUM_RANKS for configuration in per_suit):
+                configurations.add(tuple(sorted(per_suit, reverse=True)))
+        self.configurations = sorted(configurations, reverse=True)
+        self.configuration_ids = {configuration: i for i, configuration in enumerate(self.configurations)}
+
+        # For each configuration and each suit position : size of the group of equal suits it belongs to,
+        # position of the suit in its group (from 1) and multiplier of the group in the mixed-radix index
+        self.group_sizes = np.ones((len(self.configurations), NUM_SUITS), dtype=np.int64)
+        self.group_positions = np.zeros((len(self.configurations), NUM_SUITS), dtype=np.int64)
+        self.multipliers = np.zeros((len(self.configurations), NUM_SUITS), dtype=np.int64)
+        sizes = []
+        for c, configuration in enumerate(self.configurations):
+            multiplier = 1
+            start = 0
+            while start < NUM_SUITS:
+                end = start
+                while end < NUM_SUITS and configuration[end] == configuration[start]:
+                    end += 1
+                group_size = comb(self.suit_size(configuration[start]) + end - start - 1, end - start)
+                self.group_sizes[c, start:end] = group_size
+                self.group_positions[c, start:end] = np.arange(1, end - start + 1)
+                self.multipliers[c, start:end] = multiplier
+                multiplier *= group_size
+                start = end
+            sizes.append(multiplier)
+        self.offsets = np.concatenate(([0], np.cumsum(sizes))).astype(np.int64)
+        self.size = int(self.offsets[-1])
+        # Same tables as lists for index : offset, then (position, multiplier) of each suit position
+        self.scalar_terms = [(int(self.offsets[c]), list(zip(self.group_positions[c].tolist(), self.multipliers[c].tolist())))
+                             for c in range(len(self.configurations))]
+
+        # Packed configurations, to look them up in batch
+        self.packed_ids = {self.pack(configuration): i for i, configuration in enumerate(self.configurations)}
+        self.packed_keys = np.array(sorted(self.packed_ids), dtype=np.int64)
+        self.packed_values = np.array([self.packed_ids[key] for key in self.packed_keys.tolist()], dtype=np.intp)
+
+    """
+    _summary_ : Get a shared indexer.
+    _description_ : This method is used to build the indexer of a list of rounds once per process and share it.
+    _attributes_ :
+        - cards_per_round : Number of cards dealt in each round.
+    _returns_ : Shared HandIndexer instance.
+    """
+
+    @classmethod
+    def get(cls, cards_per_round: list) -> 'HandIndexer':
+        key = tuple(cards_per_round)
+        if key not in cls._instances:
+            cls._instances[key] = cls(key)
+        return cls._instances[key]
+
+    """
+    _summary_ : List the splits of a round.
+    _description_ : This method is used to list the ways of spreading the cards of a round over the suits.
+    _attributes_ :
+        - cards : Number of cards of the round.
+    _returns_ : List of tuples of NUM_SUITS counts.
+    """
+
+    @staticmethod
+    def splits(cards: int) -> list:
+        return [split for split in product(range(min(cards, NUM_RANKS) + 1), repeat=NUM_SUITS) if sum(split) == cards]
+
+    """
+    _summary_ : Get the number of indexes of a suit.
+    _description_ : This method is used to count the ways of choosing the ranks of a suit with a configuration.
+    _attributes_ :
+        - configuration : Number of cards of the suit in each round.
+    _returns_ : Number of suit indexes.
+    """
+
+    @staticmethod
+    def suit_size(configuration: tuple) -> int:
+        size = 1
+        left = NUM_RANKS
+        for cards in configuration:
+            size *= comb(left, cards)
+            left -= cards
+        return size
+
+    """
+    _summary_ : Pack a configuration.
+    _description_ : This method is used to write the counts of the suits of a canonical configuration in
+        one integer, 4 bits per count.
+    _attributes_ :
+        - configuration : Configuration of each suit, sorted.
+    _returns_ : Packed configuration.
+    """
+
+    def pack(self, configuration: tuple) -> int:
+        packed = 0
+        for suit_configuration in configuration:
+            for cards in suit_configuration:
+                packed = packed << 4 | cards
+        return packed
+
+    """
+    _summary_ : Index a hand.
+    _description_ : This method is used to get the index of a hand.
+    _attributes_ :
+        - rounds : Cards of each round (lists of card ints, see utils.cards).
+    _returns_ : Index in [0, size).
+    """
+
+    def index(self, rounds: list) -> int:
+        if len(rounds) != self.num_rounds:
+            raise ValueError(f"Expected {self.num_rounds} rounds of cards, not {len(rounds)}")
+
+        # Ranks of each round in each suit
+        masks = [[0] * self.num_rounds for _ in range(NUM_SUITS)]
+        for r, cards in enumerate(rounds):
+            if len(cards) != self.cards_per_round[r]:
+                raise ValueError(f"Round {r} has {self.cards_per_round[r]} cards, not {len(cards)}")
+            for card in cards:
+                suit, rank = divmod(card, NUM_RANKS)
+                masks[suit][r] |= 1 << rank
+
+        # Decreasing configurations, increasing indexes among equal configurations
+        suits = sorted(((tuple(POPCOUNTS[mask] for mask in suit_masks), -self.suit_index(suit_masks))
+                        for suit_masks in masks), reverse=True)
+
+        index, terms = self.scalar_terms[self.configuration_ids[tuple(configuration for configuration, _ in suits)]]
+        for (_, suit_index), (position, multiplier) in zip(suits, terms):
+            index += comb(position - 1 - suit_index, position) * multiplier
+        return index
+
+    """
+    _summary_ : Get the index of a suit.
+    _description_ : This method is used to number the ranks of a suit round after round, each round choosing
+        among the ranks not used by the previous ones.
+    _attributes_ :
+        - suit_masks : Rank mask of the suit in each round.
+    _returns_ : Suit index.
+    """
+
+    def suit_index(self, suit_masks: list) -> int:
+        index = 0
+        multiplier = 1
+        used = 0
+        for mask in suit_masks:
+            if used:
+                index += COLEXES[self.compress(mask, used)] * multiplier
+                multiplier *= comb(NUM_RANKS - POPCOUNTS[used], POPCOUNTS[mask])
+            else:
+                index = COLEXES[mask]
+                multiplier = comb(NUM_RANKS, POPCOUNTS[mask])
+            used |= mask
+        return index
+
+    """
+    _summary_ : Compress a rank mask.
+    _description_ : This method is used to renumber the ranks of a mask among the ranks not used yet.
+    _attributes_ :
+        - mask : Rank mask.
+        - used : Rank mask of the ranks already used.
+    _returns_ : Mask of the renumbered ranks.
+    """
+
+    @staticmethod
+    def compress(mask: int, used: int) -> int:
+        compressed = 0
+        while mask:
+            # Each rank moves down by the number of used ranks below it
+            low = mask & -mask
+            compressed |= low >> POPCOUNTS[used & (low - 1)]
+            mask ^= low
+        return compressed
+
+    """
+    _summary_ : Get a hand of an index.
+    _description_ : This method is used to get the canonical hand of an index, the inverse of index : its suits
+        are the suits of the configuration in canonical order.
+    _attributes_ :
+        - index : Index in [0, size).
+    _returns_ : Cards of each round (sorted lists of card ints).
+    """
+
+    def unindex(self, index: int) -> list:
+        if not 0 <= index < self.size:
+            raise ValueError(f"Index {index} out of [0, {self.size})")
+
+        c = int(np.searchsorted(self.offsets, index, side='right')) - 1
+        configuration = self.configurations[c]
+        rest = index - int(self.offsets[c])
+
+        suit_indexes = [0] * NUM_SUITS
+        start = 0
+        while start < NUM_SUITS:
+            group_size = int(self.group_sizes[c, start])
+            end = start
+            while end < NUM_SUITS and configuration[end] == configuration[start]:
+                end += 1
+            group_index = rest % group_size
+            rest //= group_size
+            # Unrank the multiset : largest first, position i holding index + i - 1
+            for position in range(end - start, 0, -1):
+                value = position - 1
+                while comb(value + 1, position) <= group_index:
+                    value += 1
+                group_index -= comb(value, position)
+                suit_indexes[start + position - 1] = value - position + 1
+            start = end
+
+        rounds = [[] for _ in range(self.num_rounds)]
+        for suit in range(NUM_SUITS):
+            suit_index = suit_indexes[suit]
+            used = 0
+            for r, cards in enumerate(configuration[suit]):
+                left = NUM_RANKS - POPCOUNTS[used]
+                round_index = suit_index % comb(left, cards)
+                suit_index //= comb(left, cards)
+                ranks = [rank for rank in range(NUM_RANKS) if not used >> rank & 1]
+                for position in self.unrank_colex(round_index, cards):
+                    rounds[r].append(suit * NUM_RANKS + ranks[position])
+                    used |= 1 << ranks[position]
+        return [sorted(cards) for cards in rounds]
+
+    """
+    _summary_ : Unrank a combination.
+    _description_ : This method is used to get the positions of a combination from its colex index.
+    _attributes_ :
+        - index : Colex index.
+        - size : Number of positions.
+    _returns_ : List of positions.
+    """
+
+    @staticmethod
+    def unrank_colex(index: int, size: int) -> list:
+        positions = []
+        for i in range(size, 0, -1):
+            position = i - 1
+            while comb(position + 1, i) <= index:
+                position += 1
+            index -= comb(position, i)
+            positions.append(position)
+        return positions
+
+    """
+    _summary_ : Index a batch of hands.
+    _description_ : This method is used to compute index for many hands at once : the suit indexes come from
+        the COLEX table after renumbering the ranks with vector operations, and the configurations are
+        looked up by their packed value.
+    _attributes_ :
+        - rounds : Array of card ints for each round (N, cards of the round), or one array (N, total cards)
+            holding the rounds one after the other.
+    _returns_ : Array of N indexes (int64).
+    """
+
+    def index_batch(self, rounds) -> np.ndarray:
+        if isinstance(rounds, np.ndarray):
+            bounds = np.cumsum((0,) + self.cards_per_round)
+            rounds = [rounds[:, bounds[r]:bounds[r + 1]] for r in range(self.num_rounds)]
+        rounds = [np.asarray(cards, dtype=np.int64) for cards in rounds]
+        num_hands = len(rounds[0])
+
+        suit_shifts = NUM_RANKS * np.arange(NUM_SUITS, dtype=np.int64)
+        suit_indexes = np.zeros((num_hands, NUM_SUITS), dtype=np.int64)
+        multipliers = np.ones((num_hands, NUM_SUITS), dtype=np.int64)
+        packed = np.zeros((num_hands, NUM_SUITS), dtype=np.int64)
+        used = np.zeros((num_hands, NUM_SUITS), dtype=np.int64)
+        for cards in rounds:
+            bits = (np.int64(1) << cards).sum(axis=1)
+            masks = bits[:, None] >> suit_shifts & RANK_MASK
+            counts = POPCOUNT[masks]
+
+            compressed = np.zeros_like(masks)
+            for rank in range(NUM_RANKS):
+                below = used & ((1 << rank) - 1)
+                compressed |= (masks >> rank & 1) << (rank - POPCOUNT[below])
+            suit_indexes += COLEX[compressed] * multipliers
+            multipliers *= comb_array(NUM_RANKS - POPCOUNT[used], counts)
+            packed = packed << 4 | counts
+            used |= masks
+
+        # Decreasing configurations, increasing indexes among equal configurations
+        order = np.argsort((packed.max() + 1 - packed) * (suit_indexes.max() + 1) + suit_indexes, axis=1)
+        packed = np.take_along_axis(packed, order, axis=1)
+        suit_indexes = np.take_along_axis(suit_indexes, order, axis=1)
+
+        keys = np.zeros(num_hands, dtype=np.int64)
+        for suit in range(NUM_SUITS):
+            keys = keys << (4 * self.num_rounds) | packed[:, suit]
+        c = self.packed_values[np.searchsorted(self.packed_keys, keys)]
+
+        positions = self.group_positions[c]
+        terms = comb_array(suit_indexes + positions - 1, positions)
+        return self.offsets[c] + (terms * self.multipliers[c]).sum(axis=1)
+
+
+"""
+_summary_ : Compute binomial coefficients.
+_description_ : This method is used to compute comb(n, k) element by element for small k, exactly in int64.
+_attributes_ :
+    - n : Array of n.
+    - k : Array of k (0 to 13).
+_returns_ : Array of comb(n, k), 0 where k > n.
+"""
+
+
+def comb_array(n: np.ndarray, k: np.ndarray) -> np.ndarray:
+    n, k = np.broadcast_arrays(np.asarray(n, dtype=np.int64), np.asarray(k, dtype=np.int64))
+    result = np.ones(n.shape, dtype=np.int64)
+    for i in range(int(k.max(initial=0))):
+        active = i < k
+        result = np.where(active, result * (n - i) // (i + 1), result)
+    return np.where(k <= n, result, 0)
+
+
+"""
+_summary_ : Benchmark the indexer.
+_description_ : This method is used to measure the hands indexed per second on each street, one by one and
+    in batch, and the hands unindexed per second.
+_attributes_ :
+    - num_hands : Number of hands.
+    - seed : Seed of the random hands.
+_returns_ : Hands per second of each way, for each street.
+"""
+
+
+def benchmark(num_hands: int = 100000, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    results = {}
+    for street, cards_per_round in (("preflop", [2]), ("flop", [2, 3]), ("turn", [2, 3, 1]), ("river", [2, 3, 1, 1])):
+        hand_indexer = HandIndexer.get(cards_per_round)
+        deals = rng.random((num_hands, NUM_CARDS)).argsort(axis=1)[:, :sum(cards_per_round)]
+        bounds = np.cumsum([0] + cards_per_round)
+        hands = [[deal[bounds[r]:bounds[r + 1]] for r in range(len(cards_per_round))]
+                 for deal in deals[:num_hands // 10].tolist()]
+
+        start = time.perf_counter()
+        indexes = [hand_indexer.index(hand) for hand in hands]
+        single = len(hands) / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        hand_indexer.index_batch(deals)
+        batch = num_hands / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for index in indexes:
+            hand_indexer.unindex(index)
+        inverse = len(indexes) / (time.perf_counter() - start)
+        results[street] = {'size': hand_indexer.size, 'single': single, 'batch': batch, 'unindex': inverse}
+    return results
+
+
+if __name__ == "__main__":
+    for street, result in benchmark().items():
+        print(f"{street:>8}: {result['size']:>13,} indexes, {result['single']:,.0f} hands/s, "
+              f"{result['batch']:,.0f} hands/s in batch, {result['unindex']:,.0f} unindexed/s")
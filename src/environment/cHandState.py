@@ -0,0 +1,95 @@
+# Description: This file contains the class HandState which tracks the strength of a hand as cards are dealt.
+# Author: Maxime Cornaton
+# Date: 2023
+
+from environment.cLookupTables import LookupTables
+from utils.cards import CARD_BIT, CARD_RANK, CARD_SUIT
+
+
+class HandState:
+
+    """
+    _summary_ : Class used to follow the strength of a hand card by card.
+    _description_ : This class is used to keep what the lookup evaluator needs up to date as the hole
+        cards, the flop, the turn and the river arrive, so the strength of the hand is a table lookup at
+        any street instead of an evaluation of all its cards. Adding a card costs O(1) : the rank
+        multiset key (3 bits of count per rank, see LookupTables.RANK_WEIGHT) gets the weight of its rank,
+        and the 13-bit mask of its suit gets its bit.
+    _attributes_ :
+        - tables : Lookup tables, shared ones by default.
+    _returns_ : None
+    """
+
+    def __init__(self, tables: LookupTables = None) -> None:
+        self.tables = tables or LookupTables.get()
+        self.suit_masks = [0] * 4
+        self.reset()
+
+    """
+    _summary_ : Reset the state.
+    _description_ : This method is used to empty the hand.
+    _attributes_ : None
+    _returns_ : None
+    """
+
+    def reset(self) -> None:
+        self.mask = 0
+        self.key = 0
+        self.suit_masks[:] = (0, 0, 0, 0)
+        self.flush_suit = -1
+        self.num_cards = 0
+        self.cached_strength = -1
+
+    """
+    _summary_ : Add a card.
+    _description_ : This method is used to add a dealt card to the hand.
+    _attributes_ :
+        - card : Card int (see utils.cards).
+    _returns_ : None
+    """
+
+    def add(self, card: int) -> None:
+        bit = CARD_BIT[card]
+        if self.mask & bit:
+            raise ValueError(f"Card {card} is already in the hand")
+        self.mask |= bit
+        self.key += LookupTables.RANK_WEIGHT[CARD_RANK[card]]
+
+        suit = CARD_SUIT[card]
+        self.suit_masks[suit] |= 1 << CARD_RANK[card]
+        # At most one suit can hold 5 of 7 cards
+        if self.flush_suit < 0 and self.suit_masks[suit].bit_count() >= 5:
+            self.flush_suit = suit
+
+        self.num_cards += 1
+        self.cached_strength = -1
+
+    def add_cards(self, cards: list) -> None:
+        for card in cards:
+            self.add(card)
+
+    """
+    _summary_ : Get the strength.
+    _description_ : This method is used to get the strength of the best hand of the cards added so far,
+        equal to HandEvaluator.evaluate_mask of the same cards.
+    _attributes_ : None
+    _returns_ : Strength of the hand, kickers included.
+    """
+
+    def strength(self) -> int:
+        if self.cached_strength < 0:
+            strength = self.tables.rank[self.key]
+            if self.flush_suit >= 0:
+                strength = max(strength, self.tables.flush[self.suit_masks[self.flush_suit]])
+            self.cached_strength = strength
+        return self.cached_strength
+
+    """
+    _summary_ : Get the category.
+    _description_ : This method is used to get the hand ranking of the cards added so far.
+    _attributes_ : None
+    _returns_ : Category of the hand (see HandEvaluator.hand_rankings).
+    """
+
+    def category(self) -> int:
+        return LookupTables.category(self.strength())
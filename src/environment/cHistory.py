@@ -2,88 +2,346 @@
 # Author: Maxime Cornaton
 # Date: 2023
 
-import json
+import numpy as np
 
-from environment.cPlayer import Player
 from environment.ePlayerAction import PlayerAction
+from utils.cards import decode_cards
 from utils.helpers import save_json
 
+# Integer code of each action in the binary history, same order as the enum
+ACTION_CODES = {action: i for i, action in enumerate(PlayerAction)}
+CODE_ACTIONS = list(PlayerAction)
+
+# Actions whose amount goes from the stack of the player to the pot
+BETTING_ACTIONS = np.array([action in (PlayerAction.CALL, PlayerAction.BET, PlayerAction.RAISE, PlayerAction.ALL_IN)
+                            for action in PlayerAction])
+
 
 class History:
 
     """
     _summary_ : Class used to save the history of the game.
-    _description_ : This class is used to save the history of the game.
+    _description_ : This class is used to record a hand as an event log : the deal (hole cards, stacks,
+        blinds and board) and one small integer record per action, written in arrays allocated once and
+        reused from hand to hand. The state of the game at the start of a round is not copied while playing :
+        it is rebuilt on demand from the log (see get_state).
     _attributes_ :
-        - history : History of the game.
+        - num_players : Largest number of players in the game (the number of the current hand is set by deal).
+        - max_rounds : Maximum number of rounds.
+        - num_hole_cards : Number of hole cards per player.
     _returns_ : None
     """
 
-    def __init__(self) -> None:
+    def __init__(self, num_players: int, max_rounds: int, num_hole_cards: int = 2) -> None:
+        self.num_players = num_players
+        self.max_rounds = max_rounds
+
+        # Deal, indexed by seat (position of the player when the cards were dealt)
+        self.players = []
+        self.hole_cards = np.full((num_players, num_hole_cards), -1, dtype=np.int8)
+        self.stacks = np.zeros(num_players, dtype=np.float64)
+        self.posted = np.zeros(num_players, dtype=np.float64)
+        self.payouts = np.zeros(num_players, dtype=np.float64)
+        self.board = np.full(5, -1, dtype=np.int8)
+
+        # Rounds : first seat to act, pot, number of community cards and hand strengths when the round starts
+        self.round_first_seats = np.zeros(max_rounds, dtype=np.int8)
+        self.round_pots = np.zeros(max_rounds, dtype=np.float64)
+        self.round_board_sizes = np.zeros(max_rounds, dtype=np.int8)
+        self.round_strengths = np.zeros((max_rounds, num_players), dtype=np.int32)
+
+        # Actions
+        self.event_rounds = np.zeros(num_players * max_rounds, dtype=np.int8)
+        self.event_seats = np.zeros(num_players * max_rounds, dtype=np.int8)
+        self.event_actions = np.zeros(num_players * max_rounds, dtype=np.int8)
+        self.event_amounts = np.zeros(num_players * max_rounds, dtype=np.float64)
+        # Pot once the action is played, blinds included
+        self.event_pots = np.zeros(num_players * max_rounds, dtype=np.float64)
+
         self.reset()
 
     """
     _summary_ : Reset the history.
-    _description_ : This method is used to reset the history.
+    _description_ : This method is used to reset the history, the arrays being kept.
     _attributes_ : None
     _returns_ : None
     """
 
     def reset(self) -> None:
-        self.history = [
-            # {
-            #     'round': 0,
-            #     'big_blind': 0,
-            #     'small_blind': 0,
-            #     'pot': 0,
-            #     'community_cards': [],
-            #     'players_state': [
-            #         {
-            #             'player': Player,
-            #             'stack': 0,
-            #             'cards': []
-            #         },
-            #     ],
-            #     'events': [
-            #         {
-            #             'player': Player,
-            #             'action': PlayerAction,
-            #             'amount': 0
-            #         },
-            #     ]
-
-            # },
-        ]
-
-    """
-    _summary_ : Add a new entry to the history.
-    _description_ : This method is used to add a new entry to the history.
+        self.small_blind = 0
+        self.big_blind = 0
+        self.board_size = 0
+        self.num_rounds = 0
+        self.num_events = 0
+        self.pot = 0
+        self.posted[:] = 0
+        self.payouts[:] = 0
+
+    """
+    _summary_ : Record the deal.
+    _description_ : This method is used to record the hole cards and the stacks of the players, in seat order.
+    _attributes_ :
+        - players : Players of the game.
+        - small_blind : Small blind amount.
+        - big_blind : Big blind amount.
+    _returns_ : None
+    """
+
+    def deal(self, players: list, small_blind: int, big_blind: int) -> None:
+        if len(players) > len(self.stacks):
+            raise ValueError(f"History is sized for {len(self.stacks)} players, not {len(players)}")
+        self.num_players = len(players)
+        self.players = players
+        self.small_blind = small_blind
+        self.big_blind = big_blind
+        for seat, player in enumerate(players):
+            self.hole_cards[seat] = player.hand
+            self.stacks[seat] = player.chips
+
+    """
+    _summary_ : Record a community card.
+    _description_ : This method is used to record the next card of the board.
+    _attributes_ :
+        - card : Card int.
+    _returns_ : None
+    """
+
+    def deal_community_card(self, card: int) -> None:
+        self.board[self.board_size] = card
+        self.board_size += 1
+
+    """
+    _summary_ : Record a blind.
+    _description_ : This method is used to record the chips a player puts in the pot before acting.
+    _attributes_ :
+        - seat : Seat of the player.
+        - amount : Amount of the blind.
+    _returns_ : None
+    """
+
+    def post_blind(self, seat: int, amount: int) -> None:
+        self.posted[seat] += amount
+        self.pot += amount
+
+    """
+    _summary_ : Record the start of a round.
+    _description_ : This method is used to record what the state of the round is built from.
+    _attributes_ :
+        - round : Round of the game.
+        - first_seat : Seat of the first player to act.
+        - pot : Pot at the start of the round.
+        - strengths : Strength of each hand with the community cards dealt so far, by seat.
+    _returns_ : None
+    """
+
+    def start_round(self, round: int, first_seat: int, pot: int, strengths: list) -> None:
+        self.round_first_seats[round] = first_seat
+        self.round_pots[round] = pot
+        self.round_board_sizes[round] = self.board_size
+        self.round_strengths[round, :len(strengths)] = strengths
+        self.num_rounds = round + 1
+
+    """
+    _summary_ : Record an action.
+    _description_ : This method is used to append an action to the log with the pot once it is played,
+        growing the arrays if a hand has more actions than one per player and round.
+    _attributes_ :
+        - round : Round of the game.
+        - seat : Seat of the player.
+        - action : Action of the player.
+        - amount : Amount of the action.
+    _returns_ : None
+    """
+
+    def record(self, round: int, seat: int, action: PlayerAction, amount: int) -> None:
+        i = self.num_events
+        if i == len(self.event_rounds):
+            for name in ('event_rounds', 'event_seats', 'event_actions', 'event_amounts', 'event_pots'):
+                array = getattr(self, name)
+                setattr(self, name, np.concatenate([array, np.zeros_like(array)]))
+
+        self.event_rounds[i] = round
+        self.event_seats[i] = seat
+        self.event_actions[i] = ACTION_CODES[action]
+        self.event_amounts[i] = amount
+        if BETTING_ACTIONS[self.event_actions[i]]:
+            self.pot += amount
+        self.event_pots[i] = self.pot
+        self.num_events = i + 1
+
+    """
+    _summary_ : Record the showdown.
+    _description_ : This method is used to record the chips won by each player (see Showdown).
+    _attributes_ :
+        - payouts : Chips won by each player, by seat.
+    _returns_ : None
+    """
+
+    def settle(self, payouts: list) -> None:
+        self.payouts[:len(payouts)] = payouts
+
+    """
+    _summary_ : Get the contributions.
+    _description_ : This method is used to get the chips put in the pot by each player during the hand.
+    _attributes_ : None
+    _returns_ : Contributions (num_players,), by seat.
+    """
+
+    def get_contributions(self) -> np.ndarray:
+        n = self.num_events
+        contributions = self.posted[:self.num_players].copy()
+        np.add.at(contributions, self.event_seats[:n],
+                  self.event_amounts[:n] * BETTING_ACTIONS[self.event_actions[:n]])
+        return contributions
+
+    """
+    _summary_ : Get the final stacks.
+    _description_ : This method is used to get the stack of each player once the pot is shared.
+    _attributes_ : None
+    _returns_ : Stacks (num_players,), by seat.
+    """
+
+    def get_final_stacks(self) -> np.ndarray:
+        return self.stacks[:self.num_players] - self.get_contributions() + self.payouts[:self.num_players]
+
+    """
+    _summary_ : Get the stacks at the start of every round.
+    _description_ : This method is used to replay the chips put in the pot (blinds, then betting actions).
+    _attributes_ : None
+    _returns_ : Stacks (num_rounds, num_players), by seat.
+    """
+
+    def get_round_stacks(self) -> np.ndarray:
+        n = self.num_events
+        bets = np.zeros((self.num_rounds, self.num_players))
+        amounts = self.event_amounts[:n] * BETTING_ACTIONS[self.event_actions[:n]]
+        np.add.at(bets, (self.event_rounds[:n], self.event_seats[:n]), amounts)
+
+        spent = np.zeros((self.num_rounds, self.num_players))
+        spent[1:] = np.cumsum(bets, axis=0)[:-1] + self.posted[:self.num_players]
+        return self.stacks[:self.num_players] - spent
+
+    """
+    _summary_ : Get the players still in the hand at the start of every round.
+    _description_ : This method is used to replay the folds, busted players (no chips when dealt) sitting
+        the hand out.
+    _attributes_ : None
+    _returns_ : Whether each player still holds their cards (num_rounds, num_players), by seat.
+    """
+
+    def get_round_live(self) -> np.ndarray:
+        n = self.num_events
+        live = np.empty((self.num_rounds, self.num_players), dtype=bool)
+        live[:] = self.stacks[:self.num_players] > 0
+        folds = np.flatnonzero(self.event_actions[:n] == ACTION_CODES[PlayerAction.FOLD])
+        for round, seat in zip(self.event_rounds[folds].tolist(), self.event_seats[folds].tolist()):
+            live[round + 1:, seat] = False
+        return live
+
+    """
+    _summary_ : Get the state of a round.
+    _description_ : This method is used to rebuild the state of the game at the start of a round,
+        with the actions of the round, players being listed in the order they acted.
     _attributes_ :
         - round : Round of the game.
-        - state : State of the game.
-        - decision : Decision of the players
+    _returns_ : State of the round.
     """
 
-    def add(self, round: int, state: dict, events: dict) -> None:
-        self.history.append({
+    def get_state(self, round: int, round_stacks: np.ndarray = None) -> dict:
+        if round_stacks is None:
+            round_stacks = self.get_round_stacks()
+        first_seat = int(self.round_first_seats[round])
+        seats = [(first_seat + i) % self.num_players for i in range(self.num_players)]
+        events = np.flatnonzero(self.event_rounds[:self.num_events] == round)
+
+        return {
             'round': round,
-            'big_blind': state['big_blind'],
-            'small_blind': state['small_blind'],
-            'pot': state['pot'],
-            'community_cards': state['community_cards'].copy(),
-            'players_state': state['players_state'].copy(),
-            'events': events
-        })
-
-    """ 
+            'big_blind': self.big_blind,
+            'small_blind': self.small_blind,
+            'pot': self.round_pots[round].item(),
+            'community_cards': self.board[:self.round_board_sizes[round]].tolist(),
+            'players_state': [{
+                'player': self.players[seat],
+                'stack': round_stacks[round, seat].item(),
+                'cards': self.hole_cards[seat].tolist(),
+                'strength': self.round_strengths[round, seat].item()
+            } for seat in seats],
+            'events': [{
+                'player': self.players[self.event_seats[i]],
+                'action': CODE_ACTIONS[self.event_actions[i]],
+                'amount': self.event_amounts[i].item(),
+                'pot': self.event_pots[i].item()
+            } for i in events]
+        }
+
+    """
     _summary_ : Get the history.
-    _description_ : This method is used to get the history.
+    _description_ : This method is used to get the state of every round (see get_state).
     _attributes_ : None
     _returns_ : History of the game.
     """
 
-    def get(self) -> dict:
-        return self.history
+    def get(self) -> list:
+        round_stacks = self.get_round_stacks()
+        return [self.get_state(round, round_stacks) for round in range(self.num_rounds)]
+
+    """
+    _summary_ : Export the history.
+    _description_ : This method is used to get a copy of the history where cards are shown as dicts.
+    _attributes_ : None
+    _returns_ : History of the game, readable.
+    """
+
+    def export(self) -> list:
+        return [{
+            **entry,
+            'community_cards': decode_cards(entry['community_cards']),
+            'players_state': [{
+                **player_state,
+                'cards': decode_cards(player_state['cards'])
+            } for player_state in entry['players_state']]
+        } for entry in self.get()]
+
+    """
+    _summary_ : Get the history as columns.
+    _description_ : This method is used to encode the history with integer card and action codes, as rows of
+        three tables : 'hands' (one row per hand), 'seats' (one row per player) and 'events' (one row per action,
+        with the pot once the action is played). Cards are ints in 0-51, -1 when not dealt.
+    _attributes_ :
+        - hand_id : Id of the hand.
+    _returns_ : Dictionary of table name to columns (see utils.cColumnStore).
+    """
+
+    def to_columns(self, hand_id: int) -> dict:
+        num_seats = len(self.players)
+        n = self.num_events
+        community_cards = np.full((1, 5), -1, dtype=np.int8)
+        if self.num_rounds:
+            board_size = self.round_board_sizes[self.num_rounds - 1]
+            community_cards[0, :board_size] = self.board[:board_size]
+
+        return {
+            'hands': {
+                'hand_id': np.array([hand_id], dtype=np.int64),
+                'num_players': np.array([num_seats], dtype=np.int8),
+                'community_cards': community_cards,
+            },
+            'seats': {
+                'hand_id': np.full(num_seats, hand_id, dtype=np.int64),
+                'seat': np.arange(num_seats, dtype=np.int8),
+                'cards': self.hole_cards[:num_seats].copy(),
+                'stack': self.stacks[:num_seats].astype(np.int32),
+                'payout': self.payouts[:num_seats].astype(np.int32),
+            },
+            'events': {
+                'hand_id': np.full(n, hand_id, dtype=np.int64),
+                'round': self.event_rounds[:n].copy(),
+                'seat': self.event_seats[:n].copy(),
+                'action': self.event_actions[:n].copy(),
+                'amount': self.event_amounts[:n].astype(np.int32),
+                'pot': self.event_pots[:n].astype(np.int32),
+            },
+        }
 
     """
     _summary_ : Save the history.
@@ -94,4 +352,4 @@ class History:
     """
 
     def save(self, path: str) -> None:
-        save_json(self.history, path)
+        save_json(self.export(), path)
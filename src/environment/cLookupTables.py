@@ -0,0 +1,230 @@
+# Description: This file contains the precomputed rank tables used by the lookup hand evaluator.
+# Author: Maxime Cornaton
+# Date: 2023
+
+import os
+
+import numpy as np
+
+TABLES_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', 'tables')
+
+
+class LookupTables:
+
+    """
+    _summary_ : Class holding the precomputed hand strength tables.
+    _description_ : This class enumerates once every rank multiset of up to 7 cards and every
+        13-bit suited rank mask, and stores the strength of the best 5-card hand they contain.
+        A strength is a single 32-bit integer, totally ordered, kickers included :
+        category << CATEGORY_SHIFT | five 4-bit rank nibbles, most significant first.
+        The category matches HandEvaluator.hand_rankings.
+        The arrays are built once and cached as .npy files under data/tables, which are memory-mapped when
+        loaded : a process starting (a worker, a benchmark case) only rebuilds the Python lists and dict
+        used by the scalar evaluation from them.
+    _attributes_ :
+        - flush : Strength of the best flush / straight flush for each 13-bit suit mask (0 below 5 cards).
+        - rank : Strength of the best non-flush hand for each rank multiset key.
+        - spread : Rank multiset key of each 13-bit suit mask, so the key of a hand mask is the
+            sum of the spread of its four suits.
+        - rank_keys : Sorted NumPy array of the keys of rank.
+        - rank_array : NumPy array of the values of rank, aligned with rank_keys.
+        - spread_array : NumPy copy of spread.
+        - flush_array : NumPy copy of flush.
+    _returns_ : None
+    """
+
+    CATEGORY_SHIFT = 20
+    MAX_CARDS = 7
+
+    ARRAYS = ("rank_keys", "rank_array", "spread_array", "flush_array")
+
+    # A rank multiset is keyed by the sum of RANK_WEIGHT over its cards : 3 bits per rank
+    # hold the count (at most 4), so the key is unique and cheap to build incrementally.
+    RANK_WEIGHT = [1 << (3 * rank) for rank in range(13)]
+
+    # (top rank, rank mask) of every straight, best first. The wheel A-2-3-4-5 tops at the 5.
+    STRAIGHTS = [(top, 0b11111 << (top - 4)) for top in range(12, 3, -1)] + \
+        [(3, (1 << 12) | 0b1111)]
+
+    _instance = None
+
+    def __init__(self, directory: str = TABLES_DIRECTORY) -> None:
+        paths = {name: os.path.join(directory, f"lookup_{name}.npy") for name in self.ARRAYS}
+        if not all(os.path.exists(path) for path in paths.values()):
+            self.build()
+            self.save(paths)
+            return
+
+        for name, path in paths.items():
+            setattr(self, name, np.load(path, mmap_mode='r'))
+        self.flush = self.flush_array.tolist()
+        self.spread = self.spread_array.tolist()
+        self.rank = dict(zip(self.rank_keys.tolist(), self.rank_array.tolist()))
+
+    """
+    _summary_ : Build the tables.
+    _description_ : This method is used to enumerate the hands and fill every table.
+    _attributes_ : None
+    _returns_ : None
+    """
+
+    def build(self) -> None:
+        self.flush = [0] * (1 << 13)
+        self.rank = {}
+        self.spread = [sum(self.RANK_WEIGHT[rank] for rank in range(13) if rank_mask >> rank & 1)
+                       for rank_mask in range(1 << 13)]
+        self.build_flush_table()
+        self.build_rank_table()
+
+        self.rank_keys = np.array(sorted(self.rank), dtype=np.int64)
+        self.rank_array = np.array([self.rank[key] for key in self.rank_keys.tolist()],
+                                   dtype=np.uint32)
+        self.spread_array = np.array(self.spread, dtype=np.int64)
+        self.flush_array = np.array(self.flush, dtype=np.uint32)
+
+    """
+    _summary_ : Save the tables.
+    _description_ : This method is used to cache the arrays, each written to a temporary file first so that
+        processes starting at the same time never load a partial file. A read-only directory only
+        disables the cache.
+    _attributes_ :
+        - paths : Path of the file of each array.
+    _returns_ : None
+    """
+
+    def save(self, paths: dict) -> None:
+        try:
+            for name, path in paths.items():
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temporary = f"{path[:-len('.npy')]}.{os.getpid()}.tmp.npy"
+                np.save(temporary, getattr(self, name))
+                os.replace(temporary, path)
+        except OSError:
+            pass
+
+    """
+    _summary_ : Get the shared tables.
+    _description_ : This method is used to load (or build) the tables once per process and share them.
+    _attributes_ : None
+    _returns_ : Shared LookupTables instance.
+    """
+
+    @classmethod
+    def get(cls) -> 'LookupTables':
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    """
+    _summary_ : Get the category of a strength.
+    _description_ : This method is used to get the hand ranking of a strength.
+    _attributes_ :
+        - strength : Strength returned by the tables.
+    _returns_ : Category of the hand (see HandEvaluator.hand_rankings).
+    """
+
+    @classmethod
+    def category(cls, strength: int) -> int:
+        return strength >> cls.CATEGORY_SHIFT
+
+    """
+    _summary_ : Pack a strength.
+    _description_ : This method is used to pack a category and its ordered ranks into a strength.
+    _attributes_ :
+        - category : Category of the hand.
+        - ranks : Ranks deciding the hand, most significant first (at most 5).
+    _returns_ : Strength.
+    """
+
+    def pack(self, category: int, ranks: list) -> int:
+        strength = category
+        for i in range(5):
+            strength = (strength << 4) | (ranks[i] if i < len(ranks) else 0)
+        return strength
+
+    """
+    _summary_ : Get the top rank of a straight.
+    _description_ : This method is used to find the best straight contained in a rank mask.
+    _attributes_ :
+        - rank_mask : 13-bit mask of the ranks present.
+    _returns_ : Top rank of the best straight, -1 if there is none.
+    """
+
+    def straight_top(self, rank_mask: int) -> int:
+        for top, straight_mask in self.STRAIGHTS:
+            if rank_mask & straight_mask == straight_mask:
+                return top
+        return -1
+
+    """
+    _summary_ : Build the flush table.
+    _description_ : This method is used to rank every 13-bit mask of cards of a single suit.
+    _attributes_ : None
+    _returns_ : None
+    """
+
+    def build_flush_table(self) -> None:
+        for rank_mask in range(1 << 13):
+            if rank_mask.bit_count() < 5:
+                continue
+            top = self.straight_top(rank_mask)
+            if top == 12:
+                self.flush[rank_mask] = self.pack(9, [top])
+            elif top >= 0:
+                self.flush[rank_mask] = self.pack(8, [top])
+            else:
+                ranks = [rank for rank in range(12, -1, -1)
+                         if rank_mask >> rank & 1]
+                self.flush[rank_mask] = self.pack(5, ranks)
+
+    """
+    _summary_ : Build the rank table.
+    _description_ : This method is used to rank every multiset of up to MAX_CARDS ranks.
+    _attributes_ : None
+    _returns_ : None
+    """
+
+    def build_rank_table(self) -> None:
+        counts = [0] * 13
+        self.enumerate_counts(0, self.MAX_CARDS, 0, counts)
+
+    def enumerate_counts(self, rank: int, cards_left: int, key: int, counts: list) -> None:
+        if rank == 13:
+            self.rank[key] = self.rank_value(counts)
+            return
+        for count in range(min(4, cards_left) + 1):
+            counts[rank] = count
+            self.enumerate_counts(rank + 1, cards_left - count,
+                                  key + count * self.RANK_WEIGHT[rank], counts)
+        counts[rank] = 0
+
+    """
+    _summary_ : Rank a multiset of ranks.
+    _description_ : This method is used to get the strength of the best non-flush hand of a rank multiset.
+    _attributes_ :
+        - counts : Number of cards of each rank.
+    _returns_ : Strength.
+    """
+
+    def rank_value(self, counts: list) -> int:
+        present = [rank for rank in range(12, -1, -1) if counts[rank]]
+        quads = [rank for rank in present if counts[rank] >= 4]
+        trips = [rank for rank in present if counts[rank] >= 3]
+        pairs = [rank for rank in present if counts[rank] >= 2]
+
+        if quads:
+            return self.pack(7, quads[:1] + [rank for rank in present if rank != quads[0]][:1])
+        if trips and len(pairs) >= 2:
+            return self.pack(6, [trips[0], next(rank for rank in pairs if rank != trips[0])])
+
+        top = self.straight_top(sum(1 << rank for rank in present))
+        if top >= 0:
+            return self.pack(4, [top])
+
+        if trips:
+            return self.pack(3, trips[:1] + [rank for rank in present if rank != trips[0]][:2])
+        if len(pairs) >= 2:
+            return self.pack(2, pairs[:2] + [rank for rank in present if rank not in pairs[:2]][:1])
+        if pairs:
+            return self.pack(1, pairs[:1] + [rank for rank in present if rank != pairs[0]][:3])
+        return self.pack(0, present[:5])
@@ -2,6 +2,8 @@
 # Author: Maxime Cornaton
 # Date: 2023
 
+from environment.cHandState import HandState
+from environment.cHistory import ACTION_CODES
 from environment.ePlayerAction import PlayerAction
 
 
@@ -13,37 +15,43 @@ class Player:
     _attributes_ :
         - agent : Agent used by the player.
         - name : Name of the player.
+        - seat : Seat of the player at the table.
         - chips : Number of chips the player has.
-        - hand : Hand of the player.
+        - hand : Hand of the player (card ints, see utils.cards).
+        - hand_mask : 64-bit mask of the hand.
+        - hand_state : Strength state of the hand and the community cards dealt so far.
     _returns_ : None
     """
 
-    def __init__(self, agent, name: str = "Player 1", chips: int = 1000) -> None:
+    def __init__(self, agent, name: str = "Player 1", chips: int = 1000, seat: int = 0) -> None:
         self.agent = agent
 
         self.name = name
+        self.seat = seat
 
         self.chips = chips
         self.hand = []
+        self.hand_mask = 0
+        self.hand_state = HandState()
 
     """
     _summary_ : Make a decision.
-    _description_ : This method is used to make a decision.
+    _description_ : This method is used to make a decision among the legal actions : check when possible,
+        else call, else go all-in.
     _attributes_ :
         - env : Environment of the game.
-        - min_bet : Minimum bet amount.
-    _returns_ : None
+        - to_call : Amount left to call.
+        - action_mask : Legal actions, indexed like list(PlayerAction).
+    _returns_ : Action and amount.
     """
 
-    def make_decision(self, env, min_bet: int) -> (PlayerAction, int):
-        if self.chips == 0:
-            return PlayerAction.FOLD, 0
-        if self.chips < min_bet:
-            return PlayerAction.ALL_IN, self.chips
-
-        state = env.get_state()
-        # return self.agent.make_decision(state)
-        return PlayerAction.CHECK, 0
+    def make_decision(self, env, to_call: int, action_mask: list) -> (PlayerAction, int):
+        # return self.agent.make_decision(env.get_state())
+        if action_mask[ACTION_CODES[PlayerAction.CHECK]]:
+            return PlayerAction.CHECK, 0
+        if action_mask[ACTION_CODES[PlayerAction.CALL]]:
+            return PlayerAction.CALL, to_call
+        return PlayerAction.ALL_IN, self.chips
 
     """
     _summary_ :  Make a bet.
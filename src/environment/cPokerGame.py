@@ -2,12 +2,17 @@
 # Author: Maxime Cornaton
 # Date: 2023
 
-import random
+import time
 
-from environment.cPlayer import Player
+from environment.cDealer import Dealer
 from environment.cHandEvaluator import HandEvaluator
-from environment.cHistory import History
+from environment.cPlayer import Player
+from environment.cShowdown import Showdown
+from environment.cHistory import ACTION_CODES, History
+from environment.eGameType import GameType
 from environment.ePlayerAction import PlayerAction
+from utils.cMetrics import Metrics
+from utils.cards import CARD_BIT, decode_cards
 
 
 class PokerGame:
@@ -19,10 +24,16 @@ class PokerGame:
         - small_blind : Small blind amount.
         - big_blind : Big blind amount.
         - max_rounds : Maximum number of rounds.
+        - seed : Seed of the dealer.
+        - game_type : Variant played, the game_type of the config (see GameType).
     _returns_ : None
     """
 
-    def __init__(self, num_players: int, small_blind: int, big_blind: int, max_rounds: int) -> None:
+    # Index of each action in the action masks, same order as PlayerAction
+    FOLD, CHECK, CALL, BET, RAISE, ALL_IN = range(6)
+
+    def __init__(self, num_players: int, small_blind: int, big_blind: int, max_rounds: int, seed=None,
+                 game_type: str = GameType.TEXAS_HOLDEM.value) -> None:
         self.num_players = num_players
 
         self.small_blind = small_blind
@@ -30,19 +41,45 @@ class PokerGame:
 
         self.max_rounds = max_rounds
 
+        self.dealer = Dealer(seed)
+
+        self.game_type = GameType(game_type)
+        self.num_hole_cards = self.game_type.num_hole_cards
+        self.hand_evaluator = HandEvaluator()
+
     """
     _summary_ : Initialize the game.
     _description_ : This method is used to initialize the game.
     _attributes_ :
         - agent : Agent used to play the game.
+        - players : Players to seat instead of new ones (at most num_players).
     _returns_ : None
     """
 
-    def init(self, agent: object) -> None:
-        self.players = self.generate_players(agent)
-        self.history = History()
+    def init(self, agent: object, players: list = None) -> None:
+        self.history = History(self.num_players, self.max_rounds, self.num_hole_cards)
+        self.seat_players(players if players is not None else self.generate_players(agent))
+        self.num_actions = 0
+        self.betting_time = 0.0
         self.reset()
 
+    """
+    _summary_ : Seat the players.
+    _description_ : This method is used to set the players of the table, the first one holding the small blind
+        of the next hand. Seats are numbered in this order. The table has to be reset before the next hand.
+    _attributes_ :
+        - players : Players of the table (at most num_players).
+    _returns_ : None
+    """
+
+    def seat_players(self, players: list) -> None:
+        if len(players) > self.num_players:
+            raise ValueError(f"The table has {self.num_players} seats, not {len(players)}")
+        for seat, player in enumerate(players):
+            player.seat = seat
+        self.players = list(players)
+        self.seats = list(players)
+
     """
     _summary_ : Reset the game.
     _description_ : This method is used to reset the game.
@@ -53,10 +90,31 @@ class PokerGame:
     def reset(self) -> None:
         self.pot = 0
         self.community_cards = []
-        self.deck = self.generate_deck()
+        self.community_mask = 0
+        self.board_cards = []
         self.reset_players_hands()
+        self.reset_betting()
         self.history.reset()
 
+    """
+    _summary_ : Reset the betting state.
+    _description_ : This method is used to reset the per-position state of the betting rounds.
+    _attributes_ : None
+    _returns_ : None
+    """
+
+    def reset_betting(self) -> None:
+        num_players = len(self.players)
+        self.bets = [0] * num_players
+        self.folded = [False] * num_players
+        self.all_in = [False] * num_players
+        # Players who acted since the last full bet or raise, who cannot raise again
+        self.acted = [False] * num_players
+        self.current_bet = 0
+        self.min_raise = self.big_blind
+        self.num_live = num_players
+        self.num_active = num_players
+
     """
     _summary_ : Reset the players' hands.
     _description_ : This method is used to reset the players' hands.
@@ -67,6 +125,8 @@ class PokerGame:
     def reset_players_hands(self) -> None:
         for player in self.players:
             player.hand = []
+            player.hand_mask = 0
+            player.hand_state.reset()
 
     """
     _summary_ : Generate the players.
@@ -77,32 +137,34 @@ class PokerGame:
     """
 
     def generate_players(self, agent: object) -> list:
-        return [Player(agent=agent, name="Player_"+str(_)) for _ in range(self.num_players)]
-
-    """
-    _summary_ : Generate the deck.
-    _description_ : This method is used to generate the deck.
-    _attributes_ : None
-    _returns_ : List of cards
-    """
-
-    def generate_deck(self) -> list:
-        suits = ['Hearts', 'Diamonds', 'Clubs', 'Spades']
-        values = ['2', '3', '4', '5', '6', '7', '8',
-                  '9', '10', 'Jack', 'Queen', 'King', 'Ace']
-        return [{'suit': suit, 'value': value} for suit in suits for value in values]
+        return [Player(agent=agent, name="Player_"+str(_), seat=_) for _ in range(self.num_players)]
 
     """
     _summary_ : Deal the cards.
-    _description_ : This method is used to deal the cards.
+    _description_ : This method is used to deal the cards : the dealer draws the hands and the board at once,
+        the board being turned over round after round.
     _attributes_ : None
     _returns_ : None
     """
 
     def deal_cards(self) -> None:
-        random.shuffle(self.deck)
-        for player in self.players:
-            player.hand = [self.deck.pop(), self.deck.pop()]
+        num_hole_cards = self.num_hole_cards
+        cards = self.dealer.deal(num_hole_cards * len(self.players) + 5)
+        self.board_cards = cards[num_hole_cards * len(self.players):]
+        for i, player in enumerate(self.players):
+            player.hand = cards[num_hole_cards * i:num_hole_cards * (i + 1)]
+            player.hand_mask = 0
+            for card in player.hand:
+                player.hand_mask |= CARD_BIT[card]
+            if self.game_type is GameType.TEXAS_HOLDEM:
+                player.hand_state.add_cards(player.hand)
+            if player.chips <= 0:
+                # Busted players sit the hand out
+                self.folded[i] = True
+                self.all_in[i] = True
+                self.num_live -= 1
+                self.num_active -= 1
+        self.history.deal(self.seats, self.small_blind, self.big_blind)
 
     """
     _summary_ : Deal the community cards.
@@ -114,67 +176,212 @@ class PokerGame:
 
     def deal_community_cards(self, num_cards: int) -> None:
         for _ in range(num_cards):
-            self.community_cards.append(self.deck.pop())
+            card = self.board_cards[len(self.community_cards)]
+            self.community_cards.append(card)
+            self.community_mask |= CARD_BIT[card]
+            self.history.deal_community_card(card)
+            if self.game_type is GameType.TEXAS_HOLDEM:
+                for player in self.players:
+                    player.hand_state.add(card)
 
     """
     _summary_ : Play a round.
-    _description_ : This method is used to play a round.
+    _description_ : This method is used to play a betting round until every player still able to bet has
+        acted since the last raise and matched the current bet, or a single player is left. Folded and
+        all-in players are skipped, and each action is checked against the action mask of its player.
+        The round state lives in flat per-position lists (bets, folded, all_in), so an action costs a
+        bounded number of list reads and writes.
     _attributes_ :
         - round_num : Round number. 
     _returns_ : None
     """
 
     def play_round(self, round_num: int) -> None:
-        if round_num == self.max_rounds:
-            return
-
-        round_min_bet = 0
-        state = self.get_state()
-        events = []
+        num_players = len(self.players)
+        position = self.first_position(round_num)
+        self.history.start_round(round_num, self.players[position].seat, self.pot, self.get_strengths())
 
         if round_num == 0:
             self.blind_bets()
+        else:
+            self.bets[:] = [0] * num_players
+            self.current_bet = 0
+            self.min_raise = self.big_blind
+        self.acted[:] = [False] * num_players
+
+        metrics = Metrics.active
+        to_act = self.num_active
+        while to_act > 0 and self.num_live > 1:
+            if self.folded[position] or self.all_in[position]:
+                position = (position + 1) % num_players
+                continue
+
+            to_call = self.current_bet - self.bets[position]
+            if self.num_active == 1 and to_call == 0:
+                # Nobody is left to bet against
+                break
+
+            player = self.players[position]
+            if metrics is not None:
+                start = time.perf_counter_ns()
+            decision, amount = player.make_decision(
+                env=self, to_call=to_call, action_mask=self.get_action_mask(position))
+            if metrics is not None:
+                metrics.add_time('decision', time.perf_counter_ns() - start)
+
+            current_bet, min_raise = self.current_bet, self.min_raise
+            amount = self.apply_action(position, decision, amount)
+            if metrics is not None:
+                start = time.perf_counter_ns()
+            self.history.record(round_num, player.seat, decision, amount)
+            if metrics is not None:
+                metrics.add_time('history', time.perf_counter_ns() - start)
+            self.num_actions += 1
+
+            to_act = self.count_to_act(position, to_act, current_bet, min_raise)
+            position = (position + 1) % num_players
 
-        for i, player in enumerate(self.players):
+    """
+    _summary_ : Count the players left to act.
+    _description_ : This method is used to update the number of players left to act in the round after an action.
+        A full bet or raise makes every other player able to bet act again. An all-in for less than a full
+        raise does not reopen the betting : only the players who now owe chips act again, to call or fold.
+    _attributes_ :
+        - position : Position of the player who acted.
+        - to_act : Number of players left to act before the action.
+        - current_bet : Current bet before the action.
+        - min_raise : Minimum raise before the action.
+    _returns_ : Number of players left to act.
+    """
 
-            player_min_bet = self.small_blind if i == 0 and round_num == 0 else self.big_blind if i == 1 and round_num == 0 else round_min_bet
+    def count_to_act(self, position: int, to_act: int, current_bet: int, min_raise: int) -> int:
+        raise_size = self.current_bet - current_bet
+        if raise_size >= min_raise:
+            return self.num_active - (0 if self.all_in[position] else 1)
+        if raise_size > 0:
+            return sum(1 for bet, folded, all_in in zip(self.bets, self.folded, self.all_in)
+                       if not folded and not all_in and bet < self.current_bet)
+        return to_act - 1
 
-            decision, amount = player.make_decision(
-                env=self, min_bet=player_min_bet)
+    """
+    _summary_ : Get the first position of a round.
+    _description_ : This method is used to find who opens a round : preflop the player after the big blind,
+        then the first player after the button. Heads-up the button posts the small blind, so it opens
+        preflop and the big blind opens the next rounds.
+    _attributes_ :
+        - round_num : Round number.
+    _returns_ : Position of the first player to act.
+    """
+
+    def first_position(self, round_num: int) -> int:
+        num_players = len(self.players)
+        if round_num == 0:
+            return 2 % num_players
+        return 1 if num_players == 2 else 0
 
-            if decision in [PlayerAction.CALL, PlayerAction.BET, PlayerAction.RAISE, PlayerAction.ALL_IN]:
-                player.bet(amount)
-                self.pot += amount
+    """
+    _summary_ : Get the action mask.
+    _description_ : This method is used to get the legal actions of a player, indexed like list(PlayerAction).
+        A player who acted since the last full bet or raise can only call or fold (an all-in for less
+        than the call included).
+    _attributes_ :
+        - position : Position of the player.
+    _returns_ : List of 6 booleans.
+    """
 
-            round_min_bet = max(round_min_bet, amount)
+    def get_action_mask(self, position: int) -> list:
+        stack = self.players[position].chips
+        to_call = self.current_bet - self.bets[position]
+        can_raise = not self.acted[position]
+        return [
+            True,
+            to_call == 0,
+            0 < to_call < stack,
+            can_raise and self.current_bet == 0 and stack > self.min_raise,
+            can_raise and self.current_bet > 0 and stack > to_call + self.min_raise,
+            stack > 0 and (can_raise or stack <= to_call),
+        ]
 
-            events.append({
-                'player': player,
-                'action': decision,
-                'amount': amount
-            })
+    """
+    _summary_ : Apply an action.
+    _description_ : This method is used to play the action of a player. The amount of a BET or a RAISE is
+        brought up to the minimum raise and down to the stack, the amount of the other actions is set by the action.
+    _attributes_ :
+        - position : Position of the player.
+        - action : Action of the player.
+        - amount : Amount proposed by the player.
+    _returns_ : Amount put in the pot.
+    """
 
-        self.history.add(round_num, state, events)
+    def apply_action(self, position: int, action: PlayerAction, amount: int) -> int:
+        index = ACTION_CODES[action]
+        if not self.get_action_mask(position)[index]:
+            raise ValueError(f"Illegal action {action.value} for {self.players[position]}")
+
+        stack = self.players[position].chips
+        to_call = self.current_bet - self.bets[position]
+        self.acted[position] = True
+        if index == self.FOLD:
+            self.folded[position] = True
+            self.num_live -= 1
+            self.num_active -= 1
+            return 0
+        if index == self.CHECK:
+            return 0
+        if index == self.CALL:
+            amount = to_call
+        elif index == self.ALL_IN:
+            amount = stack
+        else:
+            amount = min(max(int(amount), to_call + self.min_raise), stack)
+
+        self.put(position, amount)
+        raise_size = self.bets[position] - self.current_bet
+        if raise_size >= self.min_raise:
+            # A full bet or raise reopens the betting
+            self.min_raise = raise_size
+            self.acted[:] = [False] * len(self.acted)
+            self.acted[position] = True
+        if raise_size > 0:
+            self.current_bet = self.bets[position]
+        return amount
 
-        self.deal_community_cards(3 if round_num == 0 else 1)
-        self.rotate_players()
-        self.play_round(round_num + 1)
+    """
+    _summary_ : Put chips in the pot.
+    _description_ : This method is used to move chips from the stack of a player to the pot.
+    _attributes_ :
+        - position : Position of the player.
+        - amount : Amount of chips.
+    _returns_ : None
+    """
+
+    def put(self, position: int, amount: int) -> None:
+        player = self.players[position]
+        player.bet(amount)
+        self.bets[position] += amount
+        self.pot += amount
+        if player.chips == 0 and not self.all_in[position]:
+            self.all_in[position] = True
+            self.num_active -= 1
 
     """
     _summary_ : Make the blind bets.
-    _description_ : This method is used to make the blind bets.
+    _description_ : This method is used to make the blind bets, a short stack going all-in for less.
     _attributes_ : None
     _returns_ : None
     """
 
     def blind_bets(self) -> None:
-        self.players[0].bet(self.small_blind)
-        self.players[1].bet(self.big_blind)
-        self.pot += self.small_blind + self.big_blind
+        for position, blind in ((0, self.small_blind), (1, self.big_blind)):
+            amount = min(blind, self.players[position].chips)
+            self.put(position, amount)
+            self.history.post_blind(self.players[position].seat, amount)
+        self.current_bet = max(self.bets)
+        self.min_raise = self.big_blind
 
     """
     _summary_ : Rotate the players.
-    _description_ : This method is used to rotate the players.
+    _description_ : This method is used to rotate the players, moving the button to the next player.
     _attributes_ : None
     _returns_ : None
     """
@@ -184,20 +391,44 @@ class PokerGame:
 
     """
     _summary_ : Play the game.
-    _description_ : This method is used to play the game.
+    _description_ : This method is used to play a hand : betting rounds until the last one or until a single
+        player is left, then the showdown. The button moves to the next player once the hand is over.
     _attributes_ : None
-    _returns_ : List of winners
+    _returns_ : List of winners (players who won chips at showdown)
     """
 
     def play(self) -> list:
+        metrics = Metrics.active
+        if metrics is not None:
+            metrics.count('hands')
+            start = time.perf_counter_ns()
         self.deal_cards()
-        self.play_round(0)
-
-        winners = self.determine_winner()
-
-        for winner in winners:
-            winner.chips += self.pot / len(winners)
-
+        if metrics is not None:
+            metrics.add_time('deal', time.perf_counter_ns() - start)
+
+        for round_num in range(self.max_rounds):
+            if round_num > 0:
+                if metrics is not None:
+                    start = time.perf_counter_ns()
+                self.deal_community_cards(min(3 if round_num == 1 else 1, 5 - len(self.community_cards)))
+                if metrics is not None:
+                    metrics.add_time('deal', time.perf_counter_ns() - start)
+
+            start = time.perf_counter()
+            self.play_round(round_num)
+            self.betting_time += time.perf_counter() - start
+
+            if self.num_live == 1:
+                break
+
+        if metrics is not None:
+            start = time.perf_counter_ns()
+        payouts = self.showdown()
+        if metrics is not None:
+            metrics.add_time('showdown', time.perf_counter_ns() - start)
+            metrics.count('decisions', self.history.num_events)
+        winners = [player for player in self.players if payouts[player.seat] > 0]
+        self.rotate_players()
         return winners
 
     """
@@ -212,35 +443,45 @@ class PokerGame:
         self.history.save(path)
 
     """
-    _summary_ : Determine the winner.
-    _description_ : This method is used to determine the winner.
+    _summary_ : Play the showdown.
+    _description_ : This method is used to share the main pot and the side pots between the live hands,
+        each hand being evaluated once from the hand state of its player, and to pay the players.
     _attributes_ : None
-    _returns_ : List of winners
+    _returns_ : Chips won by each player, by seat.
     """
 
-    def determine_winner(self) -> list:
-        hand_evaluator = HandEvaluator()
-        best_hand_strength = -1
-        winning_players = []
+    def showdown(self) -> list:
+        live = [True] * len(self.players)
+        for position, player in enumerate(self.players):
+            live[player.seat] = not self.folded[position]
 
-        for player in self.players:
-            hand_strength = hand_evaluator.evaluate_hand(
-                player.hand, self.community_cards)
+        payouts = Showdown.resolve(
+            strengths=self.get_strengths(),
+            contributions=[int(contribution) for contribution in self.history.get_contributions()],
+            live=live,
+            order=[player.seat for player in self.players])
+
+        for player in self.seats:
+            player.chips += payouts[player.seat]
+        self.history.settle(payouts)
+        return payouts
 
-            if hand_strength > best_hand_strength:
-                best_hand_strength = hand_strength
-                winning_players = [player]
-            elif hand_strength == best_hand_strength:
-                tiebreaker_rank = hand_evaluator.tiebreaker_rank(
-                    player.hand, self.community_cards)
-                winning_tiebreaker_rank = hand_evaluator.tiebreaker_rank(
-                    winning_players[0].hand, self.community_cards)
-                if tiebreaker_rank > winning_tiebreaker_rank:
-                    winning_players = [player]
-                elif tiebreaker_rank == winning_tiebreaker_rank:
-                    winning_players.append(player)
+    """
+    _summary_ : Get the strengths.
+    _description_ : This method is used to get the strength of every hand with the community cards dealt so far.
+        A Texas Hold'em hand reads the hand state of its player, the Omaha hands of the table are evaluated
+        in one batch (see HandEvaluator.evaluate_omaha_batch).
+    _attributes_ : None
+    _returns_ : List of strengths, by seat.
+    """
 
-        return winning_players
+    def get_strengths(self) -> list:
+        if Metrics.active is not None:
+            Metrics.active.count('evaluations', len(self.seats))
+        if self.game_type is GameType.TEXAS_HOLDEM:
+            return [player.hand_state.strength() for player in self.seats]
+        boards = [self.community_cards] * len(self.seats)
+        return self.hand_evaluator.evaluate_omaha_batch([player.hand for player in self.seats], boards).tolist()
 
     """
     _summary_ : Get the state.
@@ -266,4 +507,42 @@ class PokerGame:
         } for player in self.players]
 
     def __str__(self) -> str:
-        return f"Players: {self.players}\nPot: {self.pot}\nCommunity Cards: {self.community_cards}"
+        return f"Players: {self.players}\nPot: {self.pot}\nCommunity Cards: {decode_cards(self.community_cards)}"
+
+
+"""
+_summary_ : Benchmark the game.
+_description_ : This method is used to measure the hands per second and the cost of an action of the betting loop.
+_attributes_ :
+    - num_players : Number of players.
+    - num_hands : Number of hands.
+    - seed : Seed of the dealer.
+    - game_type : Variant played.
+_returns_ : Dictionary of measures.
+"""
+
+
+def benchmark(num_players: int = 6, num_hands: int = 10000, seed: int = 0,
+              game_type: str = GameType.TEXAS_HOLDEM.value) -> dict:
+    game = PokerGame(num_players=num_players, small_blind=5, big_blind=10, max_rounds=4, seed=seed,
+                     game_type=game_type)
+    game.init(agent=None)
+
+    start = time.perf_counter()
+    for _ in range(num_hands):
+        game.play()
+        for player in game.players:
+            player.chips = 1000
+        game.reset()
+    elapsed = time.perf_counter() - start
+
+    return {
+        'hands_per_second': num_hands / elapsed,
+        'actions_per_hand': game.num_actions / num_hands,
+        'microseconds_per_action': 1e6 * game.betting_time / game.num_actions,
+    }
+
+
+if __name__ == "__main__":
+    for game_type in GameType:
+        print(game_type.value, benchmark(game_type=game_type.value))
@@ -0,0 +1,240 @@
+# Description: This file contains the PokerTournament class, which plays long sequences of hands on many tables.
+# Author: Maxime Cornaton
+# Date: 2023
+
+import time
+import tracemalloc
+
+import numpy as np
+
+from environment.cLookupTables import LookupTables
+from environment.cPlayer import Player
+from environment.cPokerGame import PokerGame
+from environment.eGameType import GameType
+from utils.helpers import peak_rss_mb
+
+
+class PokerTournament:
+
+    """
+    _summary_ : Class used to play a tournament on many tables.
+    _description_ : This class is used to play hands on every table in turn, on stacks that persist from
+        hand to hand, until a single player is left. Between two turns the busted players are eliminated,
+        tables are broken when the others have room for their players and players are moved so that table
+        sizes differ by at most one. The blinds follow a schedule of levels, each lasting hands_per_level turns,
+        and the button moves after every hand (see PokerGame.play).
+        The PokerGame of each table, its history arrays and the Player objects are created once and reused
+        for every hand : eliminating or moving a player only changes which list it is in.
+    _attributes_ :
+        - num_tables : Number of tables at the start.
+        - players_per_table : Number of seats per table.
+        - chips : Starting stack of every player.
+        - blind_levels : List of (small blind, big blind), by level (doubling from 10/20 by default).
+        - hands_per_level : Number of turns of hands per level.
+        - max_rounds : Maximum number of rounds per hand.
+        - agent : Agent used by the players.
+        - seed : Seed from which the dealer of each table is derived.
+        - game_type : Variant played on every table (see GameType).
+    _returns_ : None
+    """
+
+    def __init__(self, num_tables: int, players_per_table: int, chips: int = 1000, blind_levels: list = None,
+                 hands_per_level: int = 50, max_rounds: int = 4, agent: object = None, seed: int = None,
+                 game_type: str = GameType.TEXAS_HOLDEM.value) -> None:
+        if players_per_table < 2:
+            raise ValueError("A table needs at least 2 seats")
+        self.players_per_table = players_per_table
+        self.blind_levels = blind_levels or [(10 << level, 20 << level) for level in range(16)]
+        self.hands_per_level = hands_per_level
+
+        small_blind, big_blind = self.blind_levels[0]
+        self.tables = [PokerGame(num_players=players_per_table, small_blind=small_blind, big_blind=big_blind,
+                                 max_rounds=max_rounds, seed=child, game_type=game_type)
+                       for child in np.random.SeedSequence(seed).spawn(num_tables)]
+        for i, table in enumerate(self.tables):
+            table.init(agent, players=[Player(agent=agent, name=f"Player_{i * players_per_table + seat}", chips=chips)
+                                       for seat in range(players_per_table)])
+
+        self.eliminated = []
+        self.level = 0
+        self.turns = 0
+        self.hands = 0
+        self.elapsed = 0.0
+
+    """
+    _summary_ : Get the number of players.
+    _description_ : This method is used to count the players still in the tournament.
+    _attributes_ : None
+    _returns_ : Number of players.
+    """
+
+    def num_players(self) -> int:
+        return sum(len(table.players) for table in self.tables)
+
+    """
+    _summary_ : Run the tournament.
+    _description_ : This method is used to play turns of hands until one player is left or max_hands hands
+        were played.
+    _attributes_ :
+        - max_hands : Maximum number of hands, None for no limit.
+        - callback : Function called with the table after each hand, e.g. to store its history.
+    _returns_ : Standings (see get_standings).
+    """
+
+    def run(self, max_hands: int = None, callback=None) -> list:
+        start = time.perf_counter()
+        while self.num_players() > 1 and (max_hands is None or self.hands < max_hands):
+            self.play_turn(callback)
+        self.elapsed += time.perf_counter() - start
+        return self.get_standings()
+
+    """
+    _summary_ : Play a turn.
+    _description_ : This method is used to play one hand on every table, then to eliminate the busted
+        players, balance the tables and move to the next blind level when it is time.
+    _attributes_ :
+        - callback : Function called with the table after each hand.
+    _returns_ : None
+    """
+
+    def play_turn(self, callback=None) -> None:
+        for table in self.tables:
+            if len(table.players) < 2:
+                continue
+            table.reset()
+            table.play()
+            self.hands += 1
+            if callback is not None:
+                callback(table)
+
+        self.turns += 1
+        self.eliminate()
+        self.balance()
+        self.update_blinds()
+
+    """
+    _summary_ : Eliminate the busted players.
+    _description_ : This method is used to take the players without chips off their table, the ones
+        busted in the same hand being ranked by the stack they started it with.
+    _attributes_ : None
+    _returns_ : None
+    """
+
+    def eliminate(self) -> None:
+        for table in self.tables:
+            if all(player.chips > 0 for player in table.players):
+                continue
+            busted = [player for player in table.players if player.chips <= 0]
+            busted.sort(key=lambda player: table.history.stacks[player.seat])
+            self.eliminated.extend(busted)
+            table.seat_players([player for player in table.players if player.chips > 0])
+        self.tables = [table for table in self.tables if table.players]
+
+    """
+    _summary_ : Balance the tables.
+    _description_ : This method is used to break the smallest table while the other tables have room for
+        its players, then to move players from the largest to the smallest table until their sizes differ by
+        at most one. A moved player takes the last position of the new table, which is the button.
+    _attributes_ : None
+    _returns_ : None
+    """
+
+    def balance(self) -> None:
+        while len(self.tables) > 1 and self.num_players() <= (len(self.tables) - 1) * self.players_per_table:
+            broken = min(self.tables, key=lambda table: len(table.players))
+            self.tables.remove(broken)
+            for player in broken.players:
+                self.move(player, min(self.tables, key=lambda table: len(table.players)))
+
+        while len(self.tables) > 1:
+            largest = max(self.tables, key=lambda table: len(table.players))
+            smallest = min(self.tables, key=lambda table: len(table.players))
+            if len(largest.players) - len(smallest.players) <= 1:
+                break
+            player = largest.players[-1]
+            largest.seat_players(largest.players[:-1])
+            self.move(player, smallest)
+
+    def move(self, player: Player, table: PokerGame) -> None:
+        table.seat_players(table.players + [player])
+
+    """
+    _summary_ : Update the blinds.
+    _description_ : This method is used to move every table to the blind level of the current turn.
+    _attributes_ : None
+    _returns_ : None
+    """
+
+    def update_blinds(self) -> None:
+        level = min(self.turns // self.hands_per_level, len(self.blind_levels) - 1)
+        if level == self.level:
+            return
+        self.level = level
+        for table in self.tables:
+            table.small_blind, table.big_blind = self.blind_levels[level]
+
+    """
+    _summary_ : Get the standings.
+    _description_ : This method is used to rank the players : the ones still in by stack, then the
+        eliminated ones, last eliminated first.
+    _attributes_ : None
+    _returns_ : List of players, first place first.
+    """
+
+    def get_standings(self) -> list:
+        remaining = sorted((player for table in self.tables for player in table.players),
+                           key=lambda player: player.chips, reverse=True)
+        return remaining + self.eliminated[::-1]
+
+    """
+    _summary_ : Get the statistics.
+    _description_ : This method is used to get the progress and the throughput of the tournament.
+    _attributes_ : None
+    _returns_ : Dictionary of statistics.
+    """
+
+    def get_stats(self) -> dict:
+        return {
+            'hands': self.hands,
+            'hands_per_second': self.hands / self.elapsed if self.elapsed else 0.0,
+            'tables': len(self.tables),
+            'players': self.num_players(),
+            'level': self.level,
+            'blinds': self.blind_levels[self.level],
+            'peak_rss_mb': peak_rss_mb(),
+        }
+
+
+"""
+_summary_ : Benchmark the tournament.
+_description_ : This method is used to measure the hands per second of a long run and the memory held by
+    each table once it has played (traced during a short warm-up, the run itself is not traced).
+_attributes_ :
+    - num_tables : Number of tables.
+    - players_per_table : Number of seats per table.
+    - num_hands : Number of hands of the run.
+    - seed : Seed of the tournament.
+_returns_ : Statistics of the run (see get_stats), with memory_per_table in bytes.
+"""
+
+
+def benchmark(num_tables: int = 100, players_per_table: int = 6, num_hands: int = 100000, seed: int = 0) -> dict:
+    # The lookup tables are shared by every table : they are built before tracing
+    LookupTables.get()
+    tracemalloc.start()
+    tournament = PokerTournament(num_tables, players_per_table, seed=seed)
+    tournament.run(max_hands=num_tables)
+    memory_per_table = tracemalloc.get_traced_memory()[0] / num_tables
+    tracemalloc.stop()
+
+    # Deep stacks and fixed blinds, so the tables keep playing for the whole run
+    tournament = PokerTournament(num_tables, players_per_table, chips=10 ** 9, blind_levels=[(10, 20)], seed=seed)
+    tournament.run(max_hands=num_hands)
+
+    stats = tournament.get_stats()
+    stats['memory_per_table'] = memory_per_table
+    return stats
+
+
+if __name__ == "__main__":
+    print(benchmark())
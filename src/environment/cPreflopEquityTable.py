@@ -0,0 +1,153 @@
+# Description: This file contains the class PreflopEquityTable which gives the precomputed all-in equity of starting hands.
+# Author: Maxime Cornaton
+# Date: 2023
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from environment.cEquityCalculator import EquityCalculator
+from utils.cards import CARD_RANK, CARD_SUIT
+
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          '..', '..', 'data', 'tables', 'preflop_equity.npy')
+
+
+class PreflopEquityTable:
+
+    """
+    _summary_ : Class giving the preflop all-in equity of the 169 canonical starting hands.
+    _description_ : This class is used to look up the equity of a starting hand against random hands
+        for 2 to 9 players. The table is generated once by build() and saved as a float32 .npy file
+        of shape (169, 8), which is memory-mapped when loaded : nothing is parsed or recomputed
+        when a process starts.
+        Row hi * 13 + lo is the suited hand, row lo * 13 + hi the offsuit hand (pairs on the diagonal),
+        with ranks in 0-12 ; column n - MIN_PLAYERS is the equity with n players.
+    _attributes_ :
+        - table : Memory-mapped equity array.
+    _returns_ : None
+    """
+
+    NUM_HANDS = 169
+    MIN_PLAYERS = 2
+    MAX_PLAYERS = 9
+
+    _instance = None
+
+    def __init__(self, path: str = TABLE_PATH) -> None:
+        if not os.path.exists(path):
+            raise FileNotFoundError(
+                f"{path} not found, build it with: python -m environment.cPreflopEquityTable")
+        self.table = np.load(path, mmap_mode='r')
+
+    """
+    _summary_ : Get the shared table.
+    _description_ : This method is used to map the table file once per process and share it.
+    _attributes_ : None
+    _returns_ : Shared PreflopEquityTable instance.
+    """
+
+    @classmethod
+    def get(cls) -> 'PreflopEquityTable':
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    """
+    _summary_ : Get the canonical index of a hand.
+    _description_ : This method is used to map a 2-card hand to one of the 169 canonical starting hands.
+    _attributes_ :
+        - hand : Hand of the player (card ints).
+    _returns_ : Canonical index, in 0-168.
+    """
+
+    @staticmethod
+    def canonical_index(hand: list) -> int:
+        first, second = hand
+        high, low = max(CARD_RANK[first], CARD_RANK[second]), min(CARD_RANK[first], CARD_RANK[second])
+        if CARD_SUIT[first] == CARD_SUIT[second]:
+            return high * 13 + low
+        return low * 13 + high
+
+    """
+    _summary_ : Get a hand of a canonical index.
+    _description_ : This method is used to get one hand represented by a canonical index.
+    _attributes_ :
+        - index : Canonical index.
+    _returns_ : Hand (card ints).
+    """
+
+    @staticmethod
+    def representative_hand(index: int) -> list:
+        row, column = divmod(index, 13)
+        if row > column:
+            return [row, column]
+        return [row, 13 + column]
+
+    """
+    _summary_ : Look up the equity of a hand.
+    _description_ : This method is used to get the all-in equity of a hand with a number of players.
+    _attributes_ :
+        - hand : Hand of the player (card ints).
+        - num_players : Number of players in the hand, the player included.
+    _returns_ : Equity, between 0 and 1.
+    """
+
+    def lookup(self, hand: list, num_players: int) -> float:
+        if not self.MIN_PLAYERS <= num_players <= self.MAX_PLAYERS:
+            raise ValueError(f"Number of players must be between {self.MIN_PLAYERS} and {self.MAX_PLAYERS}")
+        return float(self.table[self.canonical_index(hand), num_players - self.MIN_PLAYERS])
+
+    """
+    _summary_ : Look up the equity of a player in a game.
+    _description_ : This method is used to get the preflop equity of a player against the other players still
+        in the hand (not folded, busted players sitting the hand out). All-in players are still in the hand,
+        so they count as opponents. A player left alone in the hand wins the pot.
+    _attributes_ :
+        - game : Game of poker.
+        - player : Player of the game.
+    _returns_ : Equity, between 0 and 1.
+    """
+
+    def lookup_game(self, game, player) -> float:
+        if game.num_live < self.MIN_PLAYERS:
+            return 1.0
+        return self.lookup(player.hand, game.num_live)
+
+    """
+    _summary_ : Build the table.
+    _description_ : This method is used to compute every equity with the EquityCalculator and save the table.
+    _attributes_ :
+        - path : Path of the table file.
+        - num_samples : Number of samples per equity.
+        - seed : Seed of the samples.
+    _returns_ : Equity array.
+    """
+
+    @classmethod
+    def build(cls, path: str = TABLE_PATH, num_samples: int = 50000, seed: int = 0) -> np.ndarray:
+        equity_calculator = EquityCalculator(num_samples=num_samples, seed=seed)
+        table = np.zeros((cls.NUM_HANDS, cls.MAX_PLAYERS - cls.MIN_PLAYERS + 1), dtype=np.float32)
+        for index in range(cls.NUM_HANDS):
+            hand = cls.representative_hand(index)
+            for num_players in range(cls.MIN_PLAYERS, cls.MAX_PLAYERS + 1):
+                table[index, num_players - cls.MIN_PLAYERS] = equity_calculator.equity(
+                    hand, [], num_players - 1)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.save(path, table)
+        return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the preflop equity table.")
+    parser.add_argument("--path", default=TABLE_PATH)
+    parser.add_argument("--samples", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    PreflopEquityTable.build(args.path, args.samples, args.seed)
+    print(f"Saved {args.path} in {time.perf_counter() - start:.1f}s")
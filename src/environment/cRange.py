@@ -0,0 +1,376 @@
+# Description: This file contains the class Range which holds a weighted range of hands and computes range equities.
+# Author: Maxime Cornaton
+# Date: 2023
+
+import time
+from itertools import combinations
+from math import comb
+
+import numpy as np
+
+from environment.cDealer import Dealer
+from environment.cHandEvaluator import HandEvaluator
+from environment.cPreflopEquityTable import PreflopEquityTable
+from utils.cards import CARD_BIT_ARRAY, NUM_CARDS, cards_to_mask
+
+NUM_COMBOS = comb(NUM_CARDS, 2)
+
+# Cards of each combo (first < second), in the order of the weight arrays
+COMBOS = np.array(list(combinations(range(NUM_CARDS), 2)), dtype=np.intp)
+
+COMBO_MASKS = CARD_BIT_ARRAY[COMBOS].sum(axis=1)
+
+# Combo of each pair of cards, -1 on the diagonal
+COMBO_INDEX = np.full((NUM_CARDS, NUM_CARDS), -1, dtype=np.intp)
+COMBO_INDEX[COMBOS[:, 0], COMBOS[:, 1]] = np.arange(NUM_COMBOS)
+COMBO_INDEX[COMBOS[:, 1], COMBOS[:, 0]] = np.arange(NUM_COMBOS)
+
+# The 101 combos sharing at least one card with each combo, itself included
+BLOCKERS = np.array([sorted(set(COMBO_INDEX[first][COMBO_INDEX[first] >= 0]) | set(COMBO_INDEX[second][COMBO_INDEX[second] >= 0]))
+                     for first, second in COMBOS.tolist()], dtype=np.intp)
+
+
+class Range:
+
+    """
+    _summary_ : Class used to hold a weighted range of hands.
+    _description_ : This class is used to give a weight to each of the 1326 two-card combos, in one float64
+        array indexed like COMBOS, and to compute equities between ranges on a board.
+        Card removal is done with the 64-bit masks of the combos (COMBO_MASKS) : a combo is dropped when
+        it shares a card with the board, and a pair of combos counts only when they share no card.
+        The equities are computed on every runout of the board at once (see showdown), the runouts being
+        sampled when there are more than max_runouts.
+    _attributes_ :
+        - weights : Weight of each combo (NUM_COMBOS,), all 0 by default.
+    _returns_ : None
+    """
+
+    def __init__(self, weights: np.ndarray = None) -> None:
+        if weights is None:
+            self.weights = np.zeros(NUM_COMBOS, dtype=np.float64)
+        else:
+            self.weights = np.array(weights, dtype=np.float64)
+            if self.weights.shape != (NUM_COMBOS,):
+                raise ValueError(f"A range has {NUM_COMBOS} weights, not {self.weights.shape}")
+
+    """
+    _summary_ : Create the full range.
+    _description_ : This method is used to create a range holding every combo with weight 1.
+    _attributes_ : None
+    _returns_ : Range.
+    """
+
+    @classmethod
+    def full(cls) -> 'Range':
+        return cls(np.ones(NUM_COMBOS))
+
+    """
+    _summary_ : Create a range of hands.
+    _description_ : This method is used to create a range holding some hands.
+    _attributes_ :
+        - hands : List of hands (pairs of card ints).
+        - weight : Weight of every hand.
+    _returns_ : Range.
+    """
+
+    @classmethod
+    def from_hands(cls, hands: list, weight: float = 1.0) -> 'Range':
+        hand_range = cls()
+        for hand in hands:
+            hand_range.set(hand, weight)
+        return hand_range
+
+    """
+    _summary_ : Create a range of canonical hands.
+    _description_ : This method is used to create a range from the weights of the 169 canonical starting hands,
+        every combo of a canonical hand taking its weight (see PreflopEquityTable.canonical_index).
+    _attributes_ :
+        - weights : Weight of each canonical hand (169,).
+    _returns_ : Range.
+    """
+
+    @classmethod
+    def from_canonical(cls, weights: np.ndarray) -> 'Range':
+        return cls(np.asarray(weights, dtype=np.float64)[CANONICAL_INDEX])
+
+    """
+    _summary_ : Get the index of a combo.
+    _description_ : This method is used to get the position of a hand in the weight arrays.
+    _attributes_ :
+        - hand : Hand (pair of card ints).
+    _returns_ : Index of the combo.
+    """
+
+    @staticmethod
+    def combo_index(hand: list) -> int:
+        index = COMBO_INDEX[hand[0], hand[1]]
+        if index < 0:
+            raise ValueError(f"A hand needs two distinct cards, not {hand}")
+        return int(index)
+
+    def set(self, hand: list, weight: float) -> None:
+        self.weights[self.combo_index(hand)] = weight
+
+    def get(self, hand: list) -> float:
+        return float(self.weights[self.combo_index(hand)])
+
+    """
+    _summary_ : Get the blocked combos.
+    _description_ : This method is used to find the combos holding at least one of some cards.
+    _attributes_ :
+        - cards : Cards known to be out of the deck (card ints).
+    _returns_ : Boolean array (NUM_COMBOS,).
+    """
+
+    @staticmethod
+    def blocked(cards: list) -> np.ndarray:
+        return COMBO_MASKS & cards_to_mask(cards) != 0
+
+    """
+    _summary_ : Remove cards.
+    _description_ : This method is used to get the range without the combos holding one of some cards.
+    _attributes_ :
+        - cards : Cards known to be out of the deck (card ints).
+    _returns_ : New range.
+    """
+
+    def remove(self, cards: list) -> 'Range':
+        return Range(np.where(self.blocked(cards), 0.0, self.weights))
+
+    def total(self) -> float:
+        return float(self.weights.sum())
+
+    """
+    _summary_ : Normalize the range.
+    _description_ : This method is used to get the range with weights summing to 1.
+    _attributes_ : None
+    _returns_ : New range.
+    """
+
+    def normalized(self) -> 'Range':
+        total = self.total()
+        if total <= 0:
+            raise ValueError("Cannot normalize an empty range")
+        return Range(self.weights / total)
+
+    """
+    _summary_ : Compute the equity of a hand against the range.
+    _description_ : This method is used to get the share of the pot a hand wins on average against the
+        combos of the range that share no card with it or the board.
+    _attributes_ :
+        - hand : Hand of the player (card ints).
+        - community_cards : Community cards already dealt (card ints).
+        - max_runouts : Largest number of runouts enumerated before sampling.
+        - seed : Seed of the sampled runouts.
+    _returns_ : Equity, between 0 and 1.
+    """
+
+    def equity_vs_hand(self, hand: list, community_cards: list, max_runouts: int = 2000,
+                       seed: int = None) -> float:
+        equities = Range.from_hands([hand]).equity_vs_range(self, community_cards, max_runouts, seed)
+        return float(equities[self.combo_index(hand)])
+
+    """
+    _summary_ : Compute the equities of the range against another one.
+    _description_ : This method is used to get the equity of every combo of the range against the other
+        range, and the equity of the whole range (see equity).
+    _attributes_ :
+        - other : Range of the opponent.
+        - community_cards : Community cards already dealt (card ints, 0 to 5).
+        - max_runouts : Largest number of runouts enumerated before sampling.
+        - seed : Seed of the sampled runouts.
+    _returns_ : Equity of each combo (NUM_COMBOS,), NaN for the combos not in the range or without any
+        opponent combo left.
+    """
+
+    def equity_vs_range(self, other: 'Range', community_cards: list, max_runouts: int = 2000,
+                        seed: int = None) -> np.ndarray:
+        wins, matchups = self.showdown(other, community_cards, max_runouts, seed)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where((self.weights > 0) & (matchups > 0), wins / matchups, np.nan)
+
+    """
+    _summary_ : Compute the equity of the range against another one.
+    _description_ : This method is used to get the share of the pot the range wins on average, every pair of
+        combos without shared card being weighted by the product of their weights.
+    _attributes_ :
+        - other : Range of the opponent.
+        - community_cards : Community cards already dealt (card ints, 0 to 5).
+        - max_runouts : Largest number of runouts enumerated before sampling.
+        - seed : Seed of the sampled runouts.
+    _returns_ : Equity, between 0 and 1.
+    """
+
+    def equity(self, other: 'Range', community_cards: list, max_runouts: int = 2000, seed: int = None) -> float:
+        wins, matchups = self.showdown(other, community_cards, max_runouts, seed)
+        total = float(self.weights @ matchups)
+        if total == 0:
+            raise ValueError("The ranges have no combos left against each other")
+        return float(self.weights @ wins) / total
+
+    """
+    _summary_ : Play the showdowns against another range.
+    _description_ : This method is used to sum, for each combo of the range, the weight of the opponent
+        combos it beats (ties counting half) and the weight of all the opponent combos it can face, over the
+        runouts of the board (see showdowns).
+    _attributes_ :
+        - other : Range of the opponent.
+        - community_cards : Community cards already dealt (card ints, 0 to 5).
+        - max_runouts : Largest number of runouts enumerated before sampling.
+        - seed : Seed of the sampled runouts.
+    _returns_ : Won weight and faced weight of each combo (NUM_COMBOS,) each, summed over the runouts.
+    """
+
+    def showdown(self, other: 'Range', community_cards: list, max_runouts: int = 2000,
+                 seed: int = None) -> (np.ndarray, np.ndarray):
+        all_wins = np.zeros(NUM_COMBOS)
+        all_matchups = np.zeros(NUM_COMBOS)
+        for heroes, wins, matchups in self.showdowns(other, community_cards, max_runouts, seed):
+            all_wins[heroes] += wins
+            all_matchups[heroes] += matchups
+        return all_wins, all_matchups
+
+    """
+    _summary_ : Compute the equities of the range on every runout.
+    _description_ : This method is used to get the equity of every combo of the range against the other
+        range on each runout of the board, e.g. to build the distribution of the final equity of a hand.
+    _attributes_ :
+        - other : Range of the opponent.
+        - community_cards : Community cards already dealt (card ints, 0 to 5).
+        - max_runouts : Largest number of runouts enumerated before sampling.
+        - seed : Seed of the sampled runouts.
+    _returns_ : Equity of each combo on each runout (num_runouts, NUM_COMBOS), NaN where the combo is not in
+        the range, meets a card of the runout or has no opponent combo left.
+    """
+
+    def runout_equities(self, other: 'Range', community_cards: list, max_runouts: int = 2000,
+                        seed: int = None) -> np.ndarray:
+        rows = []
+        for heroes, wins, matchups in self.showdowns(other, community_cards, max_runouts, seed):
+            equities = np.full(NUM_COMBOS, np.nan)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                equities[heroes] = np.where(matchups > 0, wins / matchups, np.nan)
+            rows.append(equities)
+        return np.array(rows)
+
+    """
+    _summary_ : Play the showdowns of every runout against another range.
+    _description_ : This method is used to get, runout by runout, the weight of the opponent combos each combo
+        beats (ties counting half) and the weight of the opponent combos it can face. Only the combos with a
+        weight and no card on the board are kept, and the strengths of both ranges on every runout are
+        evaluated in one batch.
+        On each runout the opponent combos are sorted by strength : the weight a combo beats is read from
+        the cumulative weights, as if no card were shared, then the opponent combos sharing a card with it
+        are taken back. Those are at most 101 per combo (see BLOCKERS), so the combo-by-combo matrix of a
+        runout is only the (combos, blockers) matrix of the conflicting pairs.
+    _attributes_ :
+        - other : Range of the opponent.
+        - community_cards : Community cards already dealt (card ints, 0 to 5).
+        - max_runouts : Largest number of runouts enumerated before sampling.
+        - seed : Seed of the sampled runouts.
+    _returns_ : Generator of (combos, won weights, faced weights), one per runout, the combos meeting a card
+        of the runout facing no weight.
+    """
+
+    def showdowns(self, other: 'Range', community_cards: list, max_runouts: int = 2000, seed: int = None):
+        board_blocked = self.blocked(community_cards)
+        heroes = np.flatnonzero((self.weights > 0) & ~board_blocked)
+        villains = np.flatnonzero((other.weights > 0) & ~board_blocked)
+
+        runouts = self.runouts(community_cards, max_runouts, seed)
+        board_masks = CARD_BIT_ARRAY[runouts].sum(axis=1) | cards_to_mask(community_cards)
+
+        hand_evaluator = HandEvaluator()
+        hero_masks = COMBO_MASKS[heroes]
+        villain_masks = COMBO_MASKS[villains]
+        hero_strengths = hand_evaluator.evaluate_mask_batch(hero_masks | board_masks[:, None]).astype(np.int64)
+        villain_strengths = hand_evaluator.evaluate_mask_batch(villain_masks | board_masks[:, None]).astype(np.int64)
+
+        # Opponent combos sharing a card with each combo, the ones out of the opponent range pointing
+        # to an extra combo of weight 0
+        positions = np.full(NUM_COMBOS, len(villains), dtype=np.intp)
+        positions[villains] = np.arange(len(villains))
+        blockers = positions[BLOCKERS[heroes]]
+
+        villain_weights = np.zeros(len(villains) + 1)
+        villain_strength = np.zeros(len(villains) + 1, dtype=np.int64)
+        for r, board_mask in enumerate(board_masks.tolist()):
+            hero_live = (hero_masks & board_mask) == 0
+            villain_weights[:-1] = np.where((villain_masks & board_mask) == 0, other.weights[villains], 0.0)
+            villain_strength[:-1] = villain_strengths[r]
+            hero_strength = hero_strengths[r]
+
+            order = np.argsort(villain_strength[:-1], kind='stable')
+            sorted_strengths = villain_strength[order]
+            cumulative = np.concatenate(([0.0], np.cumsum(villain_weights[order])))
+            below = cumulative[np.searchsorted(sorted_strengths, hero_strength, side='left')]
+            up_to = cumulative[np.searchsorted(sorted_strengths, hero_strength, side='right')]
+
+            blocker_weights = villain_weights[blockers]
+            blocker_strengths = villain_strength[blockers]
+            blocker_results = (blocker_strengths < hero_strength[:, None]) + 0.5 * (blocker_strengths == hero_strength[:, None])
+
+            wins = hero_live * (0.5 * (below + up_to) - (blocker_weights * blocker_results).sum(axis=1))
+            matchups = hero_live * (cumulative[-1] - blocker_weights.sum(axis=1))
+            yield heroes, wins, matchups
+
+    """
+    _summary_ : Get the runouts of a board.
+    _description_ : This method is used to list the cards completing the board to 5 cards : all of them when
+        there are at most max_runouts, max_runouts random ones otherwise.
+    _attributes_ :
+        - community_cards : Community cards already dealt (card ints).
+        - max_runouts : Largest number of runouts enumerated before sampling.
+        - seed : Seed of the sampled runouts.
+    _returns_ : Array of card ints (num_runouts, 5 - len(community_cards)).
+    """
+
+    @staticmethod
+    def runouts(community_cards: list, max_runouts: int = 2000, seed: int = None) -> np.ndarray:
+        missing = 5 - len(community_cards)
+        if missing < 0:
+            raise ValueError(f"A board has at most 5 cards, not {len(community_cards)}")
+        deck = np.array([card for card in range(NUM_CARDS) if card not in community_cards], dtype=np.intp)
+        if comb(len(deck), missing) <= max_runouts:
+            return deck[np.array(list(combinations(range(len(deck)), missing)), dtype=np.intp)]
+        return Dealer(seed).deal_batch(max_runouts, missing, deck)
+
+
+# Canonical starting hand of each combo (see PreflopEquityTable.canonical_index)
+CANONICAL_INDEX = np.array([PreflopEquityTable.canonical_index(combo) for combo in COMBOS.tolist()], dtype=np.intp)
+
+
+"""
+_summary_ : Benchmark the range equities.
+_description_ : This method is used to measure the time of a full range against a full range, and of a hand
+    against a full range, on each street.
+_attributes_ :
+    - seed : Seed of the boards and of the sampled runouts.
+_returns_ : Time in seconds of each query, for each street.
+"""
+
+
+def benchmark(seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    full_range = Range.full()
+
+    results = {}
+    for street, board_size in (("flop", 3), ("turn", 4), ("river", 5)):
+        cards = rng.permutation(NUM_CARDS)[:2 + board_size].tolist()
+        full_range.equity_vs_range(full_range, cards[2:], seed=seed)
+
+        start = time.perf_counter()
+        full_range.equity_vs_range(full_range, cards[2:], seed=seed)
+        range_vs_range = time.perf_counter() - start
+
+        start = time.perf_counter()
+        full_range.equity_vs_hand(cards[:2], cards[2:], seed=seed)
+        hand_vs_range = time.perf_counter() - start
+        results[street] = {'range_vs_range': range_vs_range, 'hand_vs_range': hand_vs_range}
+    return results
+
+
+if __name__ == "__main__":
+    for street, result in benchmark().items():
+        print(f"{street:>6}: range vs range {1000 * result['range_vs_range']:,.1f} ms, "
+              f"hand vs range {1000 * result['hand_vs_range']:,.1f} ms")
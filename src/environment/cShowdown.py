@@ -0,0 +1,75 @@
+# Description: This file contains the class Showdown which shares the pot between the hands at showdown.
+# Author: Maxime Cornaton
+# Date: 2023
+
+
+class Showdown:
+
+    """
+    _summary_ : Class used to share the pot at showdown.
+    _description_ : This class is used to split the chips put in the pot into the main pot and the side
+        pots created by the players who went all-in for less, and to give each pot to the best live hand
+        among the players who contributed to it. Every hand is given by its strength, computed once
+        (see HandState), and the players are sorted once by contribution : the pots are then resolved
+        from the largest contribution down while the set of eligible hands grows, so resolving costs
+        O(n log n). A pot split between tied hands gives its odd chips to the first of them in order.
+    _attributes_ : None
+    _returns_ : None
+    """
+
+    """
+    _summary_ : Resolve the showdown.
+    _description_ : This method is used to get the chips won by each player.
+    _attributes_ :
+        - strengths : Strength of the hand of each player, by seat.
+        - contributions : Chips put in the pot by each player during the hand, by seat.
+        - live : Whether each player still holds their cards (did not fold), by seat.
+        - order : Seats in the order odd chips are given, seat order by default.
+    _returns_ : Chips won by each player, by seat. They sum to the total of the contributions.
+    """
+
+    @staticmethod
+    def resolve(strengths: list, contributions: list, live: list, order: list = None) -> list:
+        num_players = len(contributions)
+        payouts = [0] * num_players
+        position = [0] * num_players
+        for i, seat in enumerate(order if order is not None else range(num_players)):
+            position[seat] = i
+
+        by_contribution = sorted(range(num_players), key=lambda seat: contributions[seat], reverse=True)
+        levels = sorted({contribution for contribution in contributions if contribution > 0}, reverse=True)
+
+        best_strength = -1
+        best_seats = []
+        contributors = 0
+        carry = 0
+        for k, level in enumerate(levels):
+            # Players who put at least this level in the pot : they pay into this pot, the live ones can win it
+            while contributors < num_players and contributions[by_contribution[contributors]] >= level:
+                seat = by_contribution[contributors]
+                contributors += 1
+                if not live[seat]:
+                    continue
+                if strengths[seat] > best_strength:
+                    best_strength = strengths[seat]
+                    best_seats = [seat]
+                elif strengths[seat] == best_strength:
+                    best_seats.append(seat)
+
+            next_level = levels[k + 1] if k + 1 < len(levels) else 0
+            pot = (level - next_level) * contributors + carry
+            if not best_seats:
+                # Only folded players reached this level : the chips go to the pot below
+                carry = pot
+                continue
+            carry = 0
+
+            share, odd_chips = divmod(pot, len(best_seats))
+            best_seats.sort(key=lambda seat: position[seat])
+            for i, seat in enumerate(best_seats):
+                payouts[seat] += share + (1 if i < odd_chips else 0)
+
+        if carry:
+            # Nobody is live : every player gets their chips back
+            return list(contributions)
+        return payouts
@@ -0,0 +1,458 @@
+# Description: This file contains the VectorPokerGame class, which plays many poker tables in lockstep.
+# Author: Maxime Cornaton
+# Date: 2023
+
+import time
+
+import numpy as np
+
+from environment.cDealer import Dealer
+from environment.cEquityCalculator import EquityCalculator
+from environment.cHandEvaluator import HandEvaluator
+from environment.cLookupTables import LookupTables
+from environment.cPreflopEquityTable import PreflopEquityTable
+from environment.cShowdown import Showdown
+from environment.ePlayerAction import PlayerAction
+from model.cFeatureSchema import FEATURE_SCHEMA, FeatureSchema
+from utils.cards import CARD_BIT_ARRAY, CARD_RANK, CARD_SUIT
+from utils.preprocessing import card_suit_array, card_value_array
+
+
+class VectorPokerGame:
+
+    """
+    _summary_ : Class used to play many independent poker tables at once.
+    _description_ : This class is used to step B tables in lockstep with the rules of PokerGame : blinds, betting
+        rounds that go on until every player able to bet has acted since the last raise and matched the current
+        bet, the minimum raise, folded and all-in players skipped, the opening seat of each round (see
+        PokerGame.first_position), 3 then 1 community cards per round, and the main pot and side pots shared by
+        Showdown.resolve. The button moves to the next seat with every new hand, as PokerGame.play rotates
+        its players : the small blind of a table is posted by the seat of its button.
+        The betting state lives in arrays, so one step() applies one decision on every table and the agent
+        can score every table with a single batched forward pass : the observations are laid out by the
+        feature schema, each row being the one extract_features writes for the decision, so agent.predict
+        takes them directly. Only the tables whose hand is over are settled one by one.
+        A table whose hand is over is dealt a new hand in the same step (stacks start again from chips),
+        its chip results being reported in the rewards of that step.
+    _attributes_ :
+        - num_tables : Number of tables.
+        - num_players : Number of players per table.
+        - small_blind : Small blind amount.
+        - big_blind : Big blind amount.
+        - max_rounds : Maximum number of rounds.
+        - chips : Stack of every player at the start of a hand, more than the big blind.
+        - seed : Seed of the deals.
+        - schema : Feature schema of the observations.
+        - equity_calculator : Calculator of the postflop equity feature, computed at the start of every round
+            for the players still in the hand ; without it the postflop equities are -1 (the preflop ones come
+            from the PreflopEquityTable).
+    _returns_ : None
+    """
+
+    # Index of each action in the action masks and in step(), same order as preprocessing.action_to_int
+    ACTIONS = [PlayerAction.FOLD, PlayerAction.CHECK, PlayerAction.CALL,
+               PlayerAction.BET, PlayerAction.RAISE, PlayerAction.ALL_IN]
+    FOLD, CHECK, CALL, BET, RAISE, ALL_IN = range(6)
+
+    def __init__(self, num_tables: int, num_players: int, small_blind: int, big_blind: int, max_rounds: int,
+                 chips: int = 1000, seed: int = None, schema: FeatureSchema = FEATURE_SCHEMA,
+                 equity_calculator: EquityCalculator = None) -> None:
+        if chips <= big_blind:
+            raise ValueError("The stacks have to cover the big blind")
+        self.num_tables = num_tables
+        self.num_players = num_players
+
+        self.small_blind = small_blind
+        self.big_blind = big_blind
+
+        self.max_rounds = max_rounds
+        self.chips = chips
+
+        self.hand_evaluator = HandEvaluator()
+        self.dealer = Dealer(seed)
+        self.schema = schema
+        self.equity_calculator = equity_calculator
+
+        self.tables = np.arange(num_tables)
+        self.stacks = np.zeros((num_tables, num_players), dtype=np.int64)
+        self.bets = np.zeros((num_tables, num_players), dtype=np.int64)
+        self.contributions = np.zeros((num_tables, num_players), dtype=np.int64)
+        self.folded = np.zeros((num_tables, num_players), dtype=bool)
+        self.all_in = np.zeros((num_tables, num_players), dtype=bool)
+        self.pots = np.zeros(num_tables, dtype=np.int64)
+        self.min_raises = np.zeros(num_tables, dtype=np.int64)
+        # Players who acted since the last full bet or raise, who cannot raise again
+        self.acted = np.zeros((num_tables, num_players), dtype=bool)
+        # Number of players left to act in the round
+        self.to_act = np.zeros(num_tables, dtype=np.int64)
+
+        self.hands = np.zeros((num_tables, num_players, 2), dtype=np.int64)
+        self.hand_masks = np.zeros((num_tables, num_players), dtype=np.int64)
+        self.deck_boards = np.zeros((num_tables, 5), dtype=np.int64)
+        self.board_sizes = np.zeros(num_tables, dtype=np.int64)
+        self.board_masks = np.zeros(num_tables, dtype=np.int64)
+
+        self.rounds = np.zeros(num_tables, dtype=np.int64)
+        self.seats = np.zeros(num_tables, dtype=np.int64)
+        # Seat of the small blind, moved to the next seat before each hand
+        self.buttons = np.full(num_tables, -1, dtype=np.int64)
+
+        # State at the start of the round, as recorded by History.start_round
+        self.round_pots = np.zeros(num_tables, dtype=np.int64)
+        self.round_stacks = np.zeros((num_tables, num_players), dtype=np.int64)
+        self.equities = np.zeros((num_tables, num_players), dtype=np.float32)
+
+        self.hands_played = 0
+
+    """
+    _summary_ : Reset every table.
+    _description_ : This method is used to deal a new hand on every table, the button moving to the next seat.
+    _attributes_ : None
+    _returns_ : Observations (B, schema.size) and action masks (B, 6).
+    """
+
+    def reset(self) -> (np.ndarray, np.ndarray):
+        self.reset_tables(self.tables)
+        return self.get_observations(), self.get_action_masks()
+
+    """
+    _summary_ : Reset some tables.
+    _description_ : This method is used to deal a new hand on some tables, move their button to the next seat,
+        post their blinds and move to the first decision.
+    _attributes_ :
+        - tables : Indices of the tables.
+    _returns_ : None
+    """
+
+    def reset_tables(self, tables: np.ndarray) -> None:
+        num_cards = 2 * self.num_players + 5
+        deals = self.dealer.deal_batch(len(tables), num_cards)
+
+        self.hands[tables] = deals[:, :2 * self.num_players].reshape(len(tables), self.num_players, 2)
+        self.hand_masks[tables] = CARD_BIT_ARRAY[self.hands[tables]].sum(axis=2)
+        self.deck_boards[tables] = deals[:, 2 * self.num_players:]
+        self.board_sizes[tables] = 0
+        self.board_masks[tables] = 0
+
+        self.stacks[tables] = self.chips
+        self.bets[tables] = 0
+        self.contributions[tables] = 0
+        self.pots[tables] = 0
+        self.folded[tables] = False
+        self.all_in[tables] = False
+        self.acted[tables] = False
+        self.rounds[tables] = 0
+        self.buttons[tables] = (self.buttons[tables] + 1) % self.num_players
+        self.start_round(tables)
+
+        for position, blind in ((0, self.small_blind), (1, self.big_blind)):
+            self.put(tables, (self.buttons[tables] + position) % self.num_players, np.full(len(tables), blind))
+        self.min_raises[tables] = self.big_blind
+        self.seats[tables] = (self.buttons[tables] + self.first_position(0)) % self.num_players
+        self.to_act[tables] = (~self.folded[tables] & ~self.all_in[tables]).sum(axis=1)
+        # Stacks larger than the big blind always leave a decision to the small blind
+        self.advance(tables)
+
+    """
+    _summary_ : Get the first position of a round.
+    _description_ : This method is used to find who opens a round, as PokerGame.first_position.
+    _attributes_ :
+        - round_num : Round number.
+    _returns_ : Position of the first player to act.
+    """
+
+    def first_position(self, round_num: int) -> int:
+        if round_num == 0:
+            return 2 % self.num_players
+        return 1 if self.num_players == 2 else 0
+
+    """
+    _summary_ : Record the start of a round.
+    _description_ : This method is used to keep the pot and the stacks of some tables when their round starts
+        (before the blinds preflop), and the equity of their players, as the features of a History are built.
+    _attributes_ :
+        - tables : Indices of the tables.
+    _returns_ : None
+    """
+
+    def start_round(self, tables: np.ndarray) -> None:
+        self.round_pots[tables] = self.pots[tables]
+        self.round_stacks[tables] = self.stacks[tables]
+        self.update_equities(tables)
+
+    """
+    _summary_ : Compute the equities of some tables.
+    _description_ : This method is used to get the equity of the players still in the hand against the other
+        ones, as preprocessing.round_equities : from the PreflopEquityTable preflop, from the equity calculator
+        afterwards, -1 without one.
+    _attributes_ :
+        - tables : Indices of the tables, all preflop or all postflop.
+    _returns_ : None
+    """
+
+    def update_equities(self, tables: np.ndarray) -> None:
+        live = ~self.folded[tables]
+        num_live = live.sum(axis=1)
+        equities = np.full((len(tables), self.num_players), -1.0, dtype=np.float32)
+        if (self.rounds[tables] == 0).all():
+            hands = self.hands[tables]
+            ranks = np.array(CARD_RANK)[hands]
+            suited = np.array(CARD_SUIT)[hands[..., 0]] == np.array(CARD_SUIT)[hands[..., 1]]
+            high, low = ranks.max(axis=2), ranks.min(axis=2)
+            # Canonical index of every hand (see PreflopEquityTable.canonical_index)
+            indexes = np.where(suited, high * 13 + low, low * 13 + high)
+            if self.num_players <= PreflopEquityTable.MAX_PLAYERS:
+                columns = num_live[:, None] - PreflopEquityTable.MIN_PLAYERS
+                equities[:] = PreflopEquityTable.get().table[indexes, columns]
+        elif self.equity_calculator is not None:
+            for i, table in enumerate(tables.tolist()):
+                board = self.deck_boards[table, :self.board_sizes[table]].tolist()
+                for seat in np.flatnonzero(live[i]).tolist():
+                    equities[i, seat] = self.equity_calculator.equity(
+                        self.hands[table, seat].tolist(), board, num_live[i] - 1)
+        self.equities[tables] = np.where(live & (num_live[:, None] < 2), 1.0, equities)
+
+    """
+    _summary_ : Put chips in the pot.
+    _description_ : This method is used to move chips from the stack of a seat of some tables to their pot.
+    _attributes_ :
+        - tables : Indices of the tables.
+        - seats : Seat of each table.
+        - amounts : Amount of each table.
+    _returns_ : None
+    """
+
+    def put(self, tables: np.ndarray, seats: np.ndarray, amounts: np.ndarray) -> None:
+        self.stacks[tables, seats] -= amounts
+        self.bets[tables, seats] += amounts
+        self.contributions[tables, seats] += amounts
+        self.pots[tables] += amounts
+        self.all_in[tables, seats] |= self.stacks[tables, seats] == 0
+
+    """
+    _summary_ : Play one decision on every table.
+    _description_ : This method is used to apply the action of the acting seat of every table as
+        PokerGame.apply_action does, move to the next decision, deal the next rounds on tables whose round
+        is over and settle the tables whose hand is over.
+    _attributes_ :
+        - actions : Action index (see ACTIONS) of the acting seat of each table (B,).
+        - amounts : Amount proposed for a BET or a RAISE (B,), brought up to the minimum raise and down to
+            the stack ; the minimum raise when not given.
+    _returns_ : Observations, action masks, rewards (B, num_players) chips won or lost by each seat
+        on the hands finished during this step, and dones (B,) True where a hand finished.
+    """
+
+    def step(self, actions: np.ndarray, amounts: np.ndarray = None) -> (np.ndarray, np.ndarray, np.ndarray, np.ndarray):
+        actions = np.asarray(actions, dtype=np.int64)
+        if not self.get_action_masks()[self.tables, actions].all():
+            raise ValueError("Illegal action for at least one table")
+
+        tables = self.tables
+        seats = self.seats.copy()
+        stacks = self.stacks[tables, seats]
+        current_bets = self.bets.max(axis=1)
+        to_call = current_bets - self.bets[tables, seats]
+
+        raises = to_call + self.min_raises
+        if amounts is not None:
+            raises = np.maximum(np.asarray(amounts, dtype=np.int64), raises)
+        put = np.zeros(self.num_tables, dtype=np.int64)
+        put = np.where(actions == self.CALL, to_call, put)
+        put = np.where((actions == self.BET) | (actions == self.RAISE), np.minimum(raises, stacks), put)
+        put = np.where(actions == self.ALL_IN, stacks, put)
+
+        self.folded[tables, seats] |= actions == self.FOLD
+        self.put(tables, seats, put)
+
+        raise_sizes = self.bets[tables, seats] - current_bets
+        full = raise_sizes >= self.min_raises
+        self.min_raises = np.where(full, raise_sizes, self.min_raises)
+        self.acted[full] = False
+        self.acted[tables, seats] = True
+        # A full bet or raise : every other player able to bet has to act again. An all-in for less
+        # than a full raise : only the players who now owe chips act again (see PokerGame.count_to_act)
+        able = ~self.folded & ~self.all_in
+        owing = (able & (self.bets < self.bets.max(axis=1, keepdims=True))).sum(axis=1)
+        self.to_act = np.where(full, able.sum(axis=1) - ~self.all_in[tables, seats],
+                               np.where(raise_sizes > 0, owing, self.to_act - 1))
+        self.seats = (seats + 1) % self.num_players
+
+        dones = self.advance(tables)
+        rewards = np.zeros((self.num_tables, self.num_players), dtype=np.float64)
+        if dones.any():
+            finished = np.flatnonzero(dones)
+            rewards[finished] = self.showdown(finished) - self.contributions[finished]
+            self.hands_played += len(finished)
+            self.reset_tables(finished)
+
+        return self.get_observations(), self.get_action_masks(), rewards, dones
+
+    """
+    _summary_ : Move to the next decision.
+    _description_ : This method is used to move the acting seat of some tables to the next player able to act,
+        as PokerGame.play_round does, dealing the next rounds of the tables whose round is over.
+    _attributes_ :
+        - tables : Indices of the tables.
+    _returns_ : Boolean array (B,), True for the tables whose hand is over.
+    """
+
+    def advance(self, tables: np.ndarray) -> np.ndarray:
+        dones = np.zeros(self.num_tables, dtype=bool)
+        while len(tables):
+            able = ~self.folded[tables] & ~self.all_in[tables]
+            num_live = (~self.folded[tables]).sum(axis=1)
+            num_active = able.sum(axis=1)
+
+            # First seat able to act from the seat in turn
+            order = (self.seats[tables, None] + np.arange(self.num_players)) % self.num_players
+            seats = order[np.arange(len(tables)), np.take_along_axis(able, order, axis=1).argmax(axis=1)]
+            to_call = self.bets[tables].max(axis=1) - self.bets[tables, seats]
+
+            over = num_live <= 1
+            decision = ~over & (self.to_act[tables] > 0) & (num_active > 0) & ~((num_active == 1) & (to_call == 0))
+            self.seats[tables[decision]] = seats[decision]
+
+            round_over = ~over & ~decision
+            last = round_over & (self.rounds[tables] + 1 >= self.max_rounds)
+            dones[tables[over | last]] = True
+            tables = tables[round_over & ~last]
+            if len(tables):
+                self.deal_round(tables)
+        return dones
+
+    """
+    _summary_ : Deal the next round.
+    _description_ : This method is used to start the next round of some tables : bets are cleared and
+        the community cards of the round are dealt.
+    _attributes_ :
+        - tables : Indices of the tables.
+    _returns_ : None
+    """
+
+    def deal_round(self, tables: np.ndarray) -> None:
+        self.bets[tables] = 0
+        self.acted[tables] = False
+        self.min_raises[tables] = self.big_blind
+        self.seats[tables] = (self.buttons[tables] + self.first_position(1)) % self.num_players
+        self.to_act[tables] = (~self.folded[tables] & ~self.all_in[tables]).sum(axis=1)
+        self.board_sizes[tables] = np.where(self.rounds[tables] == 0, 3,
+                                            np.minimum(self.board_sizes[tables] + 1, 5))
+        self.rounds[tables] += 1
+
+        dealt = np.arange(5) < self.board_sizes[tables, None]
+        self.board_masks[tables] = np.where(dealt, CARD_BIT_ARRAY[self.deck_boards[tables]], 0).sum(axis=1)
+        self.start_round(tables)
+
+    """
+    _summary_ : Settle some tables.
+    _description_ : This method is used to share the main pot and the side pots of some tables between their
+        live hands with Showdown.resolve, the hands being evaluated in one batch. The odd chips go to the
+        first winners from the button, as in PokerGame.showdown.
+    _attributes_ :
+        - tables : Indices of the tables.
+    _returns_ : Chips won by each seat (len(tables), num_players).
+    """
+
+    def showdown(self, tables: np.ndarray) -> np.ndarray:
+        masks = self.hand_masks[tables] | self.board_masks[tables, None]
+        strengths = self.hand_evaluator.evaluate_mask_batch(masks.ravel()).reshape(masks.shape).tolist()
+        contributions = self.contributions[tables].tolist()
+        live = (~self.folded[tables]).tolist()
+        orders = ((self.buttons[tables, None] + np.arange(self.num_players)) % self.num_players).tolist()
+        return np.array([Showdown.resolve(strengths[i], contributions[i], live[i], orders[i])
+                         for i in range(len(tables))], dtype=np.int64)
+
+    """
+    _summary_ : Get the action masks.
+    _description_ : This method is used to get the legal actions of the acting seat of every table,
+        as PokerGame.get_action_mask.
+    _attributes_ : None
+    _returns_ : Boolean masks (B, 6).
+    """
+
+    def get_action_masks(self) -> np.ndarray:
+        stacks = self.stacks[self.tables, self.seats]
+        current_bets = self.bets.max(axis=1)
+        to_call = current_bets - self.bets[self.tables, self.seats]
+
+        can_raise = ~self.acted[self.tables, self.seats]
+
+        masks = np.zeros((self.num_tables, len(self.ACTIONS)), dtype=bool)
+        masks[:, self.FOLD] = True
+        masks[:, self.CHECK] = to_call == 0
+        masks[:, self.CALL] = (0 < to_call) & (to_call < stacks)
+        masks[:, self.BET] = can_raise & (current_bets == 0) & (stacks > self.min_raises)
+        masks[:, self.RAISE] = can_raise & (current_bets > 0) & (stacks > to_call + self.min_raises)
+        masks[:, self.ALL_IN] = (stacks > 0) & (can_raise | (stacks <= to_call))
+        return masks
+
+    """
+    _summary_ : Get the observations.
+    _description_ : This method is used to get the state of every table seen by its acting seat, as the row
+        extract_features writes for the decision : the pot, the stack, the hand strength and the equity
+        are the ones at the start of the round. The action to score is not known yet, so the actions and amount
+        columns are -1 and 0.
+    _attributes_ : None
+    _returns_ : Observations (B, schema.size), float32.
+    """
+
+    def get_observations(self) -> np.ndarray:
+        index = self.schema.index
+        tables, seats = self.tables, self.seats
+        observations = np.zeros((self.num_tables, self.schema.size), dtype=np.float32)
+        observations[:, index['rounds']] = self.rounds
+        observations[:, index['big_blind']] = self.big_blind
+        observations[:, index['small_blind']] = self.small_blind
+        observations[:, index['pot']] = self.round_pots
+        observations[:, index['num_players']] = self.num_players
+
+        # Card -1 (not dealt) reads the last entry of the encoding arrays, which is -1
+        community = np.where(np.arange(5) < self.board_sizes[:, None], self.deck_boards, -1)
+        for i in range(5):
+            observations[:, index[f'community_cards_suit_{i}']] = card_suit_array[community[:, i]]
+            observations[:, index[f'community_cards_value_{i}']] = card_value_array[community[:, i]]
+
+        observations[:, index['own_stack']] = self.round_stacks[tables, seats]
+        own_cards = self.hands[tables, seats]
+        i = 0
+        while f'own_cards_suit_{i}' in index:
+            card = own_cards[:, i] if i < own_cards.shape[1] else -1
+            observations[:, index[f'own_cards_suit_{i}']] = card_suit_array[card]
+            observations[:, index[f'own_cards_value_{i}']] = card_value_array[card]
+            i += 1
+        strengths = self.hand_evaluator.evaluate_mask_batch(self.hand_masks[tables, seats] | self.board_masks)
+        observations[:, index['hand_category']] = strengths >> LookupTables.CATEGORY_SHIFT
+        observations[:, index['hand_strength']] = strengths / float(1 << 24)
+        observations[:, index['equity']] = self.equities[tables, seats]
+        observations[:, index['actions']] = -1
+        return observations
+
+"""
+_summary_ : Benchmark the vector game.
+_description_ : This method is used to measure the decisions and hands per second with random legal actions.
+_attributes_ :
+    - num_tables : Number of tables.
+    - num_steps : Number of steps.
+    - seed : Seed of the game and of the actions.
+_returns_ : Decisions per second and hands per second.
+"""
+
+
+def benchmark(num_tables: int = 1024, num_steps: int = 500, seed: int = 0) -> dict:
+    game = VectorPokerGame(num_tables, num_players=6, small_blind=10, big_blind=20, max_rounds=4, seed=seed)
+    rng = np.random.default_rng(seed)
+
+    _, action_masks = game.reset()
+    start = time.perf_counter()
+    for _ in range(num_steps):
+        actions = np.argmax(rng.random(action_masks.shape) * action_masks, axis=1)
+        _, action_masks, _, _ = game.step(actions)
+    elapsed = time.perf_counter() - start
+
+    return {'decisions_per_second': num_tables * num_steps / elapsed,
+            'hands_per_second': game.hands_played / elapsed}
+
+
+if __name__ == "__main__":
+    for name, value in benchmark().items():
+        print(f"{name}: {value:,.0f}")
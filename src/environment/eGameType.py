@@ -0,0 +1,20 @@
+# Description: Enum for game types
+# Author: Maxime Cornaton
+# Date: 2023
+
+from enum import Enum
+
+
+class GameType(Enum):
+
+    """
+    _summary_ : Enum for game types.
+    _description_ : This enum is used to represent the poker variants, by the game_type of their config.
+    """
+
+    TEXAS_HOLDEM = "Texas Hold'em"
+    OMAHA = "Omaha Poker"
+
+    @property
+    def num_hole_cards(self) -> int:
+        return 4 if self is GameType.OMAHA else 2
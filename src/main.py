@@ -1,45 +1,83 @@
 from agent.cAgent import Agent
+from agent.cSelfPlayRunner import SelfPlayRunner
 from environment.cPokerGame import PokerGame
+from utils.cAsyncWriter import AsyncWriter
+from utils.cColumnStore import ColumnStore
+from utils.cMetrics import Metrics, MetricsExporter, SamplingProfiler
 from utils.config_manager import load_config
-from utils.preprocessing import preprocess_game_data
-from utils.helpers import save_json
+from utils.preprocessing import features_to_columns, preprocess_game_data
 
 
 def main():
     num_episodes = 1
+    num_workers = 0  # > 0 to play the episodes in parallel worker processes
+    metrics_path = None  # e.g. "data/metrics.prom" to export the metrics of the run every 10 seconds
+    profile_episode = None  # Episode whose stacks are sampled and saved to data/profile.txt
+    compress_store = False  # True for smaller .npz shards to archive, which are read without memory-mapping
 
     game_config = load_config('configs/game_configs/texas_holdem.json')
     agent_config = load_config('configs/agent_configs/neural_network.json')
 
     # Création de l'agent
     agent = Agent(
-        input_size=agent_config['input_size'],
         hidden_size=agent_config['hidden_size'],
         output_size=agent_config['output_size'],
         learning_rate=agent_config['learning_rate']
     )
 
+    # Histories and processed features of every hand, in binary shards written in the background,
+    # memory-mapped when loaded for training unless compressed
+    writer = AsyncWriter(ColumnStore("data/store", compress=compress_store))
+
+    if num_workers > 0:
+        runner = SelfPlayRunner(game_config, agent_config,
+                                num_workers=num_workers, seed=0)
+        with writer:
+            for trajectory in runner.run(agent, num_episodes):
+                writer.put(trajectory['history'])
+                writer.put(features_to_columns(
+                    trajectory['id'], trajectory['features'], trajectory['targets']))
+                agent.train(trajectory['features'], trajectory['targets'])
+        print(f"{runner.hands_per_second():.0f} hands/s")
+        return
+
     # Création de l'environnement
     environment = PokerGame(
         num_players=game_config['num_players'],
         small_blind=game_config['small_blind'],
         big_blind=game_config['big_blind'],
-        max_rounds=game_config['max_rounds']
+        max_rounds=game_config['max_rounds'],
+        game_type=game_config['game_type']
     )
 
-    for id in range(num_episodes):
+    exporter = None
+    if metrics_path is not None:
+        exporter = MetricsExporter(Metrics.enable(), path=metrics_path)
+
+    with writer:
+        for id in range(num_episodes):
+            profiler = SamplingProfiler() if id == profile_episode else None
+            if profiler is not None:
+                profiler.start()
+
+            environment.init(agent=agent)
+            environment.play()
+
+            writer.put(environment.history.to_columns(id))
 
-        environment.init(agent=agent)
-        winners = environment.play()
+            features, targets = preprocess_game_data(environment)
+            writer.put(features_to_columns(id, features, targets))
 
-        environment.save_history(f"data/games/game_{id}.json")
+            agent.train(features, targets)
 
-        data, rewards = preprocess_game_data(environment, winners)
-        save_json(data, f"data/processed/game_{id}.json")
+            environment.reset()
 
-        agent.train(data, rewards)
+            if profiler is not None:
+                profiler.stop()
+                profiler.save("data/profile.txt")
 
-        environment.reset()
+    if exporter is not None:
+        exporter.close()
 
 
 if __name__ == "__main__":
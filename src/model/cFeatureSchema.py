@@ -0,0 +1,38 @@
+# Description: This file contains the FeatureSchema class, the layout of the rows fed to the model.
+# Author: Maxime Cornaton
+# Date: 2023
+
+class FeatureSchema:
+
+    """
+    _summary_ : Class describing the columns of a feature row.
+    _description_ : This class is used to give every feature a fixed column, so the featurizer writes
+        rows in the same layout the model is built for (its input size is the size of the schema).
+        FEATURE_SCHEMA has own_cards columns for the MAX_HOLE_CARDS cards of an Omaha hand, so a single model
+        reads both variants : the columns past the cards of the hand (the last two in Texas Hold'em) are -1,
+        like the community cards not dealt.
+    _attributes_ :
+        - names : Names of the features, in column order.
+    _returns_ : None
+    """
+
+    def __init__(self, names: list) -> None:
+        self.names = list(names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.size = len(self.names)
+
+    def __len__(self) -> int:
+        return self.size
+
+
+# Hole cards of an Omaha hand, the largest of the variants
+MAX_HOLE_CARDS = 4
+
+FEATURE_SCHEMA = FeatureSchema(
+    ["rounds", "big_blind", "small_blind", "pot"] +
+    [f"community_cards_{kind}_{i}" for i in range(5) for kind in ("suit", "value")] +
+    ["num_players", "own_stack"] +
+    [f"own_cards_{kind}_{i}" for i in range(MAX_HOLE_CARDS) for kind in ("suit", "value")] +
+    ["hand_category", "hand_strength", "equity",
+     "actions", "amount"]
+)
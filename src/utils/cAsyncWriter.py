@@ -0,0 +1,147 @@
+# Description: This file contains the class AsyncWriter which persists tables in a background thread.
+# Author: Maxime Cornaton
+# Date: 2023
+
+import queue
+import threading
+import time
+
+from utils.cColumnStore import ColumnStore
+
+
+class AsyncWriter:
+
+    """
+    _summary_ : Class used to write tables to a ColumnStore without blocking the caller.
+    _description_ : This class is used to hand the tables of every hand to a background thread which
+        batches them in the store and writes the shards. The store flushes a table once it holds chunk_rows
+        rows, and the writer flushes everything flush_interval seconds after the last flush, so a slow run
+        still reaches the disk regularly. The queue is bounded : when the disk falls behind, put blocks
+        instead of letting the pending tables grow without limit. close flushes what is left.
+        The tables are written as they are when taken from the queue : callers must not modify them after put.
+    _attributes_ :
+        - store : ColumnStore written by the background thread.
+        - queue_size : Maximum number of pending puts.
+        - flush_interval : Maximum time in seconds between two flushes, None to flush on size only.
+    _returns_ : None
+    """
+
+    def __init__(self, store: ColumnStore, queue_size: int = 256, flush_interval: float = 5.0) -> None:
+        self.store = store
+        self.flush_interval = flush_interval
+
+        self.pending = queue.Queue(maxsize=queue_size)
+        self.error = None
+        self.num_puts = 0
+        self.blocked_time = 0.0
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def __enter__(self) -> "AsyncWriter":
+        return self
+
+    def __exit__(self, *exception) -> None:
+        self.close()
+
+    """
+    _summary_ : Queue tables.
+    _description_ : This method is used to hand tables to the background thread, blocking while the queue is full.
+    _attributes_ :
+        - tables : Dictionary of table name to columns (see ColumnStore.append).
+    _returns_ : None
+    """
+
+    def put(self, tables: dict) -> None:
+        self.raise_error()
+        if self.thread is None:
+            raise ValueError("Cannot write to a closed AsyncWriter")
+
+        try:
+            self.pending.put_nowait(tables)
+        except queue.Full:
+            start = time.perf_counter()
+            self.pending.put(tables)
+            self.blocked_time += time.perf_counter() - start
+        self.num_puts += 1
+
+    """
+    _summary_ : Close the writer.
+    _description_ : This method is used to write every pending table, flush the store and stop the thread.
+    _attributes_ : None
+    _returns_ : None
+    """
+
+    def close(self) -> None:
+        if self.thread is None:
+            return
+        self.pending.put(None)
+        self.thread.join()
+        self.thread = None
+        self.raise_error()
+
+    """
+    _summary_ : Run the writer.
+    _description_ : This method is used, in the background thread, to append the queued tables to the store
+        and flush it on time.
+    _attributes_ : None
+    _returns_ : None
+    """
+
+    def run(self) -> None:
+        last_flush = time.perf_counter()
+        while True:
+            timeout = None
+            if self.flush_interval is not None:
+                timeout = max(last_flush + self.flush_interval - time.perf_counter(), 0.0)
+            try:
+                tables = self.pending.get(timeout=timeout)
+            except queue.Empty:
+                tables = {}
+
+            if tables is None:
+                self.write(self.store.flush)
+                return
+            if tables:
+                self.write(self.store.append_tables, tables)
+
+            if self.flush_interval is not None and time.perf_counter() - last_flush >= self.flush_interval:
+                self.write(self.store.flush)
+                last_flush = time.perf_counter()
+
+    """
+    _summary_ : Call the store.
+    _description_ : This method is used to keep the first error of the background thread for the caller,
+        the following tables being dropped so the caller is never left blocked on a full queue.
+    _attributes_ :
+        - method : Method of the store.
+        - args : Arguments of the method.
+    _returns_ : None
+    """
+
+    def write(self, method, *args) -> None:
+        if self.error is not None:
+            return
+        try:
+            method(*args)
+        except Exception as exception:
+            self.error = exception
+
+    def raise_error(self) -> None:
+        if self.error is not None:
+            raise RuntimeError("Background write failed") from self.error
+
+    """
+    _summary_ : Get the statistics.
+    _description_ : This method is used to get how much the writer slowed the caller down.
+    _attributes_ : None
+    _returns_ : Dictionary of statistics, times in seconds.
+    """
+
+    def get_stats(self) -> dict:
+        return {
+            'puts': self.num_puts,
+            'pending': self.pending.qsize(),
+            'blocked_time': self.blocked_time,
+            'bytes_written': self.store.bytes_written,
+        }
@@ -0,0 +1,321 @@
+# Description: This file contains the BenchmarkSuite class, which measures the hot paths against a saved baseline.
+# Author: Maxime Cornaton
+# Date: 2023
+
+import argparse
+import multiprocessing as mp
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Run as a script (python src/utils/cBenchmarkSuite.py), the packages of src are not on the path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+import torch
+
+from agent.cAgent import Agent
+from agent.cCFRTrainer import CFRTrainer
+from environment.cDealer import Dealer
+from environment.cHandEvaluator import HandEvaluator
+from environment.cPokerGame import PokerGame
+from utils.helpers import load_json, peak_rss_mb, save_json
+from utils.preprocessing import extract_features, preprocess_game_data
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..', 'data', 'benchmarks', 'baseline.json')
+
+
+class BenchmarkSuite:
+
+    """
+    _summary_ : Class used to benchmark the hot paths of the project.
+    _description_ : This class is used to time every case of CASES the same way : its inputs are built once
+        from the seed, a few warm-up calls are made (lookup tables, allocations, torch kernels), then each
+        timed call is measured on its own. A call runs ops_per_call operations, so the latencies are given
+        per operation : ops_per_second over the whole run, p50 and p99 over the calls.
+        Every random stream (random, NumPy, torch and the dealers) is seeded again before each case, so two
+        runs do the same work and can be compared with a baseline saved as JSON.
+        Each case runs in a new process : the peak resident memory of a process never goes down, so this
+        is the only way for peak_rss_mb to be the peak of the case alone rather than of every case before it.
+    _attributes_ :
+        - seed : Seed of every case.
+        - num_calls : Number of timed calls per case.
+        - num_warmup : Number of calls before timing.
+    _returns_ : None
+    """
+
+    # Case name, method building its call, operations per call
+    CASES = [
+        ("evaluate_hand", "setup_evaluate_hand", 1000),
+        ("play", "setup_play", 10),
+        ("preprocess_game_data", "setup_preprocess_game_data", 10),
+        ("extract_features", "setup_extract_features", 10),
+        ("train", "setup_train", 1),
+        ("json_persistence", "setup_json_persistence", 1),
+        ("cfr_iteration", "setup_cfr_iteration", 10),
+    ]
+
+    # Metric compared with the baseline : True if higher is better, scale of the threshold (tails are noisier)
+    METRICS = {
+        'ops_per_second': (True, 1.0),
+        'p50_us': (False, 1.0),
+        'p99_us': (False, 2.0),
+        'peak_rss_mb': (False, 1.0),
+    }
+
+    def __init__(self, seed: int = 0, num_calls: int = 200, num_warmup: int = 10) -> None:
+        self.seed = seed
+        self.num_calls = num_calls
+        self.num_warmup = num_warmup
+
+    """
+    _summary_ : Seed every random stream.
+    _description_ : This method is used to start each case from the same random state.
+    _attributes_ : None
+    _returns_ : None
+    """
+
+    def seed_all(self) -> None:
+        random.seed(self.seed)
+        np.random.seed(self.seed)
+        torch.manual_seed(self.seed)
+
+    """
+    _summary_ : Create a game.
+    _description_ : This method is used to create a 6-player game with a seeded dealer, ready to play.
+    _attributes_ : None
+    _returns_ : Game of poker.
+    """
+
+    def make_game(self) -> PokerGame:
+        game = PokerGame(num_players=6, small_blind=5, big_blind=10, max_rounds=4, seed=self.seed)
+        game.init(agent=None)
+        return game
+
+    """
+    _summary_ : Play a game.
+    _description_ : This method is used to play one hand on a game and start the next one, stacks
+        being refilled so the hands never run out of players.
+    _attributes_ :
+        - game : Game of poker.
+    _returns_ : None
+    """
+
+    def play_hand(self, game: PokerGame) -> None:
+        game.reset()
+        for player in game.players:
+            player.chips = 1000
+        game.play()
+
+    # Each setup builds the inputs of its case once and returns the call to time
+
+    def setup_evaluate_hand(self, ops_per_call: int):
+        hand_evaluator = HandEvaluator()
+        deals = Dealer(self.seed).deal_batch(ops_per_call, 7).tolist()
+
+        def call():
+            for cards in deals:
+                hand_evaluator.evaluate_hand(cards[:2], cards[2:])
+        return call
+
+    def setup_play(self, ops_per_call: int):
+        game = self.make_game()
+
+        def call():
+            for _ in range(ops_per_call):
+                self.play_hand(game)
+        return call
+
+    def setup_preprocess_game_data(self, ops_per_call: int):
+        game = self.make_game()
+        self.play_hand(game)
+
+        def call():
+            for _ in range(ops_per_call):
+                preprocess_game_data(game)
+        return call
+
+    def setup_extract_features(self, ops_per_call: int):
+        game = self.make_game()
+        self.play_hand(game)
+
+        def call():
+            for _ in range(ops_per_call):
+                extract_features(game.history)
+        return call
+
+    def setup_train(self, ops_per_call: int):
+        game = self.make_game()
+        self.play_hand(game)
+        features, targets = preprocess_game_data(game)
+        agent = Agent(hidden_size=64, output_size=1, learning_rate=0.001, batch_size=32)
+
+        def call():
+            for _ in range(ops_per_call):
+                agent.train(features, targets)
+        return call
+
+    def setup_json_persistence(self, ops_per_call: int):
+        game = self.make_game()
+        self.play_hand(game)
+        path = os.path.join(tempfile.mkdtemp(), "history.json")
+
+        def call():
+            for _ in range(ops_per_call):
+                game.history.save(path)
+                load_json(path)
+        return call
+
+    def setup_cfr_iteration(self, ops_per_call: int):
+        trainer = CFRTrainer(num_players=2, small_blind=5, big_blind=10, max_rounds=4, chips=200, seed=self.seed)
+
+        def call():
+            trainer.train(ops_per_call)
+        return call
+
+    """
+    _summary_ : Measure a case.
+    _description_ : This method is used to warm up and time the calls of a case.
+    _attributes_ :
+        - call : Function running ops_per_call operations.
+        - ops_per_call : Number of operations per call.
+    _returns_ : Dictionary of measures, latencies in microseconds per operation.
+    """
+
+    def measure(self, call, ops_per_call: int) -> dict:
+        for _ in range(self.num_warmup):
+            call()
+
+        timings = np.empty(self.num_calls, dtype=np.int64)
+        for i in range(self.num_calls):
+            start = time.perf_counter_ns()
+            call()
+            timings[i] = time.perf_counter_ns() - start
+
+        latencies = timings / 1000.0 / ops_per_call
+        return {
+            'ops_per_second': ops_per_call * self.num_calls / (timings.sum() / 1e9),
+            'p50_us': float(np.percentile(latencies, 50)),
+            'p99_us': float(np.percentile(latencies, 99)),
+            # The peak of the process, which only ran this case (None where it cannot be read)
+            'peak_rss_mb': peak_rss_mb(),
+        }
+
+    """
+    _summary_ : Run the benchmarks.
+    _description_ : This method is used to measure some or all of the cases, in the order of CASES, each one
+        in its own process.
+    _attributes_ :
+        - names : Names of the cases to run, all by default.
+    _returns_ : Dictionary of case name to measures.
+    """
+
+    def run(self, names: list = None) -> dict:
+        unknown = set(names or []) - {name for name, _, _ in self.CASES}
+        if unknown:
+            raise ValueError(f"Unknown benchmark cases: {sorted(unknown)}")
+
+        results = {}
+        # Spawned rather than forked, so the process starts without the memory of this one
+        context = mp.get_context('spawn')
+        for name, _, _ in self.CASES:
+            if names and name not in names:
+                continue
+            with context.Pool(1) as pool:
+                results[name] = pool.apply(run_case, (self.seed, self.num_calls, self.num_warmup, name))
+        return results
+
+    """
+    _summary_ : Compare with a baseline.
+    _description_ : This method is used to find the measures that got worse than the baseline by more
+        than threshold (0.2 for 20% fewer operations per second or 20% higher latency), twice threshold
+        for p99. Cases missing from either side are not compared, nor measures unknown on either side.
+    _attributes_ :
+        - results : Measures of the run.
+        - baseline : Measures of the baseline.
+        - threshold : Relative change allowed.
+    _returns_ : List of (case, metric, baseline value, value) for every regression.
+    """
+
+    @classmethod
+    def compare(cls, results: dict, baseline: dict, threshold: float) -> list:
+        regressions = []
+        for name in results.keys() & baseline.keys():
+            for metric, (higher_is_better, scale) in cls.METRICS.items():
+                value = results[name][metric]
+                reference = baseline[name][metric]
+                if value is None or reference is None:
+                    continue
+                if higher_is_better:
+                    regressed = value < reference * (1 - threshold * scale)
+                else:
+                    regressed = value > reference * (1 + threshold * scale)
+                if regressed:
+                    regressions.append((name, metric, reference, value))
+        return regressions
+
+
+"""
+_summary_ : Run a case.
+_description_ : This method is used, in the process of the case, to seed every random stream and measure the case.
+_attributes_ :
+    - seed : Seed of the case.
+    - num_calls : Number of timed calls.
+    - num_warmup : Number of calls before timing.
+    - name : Name of the case.
+_returns_ : Dictionary of measures (see BenchmarkSuite.measure).
+"""
+
+
+def run_case(seed: int, num_calls: int, num_warmup: int, name: str) -> dict:
+    suite = BenchmarkSuite(seed=seed, num_calls=num_calls, num_warmup=num_warmup)
+    _, setup, ops_per_call = next(case for case in suite.CASES if case[0] == name)
+    suite.seed_all()
+    return suite.measure(getattr(suite, setup)(ops_per_call), ops_per_call)
+
+
+"""
+_summary_ : Print the results.
+_description_ : This method is used to print one line per case.
+_attributes_ :
+    - results : Measures of the run.
+_returns_ : None
+"""
+
+
+def print_results(results: dict) -> None:
+    print(f"{'case':<22}{'ops/s':>14}{'p50 (us)':>12}{'p99 (us)':>12}{'peak RSS (MB)':>15}")
+    for name, measures in results.items():
+        peak_rss = 'n/a' if measures['peak_rss_mb'] is None else f"{measures['peak_rss_mb']:.1f}"
+        print(f"{name:<22}{measures['ops_per_second']:>14,.0f}{measures['p50_us']:>12.1f}"
+              f"{measures['p99_us']:>12.1f}{peak_rss:>15}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths against a baseline.")
+    parser.add_argument("cases", nargs="*", help="Cases to run, all by default.")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true", help="Save the results as the new baseline.")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    args = parser.parse_args()
+
+    suite = BenchmarkSuite(seed=args.seed, num_calls=args.calls, num_warmup=args.warmup)
+    results = suite.run(args.cases)
+    print_results(results)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        save_json(results, args.baseline)
+        print(f"Saved {args.baseline}")
+    elif os.path.exists(args.baseline):
+        regressions = BenchmarkSuite.compare(results, load_json(args.baseline), args.threshold)
+        for name, metric, reference, value in regressions:
+            print(f"REGRESSION {name} {metric}: {reference:,.1f} -> {value:,.1f}")
+        if regressions:
+            sys.exit(1)
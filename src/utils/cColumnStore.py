@@ -0,0 +1,190 @@
+# Description: This file contains the class ColumnStore, an append-only binary columnar store.
+# Author: Maxime Cornaton
+# Date: 2023
+
+import os
+import time
+
+import numpy as np
+
+from utils.cMetrics import Metrics
+
+
+class ColumnStore:
+
+    """
+    _summary_ : Class used to store tables of fixed-width columns in binary shards.
+    _description_ : This class is used to append rows of many hands to named tables and to write them in
+        shards of about chunk_rows rows. A shard is a directory holding one .npy file per column, renamed
+        into place once complete, so readers only ever see whole shards. Shards are loaded memory-mapped :
+        nothing is parsed to read them back.
+        Layout : {directory}/{table}/{shard:06d}/{column}.npy
+        With compress, a shard is instead a single {directory}/{table}/{shard:06d}.npz file, smaller on disk
+        but read back into memory instead of being memory-mapped.
+    _attributes_ :
+        - directory : Root directory of the store.
+        - chunk_rows : Number of buffered rows of a table that triggers the write of a shard.
+        - compress : Whether shards are written compressed.
+    _returns_ : None
+    """
+
+    def __init__(self, directory: str, chunk_rows: int = 65536, compress: bool = False) -> None:
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+        self.compress = compress
+
+        self.buffers = {}
+        self.buffered_rows = {}
+        self.bytes_written = 0
+
+    """
+    _summary_ : Append rows to a table.
+    _description_ : This method is used to buffer rows, and to write a shard when the table has enough of them.
+    _attributes_ :
+        - table : Name of the table.
+        - columns : Dictionary of column name to array, all with the same number of rows.
+    _returns_ : None
+    """
+
+    def append(self, table: str, columns: dict) -> None:
+        buffer = self.buffers.setdefault(table, {})
+        num_rows = None
+        for name, values in columns.items():
+            values = np.asarray(values)
+            if num_rows is not None and len(values) != num_rows:
+                raise ValueError(f"Columns of table {table} have different lengths")
+            num_rows = len(values)
+            buffer.setdefault(name, []).append(values)
+
+        self.buffered_rows[table] = self.buffered_rows.get(table, 0) + (num_rows or 0)
+        if self.buffered_rows[table] >= self.chunk_rows:
+            self.flush_table(table)
+
+    """
+    _summary_ : Append rows to many tables.
+    _description_ : This method is used to append the rows of several tables at once.
+    _attributes_ :
+        - tables : Dictionary of table name to columns (see append).
+    _returns_ : None
+    """
+
+    def append_tables(self, tables: dict) -> None:
+        for table, columns in tables.items():
+            self.append(table, columns)
+
+    """
+    _summary_ : Flush the store.
+    _description_ : This method is used to write every buffered row.
+    _attributes_ : None
+    _returns_ : None
+    """
+
+    def flush(self) -> None:
+        for table in list(self.buffers):
+            self.flush_table(table)
+
+    """
+    _summary_ : Flush a table.
+    _description_ : This method is used to write the buffered rows of a table as a new shard.
+    _attributes_ :
+        - table : Name of the table.
+    _returns_ : None
+    """
+
+    def flush_table(self, table: str) -> None:
+        buffer = self.buffers.pop(table, None)
+        if not buffer or not self.buffered_rows.pop(table, 0):
+            return
+
+        table_directory = os.path.join(self.directory, table)
+        os.makedirs(table_directory, exist_ok=True)
+        shard = len(self.shard_names(table))
+        columns = {name: np.concatenate(chunks) if len(chunks) > 1 else chunks[0]
+                   for name, chunks in buffer.items()}
+
+        metrics = Metrics.active
+        if metrics is None:
+            self.write_shard(table_directory, shard, columns)
+            return
+
+        start = time.perf_counter_ns()
+        bytes_written = self.bytes_written
+        self.write_shard(table_directory, shard, columns)
+        metrics.add_time('write', time.perf_counter_ns() - start)
+        metrics.count('bytes_written', self.bytes_written - bytes_written)
+
+    """
+    _summary_ : Write a shard.
+    _description_ : This method is used to write the columns of a shard under a temporary name, then to
+        rename it so that a shard is either complete or absent.
+    _attributes_ :
+        - table_directory : Directory of the table.
+        - shard : Number of the shard.
+        - columns : Dictionary of column name to values.
+    _returns_ : None
+    """
+
+    def write_shard(self, table_directory: str, shard: int, columns: dict) -> None:
+        if self.compress:
+            temporary = os.path.join(table_directory, f".{shard:06d}.tmp.npz")
+            np.savez_compressed(temporary, **columns)
+            self.bytes_written += os.path.getsize(temporary)
+            os.rename(temporary, os.path.join(table_directory, f"{shard:06d}.npz"))
+            return
+
+        temporary = os.path.join(table_directory, f".{shard:06d}.tmp")
+        os.makedirs(temporary, exist_ok=True)
+        for name, values in columns.items():
+            np.save(os.path.join(temporary, f"{name}.npy"), values)
+            self.bytes_written += values.nbytes
+        os.rename(temporary, os.path.join(table_directory, f"{shard:06d}"))
+
+    """
+    _summary_ : List the shards of a table.
+    _description_ : This method is used to get the names of the complete shards of a table, in order.
+    _attributes_ :
+        - table : Name of the table.
+    _returns_ : List of shard names.
+    """
+
+    def shard_names(self, table: str) -> list:
+        table_directory = os.path.join(self.directory, table)
+        if not os.path.isdir(table_directory):
+            return []
+        return sorted(name for name in os.listdir(table_directory) if not name.startswith('.'))
+
+    """
+    _summary_ : Load the shards of a table.
+    _description_ : This method is used to memory-map every shard of a table (compressed shards are read in memory).
+    _attributes_ :
+        - table : Name of the table.
+    _returns_ : List of dictionaries of column name to memory-mapped array, one per shard.
+    """
+
+    def load_shards(self, table: str) -> list:
+        shards = []
+        for shard in self.shard_names(table):
+            shard_directory = os.path.join(self.directory, table, shard)
+            if shard.endswith(".npz"):
+                with np.load(shard_directory) as archive:
+                    shards.append({name: archive[name] for name in archive.files})
+                continue
+            shards.append({name[:-len(".npy")]: np.load(os.path.join(shard_directory, name), mmap_mode='r')
+                           for name in os.listdir(shard_directory) if name.endswith(".npy")})
+        return shards
+
+    """
+    _summary_ : Load a table.
+    _description_ : This method is used to get a whole table, its shards being concatenated.
+    _attributes_ :
+        - table : Name of the table.
+    _returns_ : Dictionary of column name to array.
+    """
+
+    def load(self, table: str) -> dict:
+        shards = self.load_shards(table)
+        if not shards:
+            return {}
+        if len(shards) == 1:
+            return shards[0]
+        return {name: np.concatenate([shard[name] for shard in shards]) for name in shards[0]}
@@ -0,0 +1,324 @@
+# Description: This file contains the classes Metrics, MetricsExporter and SamplingProfiler, which instrument the hot paths.
+# Author: Maxime Cornaton
+# Date: 2023
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Metrics:
+
+    """
+    _summary_ : Class used to count and time the phases of the hot paths.
+    _description_ : This class is used to aggregate counters (hands, decisions, evaluations, bytes written)
+        and timers (deal, decision, history, showdown, features, train, write) in plain dictionaries.
+        The instrumented code reads Metrics.active, which is None until enable is called : while disabled
+        a hot path pays one attribute read and one test, no clock read and no call.
+        Each metric is only updated from one thread (the writer thread owns write and bytes_written), so
+        the updates need no lock, and the exporter thread only copies the dictionaries.
+    _attributes_ : None
+    _returns_ : None
+    """
+
+    # Instance updated by the instrumented code, None while disabled
+    active = None
+
+    def __init__(self) -> None:
+        self.counters = {}
+        # Name to [number of calls, total time in ns, longest call in ns]
+        self.timers = {}
+        self.start_time = time.time()
+
+    """
+    _summary_ : Enable the metrics.
+    _description_ : This method is used to start recording : games created before and after the call are
+        instrumented, as they read Metrics.active on every hand.
+    _attributes_ : None
+    _returns_ : Active metrics.
+    """
+
+    @classmethod
+    def enable(cls) -> 'Metrics':
+        if cls.active is None:
+            cls.active = cls()
+        return cls.active
+
+    """
+    _summary_ : Disable the metrics.
+    _description_ : This method is used to stop recording, the hot paths going back to a single test.
+    _attributes_ : None
+    _returns_ : Metrics recorded so far, None if they were not enabled.
+    """
+
+    @classmethod
+    def disable(cls) -> 'Metrics':
+        metrics, cls.active = cls.active, None
+        return metrics
+
+    """
+    _summary_ : Increment a counter.
+    _description_ : This method is used to add to a counter, created at 0.
+    _attributes_ :
+        - name : Name of the counter.
+        - value : Value to add.
+    _returns_ : None
+    """
+
+    def count(self, name: str, value: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    """
+    _summary_ : Add a time.
+    _description_ : This method is used to add one call of a phase to its timer.
+    _attributes_ :
+        - name : Name of the phase.
+        - elapsed : Time of the call, in ns (see time.perf_counter_ns).
+    _returns_ : None
+    """
+
+    def add_time(self, name: str, elapsed: int) -> None:
+        timer = self.timers.get(name)
+        if timer is None:
+            self.timers[name] = [1, elapsed, elapsed]
+            return
+        timer[0] += 1
+        timer[1] += elapsed
+        if elapsed > timer[2]:
+            timer[2] = elapsed
+
+    """
+    _summary_ : Get a snapshot.
+    _description_ : This method is used to copy the metrics, times being converted to seconds.
+    _attributes_ : None
+    _returns_ : Dictionary with the counters and, for each timer, its calls, total and longest call.
+    """
+
+    def snapshot(self) -> dict:
+        timers = {name: {'calls': calls, 'seconds': total / 1e9, 'max_seconds': longest / 1e9}
+                  for name, (calls, total, longest) in list(self.timers.items())}
+        return {
+            'uptime_seconds': time.time() - self.start_time,
+            'counters': dict(self.counters),
+            'timers': timers,
+        }
+
+    """
+    _summary_ : Format the metrics for Prometheus.
+    _description_ : This method is used to write the snapshot in the Prometheus text format : a counter per
+        counter, and per timer the count and sum of a summary with a gauge for its longest call.
+    _attributes_ :
+        - prefix : Prefix of every metric name.
+    _returns_ : Text of the metrics.
+    """
+
+    def to_prometheus(self, prefix: str = "poker_") -> str:
+        snapshot = self.snapshot()
+        lines = [f"# TYPE {prefix}uptime_seconds gauge",
+                 f"{prefix}uptime_seconds {snapshot['uptime_seconds']:.3f}"]
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f"# TYPE {prefix}{name}_total counter")
+            lines.append(f"{prefix}{name}_total {value}")
+        for name, timer in sorted(snapshot['timers'].items()):
+            lines.append(f"# TYPE {prefix}{name}_seconds summary")
+            lines.append(f"{prefix}{name}_seconds_count {timer['calls']}")
+            lines.append(f"{prefix}{name}_seconds_sum {timer['seconds']:.9f}")
+            lines.append(f"# TYPE {prefix}{name}_max_seconds gauge")
+            lines.append(f"{prefix}{name}_max_seconds {timer['max_seconds']:.9f}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsExporter:
+
+    """
+    _summary_ : Class used to export the metrics periodically.
+    _description_ : This class is used to write the Prometheus text of the metrics to a file every interval
+        seconds from a background thread (written to a temporary file then renamed, so a reader never sees
+        half of it), and/or to serve it over HTTP for a Prometheus scraper. close writes the file one last time.
+    _attributes_ :
+        - metrics : Metrics to export.
+        - path : File written every interval, None for no file.
+        - port : Port of the HTTP endpoint (GET on any path), None for no endpoint.
+        - interval : Time in seconds between two writes of the file.
+    _returns_ : None
+    """
+
+    def __init__(self, metrics: Metrics, path: str = None, port: int = None, interval: float = 10.0) -> None:
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+
+        self.stopped = threading.Event()
+        self.thread = None
+        if path is not None:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+        self.server = None
+        if port is not None:
+            exporter = self
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self) -> None:
+                    body = exporter.metrics.to_prometheus().encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args) -> None:
+                    pass
+
+            self.server = ThreadingHTTPServer(("", port), Handler)
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def __enter__(self) -> "MetricsExporter":
+        return self
+
+    def __exit__(self, *exception) -> None:
+        self.close()
+
+    """
+    _summary_ : Run the exporter.
+    _description_ : This method is used, in the background thread, to write the file every interval seconds.
+    _attributes_ : None
+    _returns_ : None
+    """
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            self.write()
+
+    """
+    _summary_ : Write the file.
+    _description_ : This method is used to replace the file with the current metrics.
+    _attributes_ : None
+    _returns_ : None
+    """
+
+    def write(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temporary = f"{self.path}.tmp"
+        with open(temporary, 'w') as fp:
+            fp.write(self.metrics.to_prometheus())
+        os.replace(temporary, self.path)
+
+    """
+    _summary_ : Close the exporter.
+    _description_ : This method is used to stop the thread and the endpoint, and to write the final metrics.
+    _attributes_ : None
+    _returns_ : None
+    """
+
+    def close(self) -> None:
+        if self.thread is not None:
+            self.stopped.set()
+            self.thread.join()
+            self.thread = None
+            self.write()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+class SamplingProfiler:
+
+    """
+    _summary_ : Class used to profile a block of code by sampling.
+    _description_ : This class is used to look at the stack of the profiled thread every interval seconds
+        from a background thread and to count each stack seen. Unlike cProfile, the profiled code is not
+        traced : it only slows down by the time the sampler holds the interpreter, so the proportions of the
+        samples stay those of a normal run. The stacks can be saved in the collapsed format read by
+        flame graph tools (one 'frame;frame;frame count' line per stack).
+    _attributes_ :
+        - interval : Time in seconds between two samples.
+    _returns_ : None
+    """
+
+    def __init__(self, interval: float = 0.001) -> None:
+        self.interval = interval
+        self.stacks = Counter()
+        self.num_samples = 0
+        self.thread = None
+
+    def __enter__(self) -> "SamplingProfiler":
+        self.start()
+        return self
+
+    def __exit__(self, *exception) -> None:
+        self.stop()
+
+    """
+    _summary_ : Start profiling.
+    _description_ : This method is used to sample the thread calling it until stop is called.
+    _attributes_ : None
+    _returns_ : None
+    """
+
+    def start(self) -> None:
+        self.target = threading.get_ident()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        if self.thread is None:
+            return
+        self.stopped.set()
+        self.thread.join()
+        self.thread = None
+
+    """
+    _summary_ : Run the sampler.
+    _description_ : This method is used, in the background thread, to record the stack of the profiled thread.
+    _attributes_ : None
+    _returns_ : None
+    """
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+                self.num_samples += 1
+
+    """
+    _summary_ : Get the hottest functions.
+    _description_ : This method is used to rank the functions by the share of samples they appear in,
+        their callees included.
+    _attributes_ :
+        - num_functions : Number of functions.
+    _returns_ : List of (function, share of the samples).
+    """
+
+    def top(self, num_functions: int = 20) -> list:
+        inclusive = Counter()
+        for stack, count in self.stacks.items():
+            for function in set(stack.split(";")):
+                inclusive[function] += count
+        total = max(self.num_samples, 1)
+        return [(function, count / total) for function, count in inclusive.most_common(num_functions)]
+
+    """
+    _summary_ : Save the stacks.
+    _description_ : This method is used to write the sampled stacks in the collapsed format.
+    _attributes_ :
+        - path : Path of the file.
+    _returns_ : None
+    """
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, 'w') as fp:
+            for stack, count in self.stacks.most_common():
+                fp.write(f"{stack} {count}\n")
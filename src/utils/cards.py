@@ -0,0 +1,103 @@
+# Description: Compact card encoding shared by the game, the history and the evaluators
+# Author: Maxime Cornaton
+# Date: 2023
+
+# A card is an int in 0-51 : suit * 13 + rank, ranks going from '2' (0) to 'Ace' (12).
+# A set of cards is a 64-bit mask where card c is bit c, so hands are unions of bits
+# and the 13 ranks of suit s are (mask >> 13 * s) & RANK_MASK.
+
+import numpy as np
+
+SUITS = ['Hearts', 'Diamonds', 'Clubs', 'Spades']
+
+VALUES = ['2', '3', '4', '5', '6', '7', '8',
+          '9', '10', 'Jack', 'Queen', 'King', 'Ace']
+
+SUIT_INDEX = {suit: i for i, suit in enumerate(SUITS)}
+
+VALUE_INDEX = {value: i for i, value in enumerate(VALUES)}
+
+NUM_CARDS = 52
+
+RANK_MASK = (1 << 13) - 1
+
+CARD_RANK = [card % 13 for card in range(NUM_CARDS)]
+
+CARD_SUIT = [card // 13 for card in range(NUM_CARDS)]
+
+CARD_BIT = [1 << card for card in range(NUM_CARDS)]
+
+CARD_BIT_ARRAY = np.array(CARD_BIT, dtype=np.int64)
+
+
+"""
+_summary_ : Encode a card.
+_description_ : This method is used to get the int of a card given in the dict form.
+_attributes_ :
+    - card : Card as {'suit': ..., 'value': ...}.
+_returns_ : Card int.
+"""
+
+
+def encode_card(card: dict) -> int:
+    return SUIT_INDEX[card['suit']] * 13 + VALUE_INDEX[card['value']]
+
+
+"""
+_summary_ : Decode a card.
+_description_ : This method is used to get the dict view of a card, for JSON export and debugging.
+_attributes_ :
+    - card : Card int.
+_returns_ : Card as {'suit': ..., 'value': ...}.
+"""
+
+
+def decode_card(card: int) -> dict:
+    return {'suit': SUITS[CARD_SUIT[card]], 'value': VALUES[CARD_RANK[card]]}
+
+
+"""
+_summary_ : Decode a list of cards.
+_description_ : This method is used to get the dict view of a list of cards.
+_attributes_ :
+    - cards : List of card ints.
+_returns_ : List of cards as dicts.
+"""
+
+
+def decode_cards(cards: list) -> list:
+    return [decode_card(card) for card in cards]
+
+
+"""
+_summary_ : Get the mask of cards.
+_description_ : This method is used to get the 64-bit mask of a list of cards.
+_attributes_ :
+    - cards : List of card ints.
+_returns_ : Mask of the cards.
+"""
+
+
+def cards_to_mask(cards: list) -> int:
+    mask = 0
+    for card in cards:
+        mask |= CARD_BIT[card]
+    return mask
+
+
+"""
+_summary_ : Get the cards of a mask.
+_description_ : This method is used to list the card ints of a 64-bit mask, in increasing order.
+_attributes_ :
+    - mask : Mask of the cards.
+_returns_ : List of card ints.
+"""
+
+
+def mask_to_cards(mask: int) -> list:
+    cards = []
+    while mask:
+        low_bit = mask & -mask
+        cards.append(low_bit.bit_length() - 1)
+        mask ^= low_bit
+    return cards
@@ -3,6 +3,7 @@
 # Date: 2023
 
 import json
+import sys
 
 
 """
@@ -45,3 +46,28 @@ _returns_ : Serializable object.
 
 def make_serializable(obj) -> dict:
     return str(obj)
+
+
+"""
+_summary_ : Get the peak memory of the process.
+_description_ : This method is used to read the peak resident set size of the process. The resource module only
+    exists on Unix, so it is imported here : elsewhere psutil gives the peak working set (Windows) or the
+    current resident set size, and without psutil the peak is unknown.
+_attributes_ : None
+_returns_ : Peak resident set size in MB, None when it cannot be read.
+"""
+
+
+def peak_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        memory = psutil.Process().memory_info()
+        return getattr(memory, 'peak_wset', memory.rss) / (1024 * 1024)
+    # ru_maxrss is in kilobytes on Linux, in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
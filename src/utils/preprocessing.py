@@ -2,11 +2,19 @@
 # Author: Maxime Cornaton
 # Date: 2023
 
+import time
+
+import numpy as np
 import torch
+from environment.cEquityCalculator import EquityCalculator
 from environment.cHistory import History
-from environment.cPlayer import Player
+from environment.cLookupTables import LookupTables
 from environment.cPokerGame import PokerGame
+from environment.cPreflopEquityTable import PreflopEquityTable
 from environment.ePlayerAction import PlayerAction
+from model.cFeatureSchema import FEATURE_SCHEMA, FeatureSchema
+from utils.cMetrics import Metrics
+from utils.cards import CARD_RANK, CARD_SUIT, NUM_CARDS, SUITS, VALUES
 
 suit_to_int = {
     'None': -1,
@@ -33,6 +41,13 @@ value_to_int = {
     'Ace': 1
 }
 
+# Feature encoding of each card int, so extraction never goes back to strings
+card_suit_to_int = [suit_to_int[SUITS[CARD_SUIT[card]]]
+                    for card in range(NUM_CARDS)]
+
+card_value_to_int = [value_to_int[VALUES[CARD_RANK[card]]]
+                     for card in range(NUM_CARDS)]
+
 action_to_int = {
     PlayerAction.FOLD: 0,
     PlayerAction.CHECK: 1,
@@ -43,157 +58,207 @@ action_to_int = {
 }
 
 
+# Sampled deals per postflop equity feature, and number of equities cached by canonical hand
+FEATURE_EQUITY_SAMPLES = 1000
+FEATURE_EQUITY_CACHE_SIZE = 100000
+
+feature_equity_calculator = None
+
+
+"""
+_summary_ : Get the calculator of the equity feature.
+_description_ : This method is used to build once per process the calculator used when none is given : its
+    deals are capped to FEATURE_EQUITY_SAMPLES, enumerated when there are fewer (heads-up river), and its
+    equities are cached by canonical hand.
+_attributes_ : None
+_returns_ : Shared EquityCalculator.
+"""
+
+
+def get_equity_calculator() -> EquityCalculator:
+    global feature_equity_calculator
+    if feature_equity_calculator is None:
+        feature_equity_calculator = EquityCalculator(
+            num_samples=FEATURE_EQUITY_SAMPLES, exhaustive_limit=FEATURE_EQUITY_SAMPLES, seed=0,
+            cache_size=FEATURE_EQUITY_CACHE_SIZE)
+    return feature_equity_calculator
+
+
+"""
+_summary_ : Compute the equities of the rounds.
+_description_ : This method is used to get the equity of every player who acted in a round, at the start of
+    the round, against the other players still in the hand : preflop from the PreflopEquityTable, then
+    from the EquityCalculator. A player left alone in the hand has an equity of 1. Omaha hands are not
+    supported by the calculator, their equity is -1 like the entries of the players who did not act.
+_attributes_ :
+    - history : History of the game.
+    - equity_calculator : Calculator of the postflop equities, the shared one by default.
+_returns_ : Equities (num_rounds, num_players), by seat.
+"""
+
+
+def round_equities(history: History, equity_calculator: EquityCalculator = None) -> np.ndarray:
+    equities = np.full((history.num_rounds, history.num_players), -1.0)
+    if history.hole_cards.shape[1] != 2:
+        return equities
+
+    equity_calculator = equity_calculator or get_equity_calculator()
+    num_live = history.get_round_live().sum(axis=1).tolist()
+    n = history.num_events
+    for round, seat in set(zip(history.event_rounds[:n].tolist(), history.event_seats[:n].tolist())):
+        hand = history.hole_cards[seat].tolist()
+        board = history.board[:history.round_board_sizes[round]].tolist()
+        if num_live[round] < 2:
+            equities[round, seat] = 1.0
+        elif not board and num_live[round] <= PreflopEquityTable.MAX_PLAYERS:
+            equities[round, seat] = PreflopEquityTable.get().lookup(hand, num_live[round])
+        else:
+            equities[round, seat] = equity_calculator.equity(hand, board, num_live[round] - 1)
+    return equities
+
+
 """ 
 _summary_ : Calculate the reward.
-_description_ : This method is used to calculate the reward.    
+_description_ : This method is used to calculate the rewards of every action : the round reward is its amount
+    when its player won chips at the showdown, minus its amount otherwise, the game reward is the final stack
+    of the player, and the EV reward is the share of the pot once the action is played that the player expects
+    back from its equity at the start of the round (see round_equities), minus the amount of the action.
+    A fold gives up the pot, its EV reward is 0.
 _attributes_ :
     - game : Game of poker.
-    - winners : Winners of the game.
-_returns_ : Round rewards and game rewards.
+    - equity_calculator : Calculator of the postflop equities, the shared one by default.
+_returns_ : History of the game (see History.get), with round, game and EV rewards.
 """
 
 
-def add_reward(game: PokerGame, winners: [Player]) -> ([int], [int]):
+def add_reward(game: PokerGame, equity_calculator: EquityCalculator = None) -> list:
     history = game.history.get()
+    payouts = game.history.payouts
+    final_stacks = game.history.get_final_stacks()
+    equities = round_equities(game.history, equity_calculator)
     for round in history:
         for event in round['events']:
-            if event['player'] in winners:
+            seat = event['player'].seat
+            if payouts[seat] > 0:
                 event['round_rewards'] = event['amount']
             else:
                 event['round_rewards'] = -event['amount']
-            event['game_rewards'] = event['player'].chips
+            event['game_rewards'] = final_stacks[seat].item()
+            if event['action'] is PlayerAction.FOLD:
+                event['ev_rewards'] = 0.0
+            else:
+                event['ev_rewards'] = equities[round['round'], seat].item() * event['pot'] - event['amount']
 
     return history
 
 
-def extract_all_actions(data: dict) -> dict:
-    newData = {
-        "rounds": [],
-        "big_blind": [],
-        "small_blind": [],
-        "pot": [],
-        "community_cards_suit_0": [-1] * len(data[0]['players_state']),
-        "community_cards_value_0": [-1] * len(data[0]['players_state']),
-        "community_cards_suit_1": [-1] * len(data[0]['players_state']),
-        "community_cards_value_1": [-1] * len(data[0]['players_state']),
-        "community_cards_suit_2": [-1] * len(data[0]['players_state']),
-        "community_cards_value_2": [-1] * len(data[0]['players_state']),
-        "community_cards_suit_3": [-1] * len(data[0]['players_state'] * 2),
-        "community_cards_value_3": [-1] * len(data[0]['players_state'] * 2),
-        "community_cards_suit_4": [-1] * len(data[0]['players_state'] * 3),
-        "community_cards_value_4": [-1] * len(data[0]['players_state'] * 3),
-        "community_cards_suit_5": [-1] * len(data[0]['players_state'] * 4),
-        "community_cards_value_5": [-1] * len(data[0]['players_state'] * 4),
-        "num_players": [],
-        "own_stack": [],
-        "own_cards_suit_0": [],
-        "own_cards_value_0": [],
-        "own_cards_suit_1": [],
-        "own_cards_value_1": [],
-        # "opponent_stacks": [],
-        "actions": [],
-        "amount": [],
-    }
+# Feature encoding of each card int and action code, as arrays for the vectorized extraction
+card_suit_array = np.array(card_suit_to_int + [-1], dtype=np.float32)
+card_value_array = np.array(card_value_to_int + [-1], dtype=np.float32)
+action_array = np.array([action_to_int[action] for action in PlayerAction], dtype=np.float32)
 
-    rewards = {
-        "round_rewards": [],
-        "game_rewards": []
-    }
 
-    for round in data:
-        for i, event in enumerate(round['events']):
-            newData['rounds'].append(round['round'])
-            newData['big_blind'].append(round['big_blind'])
-            newData['small_blind'].append(round['small_blind'])
-            newData['pot'].append(round['pot'])
-            for i, card in enumerate(round['community_cards']):
-                newData['community_cards_suit_{}'.format(i)].append(
-                    suit_to_int[card['suit']])
-                newData['community_cards_value_{}'.format(i)].append(
-                    value_to_int[card['value']])
-            newData['num_players'].append(len(round['players_state']))
-            newData['own_stack'].append(round['players_state'][i]['stack'])
-            for i, card in enumerate(round['players_state'][i]['cards']):
-                newData['own_cards_suit_{}'.format(i)].append(
-                    suit_to_int[card['suit']])
-                newData['own_cards_value_{}'.format(i)].append(
-                    value_to_int[card['value']])
-            newData['actions'].append(action_to_int[event['action']])
-            newData['amount'].append(event['amount'])
-            rewards['round_rewards'].append(event['round_rewards'])
-            rewards['game_rewards'].append(event['game_rewards'])
-
-    print(newData['community_cards_suit_0'])
-
-    return newData, rewards
+"""
+_summary_ : Extract the features.
+_description_ : This method is used to encode every action of the history at once, straight from its
+    arrays into a preallocated float32 tensor laid out by the feature schema (community cards not dealt are -1,
+    hand strengths and equities are the ones at the start of each round, see round_equities).
+    The rewards are computed at the same time from the payouts of the showdown : an action is rewarded its
+    amount when its player won chips, minus its amount otherwise, and the game reward is the final stack
+    of the player.
+_attributes_ :
+    - history : History of the game.
+    - schema : Feature schema.
+    - equity_calculator : Calculator of the postflop equities, the shared one by default.
+_returns_ : Features (n_events, schema.size) and targets (n_events, 2) : round and game rewards.
+"""
+
+
+def extract_features(history: History, schema: FeatureSchema = FEATURE_SCHEMA,
+                     equity_calculator: EquityCalculator = None) -> (torch.tensor, torch.tensor):
+    n = history.num_events
+    rounds = history.event_rounds[:n]
+    seats = history.event_seats[:n]
+    amounts = history.event_amounts[:n]
+
+    features = torch.empty((n, schema.size), dtype=torch.float32)
+    targets = torch.empty((n, 2), dtype=torch.float32)
+    rows = features.numpy()
+    target_rows = targets.numpy()
+
+    index = schema.index
+    rows[:, index['rounds']] = rounds
+    rows[:, index['big_blind']] = history.big_blind
+    rows[:, index['small_blind']] = history.small_blind
+    rows[:, index['pot']] = history.round_pots[rounds]
+    rows[:, index['num_players']] = len(history.players)
+
+    # Card -1 (not dealt) reads the last entry of the encoding arrays, which is -1
+    community = np.where(np.arange(5) < history.round_board_sizes[rounds][:, None], history.board, -1)
+    for i in range(5):
+        rows[:, index[f'community_cards_suit_{i}']] = card_suit_array[community[:, i]]
+        rows[:, index[f'community_cards_value_{i}']] = card_value_array[community[:, i]]
+
+    rows[:, index['own_stack']] = history.get_round_stacks()[rounds, seats]
+    # As many hole cards as the schema has columns for, the columns past the hand being -1
+    own_cards = history.hole_cards[seats]
+    i = 0
+    while f'own_cards_suit_{i}' in index:
+        card = own_cards[:, i] if i < own_cards.shape[1] else -1
+        rows[:, index[f'own_cards_suit_{i}']] = card_suit_array[card]
+        rows[:, index[f'own_cards_value_{i}']] = card_value_array[card]
+        i += 1
+    strengths = history.round_strengths[rounds, seats]
+    rows[:, index['hand_category']] = strengths >> LookupTables.CATEGORY_SHIFT
+    rows[:, index['hand_strength']] = strengths / float(1 << 24)
+    rows[:, index['equity']] = round_equities(history, equity_calculator)[rounds, seats]
+    rows[:, index['actions']] = action_array[history.event_actions[:n]]
+    rows[:, index['amount']] = amounts
+
+    won = history.payouts[seats] > 0
+    target_rows[:, 0] = np.where(won, amounts, -amounts)
+    target_rows[:, 1] = history.get_final_stacks()[seats]
+
+    return features, targets
 
 
 """
 _summary_ : Transform the game data.
 _description_ : This method is used to transform the game data.
 _attributes_ :
-    - game : Game of poker.
-    - winners : Winners of the game.
-_returns_ : Game data.
+    - game : Game of poker, once played.
+_returns_ : Features and targets of the game (see extract_features).
 """
 
 
-def preprocess_game_data(game: PokerGame, winners: [Player]) -> dict:
-    data = add_reward(game, winners)
-    data, rewards = extract_all_actions(data)
-
-    return data, rewards
-
-
-def prepare_input(preprocessed_data: dict) -> torch.tensor:
-    rounds = torch.tensor(preprocessed_data['rounds'], dtype=torch.float)
-    big_blind = torch.tensor(preprocessed_data['big_blind'], dtype=torch.float)
-    small_blind = torch.tensor(
-        preprocessed_data['small_blind'], dtype=torch.float)
-    pot = torch.tensor(preprocessed_data['pot'], dtype=torch.float)
-    community_cards_suit_0 = torch.tensor(
-        preprocessed_data['community_cards_suit_0'], dtype=torch.float)
-    community_cards_value_0 = torch.tensor(
-        preprocessed_data['community_cards_value_0'], dtype=torch.float)
-    community_cards_suit_1 = torch.tensor(
-        preprocessed_data['community_cards_suit_1'], dtype=torch.float)
-    community_cards_value_1 = torch.tensor(
-        preprocessed_data['community_cards_value_1'], dtype=torch.float)
-    community_cards_suit_2 = torch.tensor(
-        preprocessed_data['community_cards_suit_2'], dtype=torch.float)
-    community_cards_value_2 = torch.tensor(
-        preprocessed_data['community_cards_value_2'], dtype=torch.float)
-    community_cards_suit_3 = torch.tensor(
-        preprocessed_data['community_cards_suit_3'], dtype=torch.float)
-    community_cards_value_3 = torch.tensor(
-        preprocessed_data['community_cards_value_3'], dtype=torch.float)
-    community_cards_suit_4 = torch.tensor(
-        preprocessed_data['community_cards_suit_4'], dtype=torch.float)
-    community_cards_value_4 = torch.tensor(
-        preprocessed_data['community_cards_value_4'], dtype=torch.float)
-    community_cards_suit_5 = torch.tensor(
-        preprocessed_data['community_cards_suit_5'], dtype=torch.float)
-    community_cards_value_5 = torch.tensor(
-        preprocessed_data['community_cards_value_5'], dtype=torch.float)
-    num_players = torch.tensor(
-        preprocessed_data['num_players'], dtype=torch.float)
-    own_stack = torch.tensor(preprocessed_data['own_stack'], dtype=torch.float)
-    own_cards_suit_0 = torch.tensor(
-        preprocessed_data['own_cards_suit_0'], dtype=torch.float)
-    own_cards_value_0 = torch.tensor(
-        preprocessed_data['own_cards_value_0'], dtype=torch.float)
-    own_cards_suit_1 = torch.tensor(
-        preprocessed_data['own_cards_suit_1'], dtype=torch.float)
-    own_cards_value_1 = torch.tensor(
-        preprocessed_data['own_cards_value_1'], dtype=torch.float)
-    # opponent_stacks = torch.tensor(
-    #     preprocessed_data['opponent_stacks'], dtype=torch.float)
-    actions = torch.tensor(preprocessed_data['actions'], dtype=torch.float)
-    amount = torch.tensor(preprocessed_data['amount'], dtype=torch.float)
-
-    print(len(rounds))
-
-    input_data = torch.stack((rounds, big_blind, small_blind, pot, community_cards_suit_0, community_cards_value_0, community_cards_suit_1, community_cards_value_1, community_cards_suit_2, community_cards_value_2, community_cards_suit_3,
-                             community_cards_value_3, community_cards_suit_4, community_cards_value_4, community_cards_suit_5, community_cards_value_5, num_players, own_stack, own_cards_suit_0, own_cards_value_0, own_cards_suit_1, own_cards_value_1, actions, amount), dim=1)
-
-    return input_data
+def preprocess_game_data(game: PokerGame) -> (torch.tensor, torch.tensor):
+    metrics = Metrics.active
+    if metrics is None:
+        return extract_features(game.history)
+
+    start = time.perf_counter_ns()
+    features, targets = extract_features(game.history)
+    metrics.add_time('features', time.perf_counter_ns() - start)
+    metrics.count('feature_rows', len(features))
+    return features, targets
+
+
+"""
+_summary_ : Get the features as columns.
+_description_ : This method is used to get the features of a game as rows of the 'features' table of a ColumnStore.
+_attributes_ :
+    - hand_id : Id of the hand.
+    - features : Features of the game.
+    - targets : Targets of the game.
+_returns_ : Dictionary of table name to columns.
+"""
+
+
+def features_to_columns(hand_id: int, features: torch.tensor, targets: torch.tensor) -> dict:
+    return {
+        'features': {
+            'hand_id': np.full(len(features), hand_id, dtype=np.int64),
+            'features': features.numpy(),
+            'targets': targets.numpy(),
+        }
+    }
@@ -0,0 +1,969 @@
+# Description: This file contains the tests of the project.
+# Author: Maxime Cornaton
+# Date: 2023
+
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import urllib.request
+from collections import Counter
+from itertools import combinations
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import numpy as np
+import torch
+
+from agent.cAgent import Agent
+from agent.cCFRTrainer import NUM_ACTIONS, CFRTrainer, run_worker
+from agent.cInferenceBatcher import InferenceBatcher
+from agent.cReplayBuffer import ReplayBuffer
+from environment.cCardAbstraction import NO_BUCKET, CardAbstraction
+from environment.cDealer import Dealer
+from environment.cEquityCalculator import EquityCalculator
+from environment.cHandEvaluator import HandEvaluator
+from environment.cHandIndexer import HandIndexer
+from environment.cHistory import ACTION_CODES
+from environment.cLookupTables import LookupTables
+from environment.cPlayer import Player
+from environment.cPokerGame import PokerGame
+from environment.cPokerTournament import PokerTournament
+from environment.cPreflopEquityTable import PreflopEquityTable
+from environment.cRange import Range
+from environment.cShowdown import Showdown
+from environment.cVectorPokerGame import VectorPokerGame
+from environment.ePlayerAction import PlayerAction
+from model.cFeatureSchema import FEATURE_SCHEMA
+from utils.cAsyncWriter import AsyncWriter
+from utils.cColumnStore import ColumnStore
+from utils.cMetrics import Metrics, MetricsExporter, SamplingProfiler
+from utils.cards import CARD_BIT_ARRAY
+from utils.preprocessing import add_reward, card_value_array, extract_features
+
+
+class RandomPlayer(Player):
+
+    """
+    _summary_ : Player choosing random legal actions, recording them.
+    """
+
+    def __init__(self, rng: np.random.Generator, decisions: list, **kwargs) -> None:
+        super().__init__(agent=None, **kwargs)
+        self.rng = rng
+        self.decisions = decisions
+
+    def make_decision(self, env, to_call: int, action_mask: list) -> (PlayerAction, int):
+        action = list(PlayerAction)[self.rng.choice(np.flatnonzero(action_mask))]
+        amount = int(self.rng.integers(0, 2 * (env.pot + to_call) + 1))
+        self.decisions.append((ACTION_CODES[action], amount, list(action_mask)))
+        return action, amount
+
+
+"""
+_summary_ : Play a random hand.
+_description_ : This method is used to play one hand of random legal actions on a new game.
+_attributes_ :
+    - num_players : Number of players.
+    - seed : Seed of the deal and of the actions.
+    - game_type : Variant played.
+_returns_ : Game, decisions (action code, amount, action mask) and chips of each seat before the hand.
+"""
+
+
+def play_random_hand(num_players: int, seed: int, game_type: str = "Texas Hold'em", chips: list = None) -> tuple:
+    rng = np.random.default_rng(seed)
+    decisions = []
+    chips = chips or [1000] * num_players
+    game = PokerGame(num_players=num_players, small_blind=5, big_blind=10, max_rounds=4, seed=seed,
+                     game_type=game_type)
+    game.init(agent=None, players=[RandomPlayer(rng, decisions, chips=stack) for stack in chips])
+    game.play()
+    return game, decisions, chips
+
+
+"""
+_summary_ : Rank 5 cards.
+_description_ : This method is used to get a comparable key of a 5-card hand, written from the rules
+    without any table : category first, then the ranks of the groups by size and rank.
+_attributes_ :
+    - cards : 5 card ints.
+_returns_ : Key of the hand, greater for a better hand.
+"""
+
+
+def rank_five(cards: tuple) -> tuple:
+    ranks = sorted((card % 13 for card in cards), reverse=True)
+    flush = len({card // 13 for card in cards}) == 1
+    straight_high = None
+    if len(set(ranks)) == 5:
+        if ranks[0] - ranks[4] == 4:
+            straight_high = ranks[0]
+        elif ranks == [12, 3, 2, 1, 0]:
+            straight_high = 3
+    groups = sorted(Counter(ranks).items(), key=lambda group: (group[1], group[0]), reverse=True)
+    counts = [count for _, count in groups]
+    kickers = tuple(rank for rank, _ in groups)
+
+    if straight_high is not None and flush:
+        return 8, (straight_high,)
+    if counts[0] == 4:
+        return 7, kickers
+    if counts == [3, 2]:
+        return 6, kickers
+    if flush:
+        return 5, kickers
+    if straight_high is not None:
+        return 4, (straight_high,)
+    if counts[0] == 3:
+        return 3, kickers
+    if counts[:2] == [2, 2]:
+        return 2, kickers
+    if counts[0] == 2:
+        return 1, kickers
+    return 0, kickers
+
+
+"""
+_summary_ : Rank the best 5 cards of a hand.
+_description_ : This method is used to get the key of the best 5-card hand by trying all of them.
+_attributes_ :
+    - cards : 5 to 7 card ints.
+_returns_ : Key of the best hand (see rank_five).
+"""
+
+
+def best_of_five(cards: list) -> tuple:
+    return max(rank_five(five) for five in combinations(cards, 5))
+
+
+class TestHandEvaluator(unittest.TestCase):
+
+    """
+    _summary_ : Tests of the lookup evaluator against the best of 5 cards.
+    _description_ : Two hands compare the same way with the strengths and with the brute-force keys.
+    """
+
+    def check_order(self, keys: list, strengths: list) -> None:
+        order = sorted(range(len(keys)), key=lambda i: keys[i])
+        for previous, current in zip(order, order[1:]):
+            if keys[previous] == keys[current]:
+                self.assertEqual(strengths[previous], strengths[current])
+            else:
+                self.assertLess(strengths[previous], strengths[current])
+
+    def test_lookup_order(self) -> None:
+        rng = np.random.default_rng(0)
+        hand_evaluator = HandEvaluator()
+        cards = np.array([rng.choice(52, 7, replace=False) for _ in range(3000)])
+        # Hands of each category, which random deals rarely give
+        cards[:13] = [[rank, 13 + rank, 26 + rank, 39 + rank, (rank + 1) % 13, (rank + 2) % 13, 13 + (rank + 1) % 13]
+                      for rank in range(13)]
+        cards[13:23] = [[(high - i) % 13 for i in range(5)] + [20, 33] for high in range(3, 13)]
+        cards[23:33] = [[13 * (i % 2) + (high - i) % 13 for i in range(5)] + [46, 33] for high in range(3, 13)]
+
+        keys = [best_of_five(hand) for hand in cards.tolist()]
+        strengths = [hand_evaluator.evaluate_hand(hand[:2], hand[2:]) for hand in cards.tolist()]
+        self.check_order(keys, strengths)
+
+        self.assertEqual(hand_evaluator.evaluate_batch(cards[:, :2], cards[:, 2:]).tolist(), strengths)
+        masks = CARD_BIT_ARRAY[cards].sum(axis=1)
+        self.assertEqual(hand_evaluator.evaluate_mask_batch(masks).tolist(), strengths)
+
+    def test_board_sizes(self) -> None:
+        rng = np.random.default_rng(1)
+        hand_evaluator = HandEvaluator()
+        for size in (5, 6):
+            cards = np.array([rng.choice(52, size, replace=False) for _ in range(1000)])
+            keys = [best_of_five(hand) for hand in cards.tolist()]
+            strengths = hand_evaluator.evaluate_batch(cards[:, :2], cards[:, 2:]).tolist()
+            self.check_order(keys, strengths)
+
+    def test_cached_tables(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            built = LookupTables(directory)
+            loaded = LookupTables(directory)
+            self.assertIsInstance(loaded.rank_keys, np.memmap)
+            for name in LookupTables.ARRAYS:
+                self.assertTrue(np.array_equal(getattr(built, name), getattr(loaded, name)))
+            self.assertEqual(built.rank, loaded.rank)
+            self.assertEqual(built.flush, loaded.flush)
+
+
+class TestInferenceBatcher(unittest.TestCase):
+
+    """
+    _summary_ : Tests of the inference batcher.
+    _description_ : Rows submitted from many threads are answered by batches of at most max_batch_size rows,
+        a batch that does not fill is sent after max_latency, and the statistics cover every row.
+    """
+
+    def make_batcher(self, max_batch_size: int, max_latency: float) -> (InferenceBatcher, list):
+        agent = Agent(hidden_size=16, output_size=3, learning_rate=0.001)
+        batch_sizes = []
+        predict = agent.predict
+
+        def recorded_predict(features) -> np.ndarray:
+            batch_sizes.append(len(features))
+            return predict(features)
+
+        agent.predict = recorded_predict
+        return InferenceBatcher(agent, max_batch_size=max_batch_size, max_latency=max_latency), batch_sizes
+
+    def test_threads(self) -> None:
+        batcher, batch_sizes = self.make_batcher(max_batch_size=8, max_latency=0.01)
+        rng = np.random.default_rng(0)
+        rows = rng.random((16, 50, FEATURE_SCHEMA.size), dtype=np.float32)
+        expected = batcher.agent.model(torch.as_tensor(rows.reshape(-1, FEATURE_SCHEMA.size))).detach().numpy()
+        outputs = np.zeros((16, 50, 3), dtype=np.float32)
+
+        def seat(i: int) -> None:
+            for j in range(50):
+                outputs[i, j] = batcher.predict(rows[i, j])
+
+        batcher.start()
+        threads = [threading.Thread(target=seat, args=(i,)) for i in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        batcher.stop()
+
+        self.assertTrue(np.allclose(outputs.reshape(-1, 3), expected, atol=1e-5))
+        self.assertEqual(sum(batch_sizes), 16 * 50)
+        self.assertLessEqual(max(batch_sizes), 8)
+        # Concurrent seats share forward passes
+        self.assertGreater(max(batch_sizes), 1)
+
+        stats = batcher.get_stats()
+        self.assertEqual(stats['requests'], 16 * 50)
+        self.assertEqual(stats['batches'], len(batch_sizes))
+        self.assertAlmostEqual(stats['mean_batch_size'], 16 * 50 / len(batch_sizes))
+        self.assertGreater(stats['throughput'], 0)
+        self.assertEqual(len(batcher.latencies), 16 * 50)
+        self.assertTrue(0 < stats['latency_p50'] <= stats['latency_p90'] <= stats['latency_p99'])
+
+    def test_max_latency(self) -> None:
+        # A lone row waits for the batch to fill until max_latency
+        batcher, batch_sizes = self.make_batcher(max_batch_size=64, max_latency=0.05)
+        batcher.start()
+        batcher.predict(np.zeros(FEATURE_SCHEMA.size, dtype=np.float32))
+        self.assertEqual(batch_sizes, [1])
+        self.assertGreaterEqual(batcher.get_stats()['latency_p50'], 0.05)
+
+        # A full batch is sent without waiting
+        start = time.perf_counter()
+        batcher.max_latency = 10.0
+        futures = [batcher.submit(np.zeros(FEATURE_SCHEMA.size, dtype=np.float32)) for _ in range(64)]
+        for future in futures:
+            future.result(timeout=5)
+        batcher.stop()
+        self.assertLess(time.perf_counter() - start, 5)
+        self.assertEqual(batch_sizes[1:], [64])
+
+
+class TestReplayBuffer(unittest.TestCase):
+
+    """
+    _summary_ : Tests of the replay buffer.
+    _description_ : The ring keeps the last capacity rows in place, and prioritized sampling follows the
+        priorities.
+    """
+
+    def test_ring_wrap(self) -> None:
+        replay_buffer = ReplayBuffer(capacity=10, feature_size=3, seed=0)
+        rows = torch.arange(25, dtype=torch.float32)
+        storage = replay_buffer.features.data_ptr()
+        for (start, end), position in zip(((0, 4), (4, 12), (12, 25)), (4, 2, 2)):
+            features = rows[start:end, None].repeat(1, 3)
+            replay_buffer.append(features, features[:, :2])
+            self.assertEqual(len(replay_buffer), min(end, 10))
+            self.assertEqual(replay_buffer.position, position)
+
+        # A trajectory larger than the buffer keeps its last rows (15 to 24), written from the position on
+        self.assertEqual(replay_buffer.features.data_ptr(), storage)
+        self.assertEqual(replay_buffer.features[:, 0].tolist(), [23, 24, 15, 16, 17, 18, 19, 20, 21, 22])
+        replay_buffer.append(torch.full((3, 3), 25.0), torch.zeros(3, 2))
+        self.assertEqual(replay_buffer.features[:, 0].tolist(), [23, 24, 25, 25, 25, 18, 19, 20, 21, 22])
+        features, targets, indices, weights = replay_buffer.sample(64)
+        self.assertIsNone(weights)
+        self.assertTrue(((features[:, 0] >= 18) & (features[:, 0] <= 25)).all())
+        self.assertTrue(torch.equal(features[:, 0], replay_buffer.features[indices, 0]))
+
+    def test_priorities(self) -> None:
+        replay_buffer = ReplayBuffer(capacity=8, feature_size=1, alpha=1.0, beta=1.0, seed=0)
+        replay_buffer.append(torch.arange(8, dtype=torch.float32)[:, None], torch.zeros(8, 2))
+        replay_buffer.update_priorities(torch.arange(8), torch.tensor([1.0] * 7 + [9.0]))
+
+        _, _, indices, weights = replay_buffer.sample(20000, prioritized=True)
+        # Row 7 holds 9 of the 16 priority units
+        self.assertAlmostEqual((indices == 7).float().mean().item(), 9 / 16, delta=0.02)
+        # Importance-sampling weights undo the priorities, the largest being 1
+        self.assertAlmostEqual(weights.max().item(), 1.0)
+        self.assertTrue(torch.allclose(weights[indices == 7], torch.tensor(1 / 9)))
+
+        # New rows get the highest priority seen so far
+        replay_buffer.append(torch.zeros(1, 1), torch.zeros(1, 2))
+        self.assertEqual(replay_buffer.priorities[0].item(), 9.0)
+
+
+class TestDealer(unittest.TestCase):
+
+    """
+    _summary_ : Tests of the dealer.
+    _description_ : Deals are distinct uniform cards, reproducible from a seed, independent between spawned
+        dealers, and never use the global random state.
+    """
+
+    def test_deals(self) -> None:
+        random_state, numpy_state = random.getstate(), np.random.get_state()[1].copy()
+        dealer = Dealer(0)
+        counts = np.zeros((17, 52))
+        for _ in range(5200):
+            cards = dealer.deal(17)
+            self.assertEqual(len(set(cards)), 17)
+            counts[np.arange(17), cards] += 1
+        # Every card about 100 times at every position
+        self.assertLess(np.abs(counts - 100).max(), 50)
+
+        batch = dealer.deal_batch(5200, 17)
+        self.assertTrue((np.sort(batch, axis=1)[:, 1:] != np.sort(batch, axis=1)[:, :-1]).all())
+        self.assertLess(np.abs(np.apply_along_axis(np.bincount, 0, batch, minlength=52) - 100).max(), 50)
+
+        deck = np.array([3, 7, 11, 19, 23, 42])
+        self.assertTrue(np.isin(dealer.deal_batch(100, 4, deck), deck).all())
+
+        self.assertEqual(random.getstate(), random_state)
+        self.assertTrue(np.array_equal(np.random.get_state()[1], numpy_state))
+
+    def test_streams(self) -> None:
+        self.assertEqual(Dealer(1).deal(9), Dealer(1).deal(9))
+        self.assertTrue(np.array_equal(Dealer(1).deal_batch(10, 9), Dealer(1).deal_batch(10, 9)))
+
+        first, second = Dealer.spawn(1, 2)
+        self.assertNotEqual([first.deal(9) for _ in range(5)], [second.deal(9) for _ in range(5)])
+        self.assertEqual([dealer.deal(9) for dealer in Dealer.spawn(1, 2)],
+                         [dealer.deal(9) for dealer in Dealer.spawn(1, 2)])
+
+        # A game deals the same hands from the same seed
+        self.assertEqual([player.hand for player in play_random_hand(4, 3)[0].seats],
+                         [player.hand for player in play_random_hand(4, 3)[0].seats])
+
+
+class TestHandIndexer(unittest.TestCase):
+
+    """
+    _summary_ : Tests of the hand indexer.
+    _description_ : Indexes go back to a hand of the same index, and do not change when the suits are
+        permuted or the cards of a round reordered.
+    """
+
+    def test_round_trip(self) -> None:
+        rng = np.random.default_rng(0)
+        for cards_per_round in ([2], [2, 3], [2, 3, 1], [2, 3, 1, 1], [2, 4]):
+            indexer = HandIndexer.get(cards_per_round)
+            for index in rng.integers(0, indexer.size, 300).tolist():
+                rounds = indexer.unindex(index)
+                self.assertEqual([len(cards) for cards in rounds], cards_per_round)
+                self.assertEqual(indexer.index(rounds), index)
+
+    def test_suit_invariance(self) -> None:
+        rng = np.random.default_rng(1)
+        for cards_per_round in ([2], [2, 3], [2, 3, 1], [2, 3, 1, 1]):
+            indexer = HandIndexer.get(cards_per_round)
+            bounds = np.cumsum([0] + cards_per_round)
+            hands = np.array([rng.choice(52, bounds[-1], replace=False) for _ in range(300)])
+            indexes = indexer.index_batch(hands)
+            for hand, index in zip(hands.tolist(), indexes.tolist()):
+                rounds = [hand[bounds[r]:bounds[r + 1]] for r in range(len(cards_per_round))]
+                self.assertEqual(indexer.index(rounds), index)
+
+                permutation = rng.permutation(4).tolist()
+                permuted = [[permutation[card // 13] * 13 + card % 13 for card in reversed(cards)]
+                            for cards in rounds]
+                self.assertEqual(indexer.index(permuted), index)
+
+
+class TestEquityCalculator(unittest.TestCase):
+
+    """
+    _summary_ : Tests of the equity calculator.
+    _description_ : The sampled equities converge to the enumerated ones, and the equity features and rewards
+        are filled for every action.
+    """
+
+    def test_exhaustive_matches_sampled(self) -> None:
+        rng = np.random.default_rng(0)
+        exhaustive = EquityCalculator()
+        sampled = EquityCalculator(num_samples=20000, exhaustive_limit=0, seed=0)
+        for board_size, num_opponents in ((4, 1), (5, 1), (5, 2)):
+            for _ in range(3):
+                cards = rng.choice(52, 2 + board_size, replace=False).tolist()
+                expected = exhaustive.equity(cards[:2], cards[2:], num_opponents)
+                # Every deal enumerated, without sampling
+                self.assertLessEqual(exhaustive.samples,
+                                     exhaustive.exhaustive_size(50 - board_size, 5 - board_size, num_opponents))
+                self.assertAlmostEqual(sampled.equity(cards[:2], cards[2:], num_opponents), expected, delta=0.015)
+                self.assertEqual(sampled.samples, 20000)
+
+    def test_lone_player(self) -> None:
+        equity_calculator = EquityCalculator(num_samples=100, seed=0)
+        for seed in range(50):
+            game, _, _ = play_random_hand(3, seed)
+            player = game.seats[0]
+            if game.num_live == 1:
+                self.assertEqual(equity_calculator.equity_from_game(game, player), 1.0)
+            else:
+                self.assertTrue(0.0 <= equity_calculator.equity_from_game(game, player) <= 1.0)
+
+    def test_equity_rewards(self) -> None:
+        for seed in range(30):
+            game, _, _ = play_random_hand(2 + seed % 5, seed)
+            features, _ = extract_features(game.history)
+            equities = features[:, FEATURE_SCHEMA.index['equity']]
+            self.assertTrue(((equities >= 0) & (equities <= 1)).all())
+
+            events = [event for round in add_reward(game) for event in round['events']]
+            self.assertEqual(len(events), len(features))
+            for event in events:
+                if event['action'] is PlayerAction.FOLD:
+                    self.assertEqual(event['ev_rewards'], 0.0)
+                else:
+                    self.assertGreaterEqual(event['ev_rewards'] + event['amount'], 0.0)
+
+
+class TestPreflopEquityTable(unittest.TestCase):
+
+    """
+    _summary_ : Tests of the preflop equity table.
+    _description_ : The values match the known heads-up equities and the calculator, and a player left alone
+        in the hand wins the pot.
+    """
+
+    def test_values(self) -> None:
+        table = PreflopEquityTable.get()
+        self.assertEqual(table.table.shape, (PreflopEquityTable.NUM_HANDS, 8))
+        # Aces, ace-king suited and seven-deuce offsuit heads-up
+        self.assertAlmostEqual(table.lookup([12, 25], 2), 0.852, delta=0.01)
+        self.assertAlmostEqual(table.lookup([12, 11], 2), 0.670, delta=0.01)
+        self.assertAlmostEqual(table.lookup([5, 13], 2), 0.346, delta=0.01)
+        # Less equity against more players
+        self.assertTrue((np.diff(table.table, axis=1) < 0).all())
+
+        equity_calculator = EquityCalculator(num_samples=20000, seed=1)
+        rng = np.random.default_rng(0)
+        for _ in range(5):
+            hand = rng.choice(52, 2, replace=False).tolist()
+            num_players = int(rng.integers(2, 7))
+            # Same canonical hand with the suits permuted
+            permuted = [(card + 13) % 52 for card in hand]
+            self.assertEqual(table.lookup(hand, num_players), table.lookup(permuted, num_players))
+            self.assertAlmostEqual(table.lookup(hand, num_players),
+                                   equity_calculator.equity(hand, [], num_players - 1), delta=0.015)
+
+    def test_lone_player(self) -> None:
+        table = PreflopEquityTable.get()
+        for seed in range(50):
+            game, _, _ = play_random_hand(3, seed)
+            player = game.seats[0]
+            if game.num_live == 1:
+                self.assertEqual(table.lookup_game(game, player), 1.0)
+            else:
+                self.assertEqual(table.lookup_game(game, player), table.lookup(player.hand, game.num_live))
+
+
+class TestRange(unittest.TestCase):
+
+    """
+    _summary_ : Tests of the range equities against enumeration.
+    _description_ : Every pair of combos and every runout are played with the brute-force ranking.
+    """
+
+    def enumerate_equity(self, hero: dict, villain: dict, board: list) -> float:
+        wins = 0.0
+        total = 0.0
+        for hero_hand, hero_weight in hero.items():
+            for villain_hand, villain_weight in villain.items():
+                used = set(hero_hand) | set(villain_hand) | set(board)
+                if len(used) < 4 + len(board):
+                    continue
+                for runout in combinations([card for card in range(52) if card not in used], 5 - len(board)):
+                    full_board = board + list(runout)
+                    hero_key = best_of_five(list(hero_hand) + full_board)
+                    villain_key = best_of_five(list(villain_hand) + full_board)
+                    weight = hero_weight * villain_weight
+                    wins += weight * ((hero_key > villain_key) + 0.5 * (hero_key == villain_key))
+                    total += weight
+        return wins / total
+
+    def test_equity(self) -> None:
+        rng = np.random.default_rng(0)
+        for _ in range(5):
+            cards = rng.choice(52, 14, replace=False).tolist()
+            board = cards[:4]
+            hero = {(cards[4], cards[5]): 1.0, (cards[6], cards[7]): 0.5, (cards[4], cards[8]): 2.0}
+            villain = {(cards[9], cards[10]): 1.0, (cards[11], cards[12]): 0.25, (cards[8], cards[13]): 1.0}
+
+            hero_range = Range()
+            for hand, weight in hero.items():
+                hero_range.set(list(hand), weight)
+            villain_range = Range()
+            for hand, weight in villain.items():
+                villain_range.set(list(hand), weight)
+
+            self.assertAlmostEqual(hero_range.equity(villain_range, board),
+                                   self.enumerate_equity(hero, villain, board))
+            hand = list(next(iter(villain)))
+            self.assertAlmostEqual(hero_range.equity_vs_hand(hand, board),
+                                   self.enumerate_equity({tuple(hand): 1.0}, hero, board))
+
+
+
+class TestCardAbstraction(unittest.TestCase):
+
+    """
+    _summary_ : Tests of the build of the card abstraction.
+    _description_ : A stopped build resumes from the chunks it saved, and gives the same buckets.
+    """
+
+    def test_resume(self) -> None:
+        settings = dict(streets=['flop'], num_buckets=3, num_bins=4, num_workers=1, chunk_size=2, max_runouts=10,
+                        max_boards=4)
+        with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(io.StringIO()):
+            CardAbstraction.build(directory, seed=0, **settings)
+            checkpoints = os.path.join(directory, 'checkpoints', 'flop', 'bins4-runouts10-seed0')
+            kept, removed = [os.path.join(checkpoints, name) for name in ('000000-000002.npz', '000002-000004.npz')]
+            buckets = np.load(os.path.join(directory, 'flop_buckets.npy'))
+            built = buckets[buckets != NO_BUCKET]
+            self.assertGreater(len(built), 0)
+            self.assertTrue((built < 3).all())
+            modified = os.stat(kept).st_mtime_ns
+
+            # Stopped after the first chunk : only the second one is built again
+            os.remove(removed)
+            CardAbstraction.build(directory, seed=0, **settings)
+            self.assertEqual(os.stat(kept).st_mtime_ns, modified)
+            self.assertTrue(os.path.exists(removed))
+            np.testing.assert_array_equal(np.load(os.path.join(directory, 'flop_buckets.npy')), buckets)
+
+            # Other settings never resume from these chunks
+            CardAbstraction.build(directory, seed=1, **settings)
+            self.assertEqual(sorted(os.listdir(os.path.join(directory, 'checkpoints', 'flop'))),
+                             ['bins4-runouts10-seed0', 'bins4-runouts10-seed1'])
+            self.assertEqual(os.stat(kept).st_mtime_ns, modified)
+
+
+class TestCFRTrainer(unittest.TestCase):
+
+    """
+    _summary_ : Tests of the persistence and the workers of the CFR trainer.
+    _description_ : A checkpoint gives back the same tables, and the tables trained by several workers are the
+        sums of the changes of each worker.
+    """
+
+    CONFIG = dict(num_players=2, small_blind=5, big_blind=10, max_rounds=2, chips=100)
+
+    def test_checkpoint(self) -> None:
+        trainer = CFRTrainer(**self.CONFIG, seed=0)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cfr', 'checkpoint.npz')
+            trainer.train(20, checkpoint_path=path, checkpoint_every=8)
+            self.assertEqual(os.listdir(os.path.dirname(path)), ['checkpoint.npz'])
+
+            resumed = CFRTrainer(**self.CONFIG, seed=1)
+            resumed.load(path)
+            self.assertEqual(resumed.iteration, 20)
+            self.assertEqual(resumed.infosets, trainer.infosets)
+            num_infosets = trainer.num_infosets
+            np.testing.assert_array_equal(resumed.regrets[:num_infosets], trainer.regrets[:num_infosets])
+            np.testing.assert_array_equal(resumed.strategy_sums[:num_infosets], trainer.strategy_sums[:num_infosets])
+            key = next(iter(trainer.infosets))
+            np.testing.assert_array_equal(resumed.average_strategy(key), trainer.average_strategy(key))
+
+            # Training goes on from the checkpoint
+            resumed.train(5)
+            self.assertEqual(resumed.iteration, 25)
+            self.assertGreaterEqual(resumed.num_infosets, num_infosets)
+
+            other = CFRTrainer(**{**self.CONFIG, 'chips': 200}, seed=0)
+            with self.assertRaises(ValueError):
+                other.load(path)
+
+    def test_workers(self) -> None:
+        trainer = CFRTrainer(**self.CONFIG, seed=0)
+        trainer.train(10, num_workers=2, batch_size=5)
+        self.assertEqual(trainer.iteration, 10)
+
+        # The same batch run in this process : each worker starts from empty tables
+        replay = CFRTrainer(**self.CONFIG, seed=0)
+        regrets, strategy_sums, nodes = {}, {}, 0
+        empty = ([], np.zeros((0, NUM_ACTIONS), np.float32), np.zeros((0, NUM_ACTIONS), np.float32))
+        for seed in replay.seed_sequence.spawn(2):
+            keys, regret_changes, strategy_changes, worker_nodes = run_worker((replay.config, empty, seed, 5))
+            for key, regret, strategy in zip(keys, regret_changes, strategy_changes):
+                regrets[key] = regrets.get(key, 0) + regret
+                strategy_sums[key] = strategy_sums.get(key, 0) + strategy
+            nodes += worker_nodes
+
+        self.assertEqual(set(trainer.infosets), set(regrets))
+        self.assertEqual(trainer.nodes, nodes)
+        for key, row in trainer.infosets.items():
+            np.testing.assert_allclose(trainer.regrets[row], regrets[key], rtol=1e-6)
+            np.testing.assert_allclose(trainer.strategy_sums[row], strategy_sums[key], rtol=1e-6)
+
+
+class TestShowdown(unittest.TestCase):
+
+    """
+    _summary_ : Tests of the side pots against a naive split.
+    _description_ : The naive split builds every pot from the bottom, then gives them out from the top.
+    """
+
+    def naive_split(self, strengths: list, contributions: list, live: list) -> list:
+        num_players = len(contributions)
+        remaining = list(contributions)
+        pots = []
+        while any(remaining):
+            level = min(chips for chips in remaining if chips > 0)
+            contributors = [seat for seat in range(num_players) if remaining[seat] > 0]
+            pots.append((level * len(contributors), [seat for seat in contributors if live[seat]]))
+            for seat in contributors:
+                remaining[seat] -= level
+
+        payouts = [0] * num_players
+        carry = 0
+        for pot, eligible in reversed(pots):
+            pot += carry
+            if not eligible:
+                carry = pot
+                continue
+            carry = 0
+            best = max(strengths[seat] for seat in eligible)
+            winners = [seat for seat in eligible if strengths[seat] == best]
+            for i, seat in enumerate(winners):
+                payouts[seat] += pot // len(winners) + (1 if i < pot % len(winners) else 0)
+        return list(contributions) if carry else payouts
+
+    def test_side_pots(self) -> None:
+        rng = np.random.default_rng(0)
+        for _ in range(3000):
+            num_players = int(rng.integers(2, 10))
+            strengths = rng.integers(0, 4, num_players).tolist()
+            contributions = rng.choice([0, 5, 10, 50, 75, 200], num_players).tolist()
+            live = (rng.random(num_players) < 0.7).tolist()
+
+            payouts = Showdown.resolve(strengths, contributions, live)
+            self.assertEqual(payouts, self.naive_split(strengths, contributions, live))
+            self.assertEqual(sum(payouts), sum(contributions))
+            if any(is_live and chips > 0 for is_live, chips in zip(live, contributions)):
+                self.assertFalse(any(payout for payout, is_live in zip(payouts, live) if not is_live))
+
+
+class TestPokerGame(unittest.TestCase):
+
+    """
+    _summary_ : Tests of the betting rules.
+    _description_ : The chips of random legal play are only moved between the players, and an all-in for less
+        than a full raise does not reopen the betting.
+    """
+
+    def check_conservation(self, game_type: str) -> None:
+        for table in range(20):
+            num_players = 2 + table % 5
+            chips = [1000] * num_players
+            for hand in range(15):
+                game, _, chips = play_random_hand(num_players, 1000 * table + hand, game_type, chips)
+                stacks = [player.chips for player in game.seats]
+                self.assertEqual(sum(stacks), sum(chips))
+                self.assertTrue(all(stack >= 0 for stack in stacks))
+                # Busted players buy in again
+                chips = [stack if stack >= 10 else 1000 for stack in stacks]
+
+    def test_holdem_conservation(self) -> None:
+        self.check_conservation("Texas Hold'em")
+
+    def test_omaha_conservation(self) -> None:
+        self.check_conservation("Omaha Poker")
+
+    def test_incomplete_all_in(self) -> None:
+        # The button raises to 30, the small blind goes all-in for 40 (a raise of 10, less than 20)
+        script = [(PlayerAction.RAISE, 30), (PlayerAction.ALL_IN, 0), (PlayerAction.CALL, 0), (PlayerAction.CALL, 0)]
+        masks = []
+
+        class ScriptedPlayer(Player):
+            def make_decision(self, env, to_call: int, action_mask: list) -> (PlayerAction, int):
+                masks.append((self.seat, list(action_mask)))
+                return script[len(masks) - 1]
+
+        game = PokerGame(num_players=3, small_blind=5, big_blind=10, max_rounds=4, seed=0)
+        game.init(agent=None, players=[ScriptedPlayer(agent=None, chips=chips) for chips in (40, 1000, 1000)])
+        game.deal_cards()
+        game.play_round(0)
+
+        self.assertEqual([seat for seat, _ in masks], [2, 0, 1, 2])
+        self.assertEqual(game.bets, [40, 40, 40])
+        # The big blind had not acted : it may still raise
+        self.assertTrue(masks[2][1][ACTION_CODES[PlayerAction.RAISE]])
+        # The button only calls the 10 more or folds
+        self.assertEqual(masks[3][1], [True, False, True, False, False, False])
+
+
+class TestVectorPokerGame(unittest.TestCase):
+
+    """
+    _summary_ : Tests of the vector game against PokerGame.
+    _description_ : The same deal and actions give the same legal actions and the same results.
+    """
+
+    def test_parity(self) -> None:
+        for seed in range(300):
+            num_players = 2 + seed % 5
+            game, decisions, chips = play_random_hand(num_players, seed)
+
+            vector_game = VectorPokerGame(1, num_players, small_blind=5, big_blind=10, max_rounds=4, chips=1000)
+            vector_game.reset()
+            vector_game.hands[0] = [player.hand for player in game.seats]
+            vector_game.hand_masks[0] = [player.hand_mask for player in game.seats]
+            vector_game.deck_boards[0] = game.board_cards
+
+            vector_game.update_equities(vector_game.tables)
+
+            # Rows of extract_features, the action and the postflop equity apart
+            features, _ = extract_features(game.history)
+            compared = [i for name, i in FEATURE_SCHEMA.index.items() if name not in ('actions', 'amount', 'equity')]
+            for i, (action, amount, action_mask) in enumerate(decisions):
+                observation = vector_game.get_observations()[0]
+                self.assertEqual(observation[compared].tolist(), features[i, compared].tolist())
+                if features[i, FEATURE_SCHEMA.index['rounds']] == 0:
+                    self.assertEqual(observation[FEATURE_SCHEMA.index['equity']],
+                                     features[i, FEATURE_SCHEMA.index['equity']])
+                self.assertEqual(vector_game.get_action_masks()[0].tolist(), action_mask)
+                _, _, rewards, dones = vector_game.step([action], [amount])
+                self.assertEqual(bool(dones[0]), i == len(decisions) - 1)
+            expected = [player.chips - stack for player, stack in zip(game.seats, chips)]
+            self.assertEqual(rewards[0].tolist(), expected)
+
+    def test_button(self) -> None:
+        vector_game = VectorPokerGame(4, 3, small_blind=5, big_blind=10, max_rounds=4, chips=1000, seed=0)
+        for hand in range(4):
+            vector_game.reset()
+            self.assertEqual(vector_game.buttons.tolist(), [hand % 3] * 4)
+            self.assertEqual(vector_game.contributions[:, (hand + 1) % 3].tolist(), [10] * 4)
+
+    def test_agent(self) -> None:
+        agent = Agent(hidden_size=16, output_size=3, learning_rate=0.001)
+        rng = np.random.default_rng(0)
+        vector_game = VectorPokerGame(64, 6, small_blind=5, big_blind=10, max_rounds=4, chips=1000, seed=0)
+        observations, action_masks = vector_game.reset()
+        for _ in range(20):
+            # One forward pass for every table
+            values = agent.predict(observations)
+            self.assertEqual(values.shape, (64, 3))
+            self.assertTrue(np.isfinite(values).all())
+            actions = np.argmax(rng.random(action_masks.shape) * action_masks, axis=1)
+            observations, action_masks, _, _ = vector_game.step(actions)
+            self.assertEqual(observations.shape, (64, FEATURE_SCHEMA.size))
+
+
+class TestMetrics(unittest.TestCase):
+
+    """
+    _summary_ : Tests of the instrumentation.
+    _description_ : Enabled metrics count and time every hand, disabled ones are left untouched, the exporter
+        writes and serves the Prometheus text and the profiler samples the profiled thread.
+    """
+
+    def tearDown(self) -> None:
+        Metrics.disable()
+
+    def test_game_metrics(self) -> None:
+        metrics = Metrics.enable()
+        self.assertIs(Metrics.enable(), metrics)
+        games = [play_random_hand(4, seed)[0] for seed in range(5)]
+        self.assertEqual(metrics.counters['hands'], 5)
+        self.assertEqual(metrics.counters['decisions'], sum(game.history.num_events for game in games))
+        self.assertEqual(metrics.timers['decision'][0], metrics.counters['decisions'])
+        for name in ('deal', 'history', 'showdown'):
+            calls, total, longest = metrics.timers[name]
+            self.assertGreater(calls, 0)
+            self.assertTrue(0 <= longest <= total)
+
+        # Disabled, the hands are not recorded anymore
+        self.assertIs(Metrics.disable(), metrics)
+        snapshot = metrics.snapshot()
+        play_random_hand(4, 5)
+        self.assertEqual(metrics.snapshot()['counters'], snapshot['counters'])
+        self.assertIsNone(Metrics.disable())
+
+    def test_exporter(self) -> None:
+        metrics = Metrics()
+        metrics.count('hands', 3)
+        metrics.add_time('deal', 2000)
+        metrics.add_time('deal', 5000)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'metrics', 'run.prom')
+            with MetricsExporter(metrics, path=path, port=0, interval=0.01) as exporter:
+                port = exporter.server.server_address[1]
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+                    served = response.read().decode()
+                metrics.count('hands')
+            with open(path) as fp:
+                written = fp.read()
+
+        self.assertIn("poker_hands_total 3\n", served)
+        # close writes the final metrics
+        self.assertIn("poker_hands_total 4\n", written)
+        self.assertIn("poker_deal_seconds_count 2\n", written)
+        self.assertIn("poker_deal_seconds_sum 0.000007000\n", written)
+        self.assertIn("poker_deal_max_seconds 0.000005000\n", written)
+        self.assertFalse(os.path.exists(path + ".tmp"))
+
+    def test_profiler(self) -> None:
+        def busy_loop() -> int:
+            total = 0
+            deadline = time.perf_counter() + 0.2
+            while time.perf_counter() < deadline:
+                total += 1
+            return total
+
+        with SamplingProfiler(interval=0.001) as profiler:
+            busy_loop()
+        self.assertGreater(profiler.num_samples, 0)
+        # The frames of the test runner are in every sample too
+        shares = dict(profiler.top(num_functions=1000))
+        self.assertGreater(shares.get("TestSuite.py:busy_loop", 0.0), 0.5)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'profile.txt')
+            profiler.save(path)
+            with open(path) as fp:
+                lines = fp.read().splitlines()
+        self.assertEqual(sum(int(line.rsplit(" ", 1)[1]) for line in lines), profiler.num_samples)
+
+
+class TestColumnStore(unittest.TestCase):
+
+    """
+    _summary_ : Tests of the binary columnar store.
+    _description_ : Hand histories read back from the shards are the ones written, memory-mapped unless
+        compressed.
+    """
+
+    def test_round_trip(self) -> None:
+        hands = [play_random_hand(2 + seed % 5, seed)[0] for seed in range(40)]
+        for compress in (False, True):
+            with tempfile.TemporaryDirectory() as directory:
+                store = ColumnStore(directory, chunk_rows=50, compress=compress)
+                for hand_id, game in enumerate(hands):
+                    store.append_tables(game.history.to_columns(hand_id))
+                store.flush()
+
+                self.assertGreater(len(store.shard_names('events')), 1)
+                events = store.load('events')
+                seats = store.load('seats')
+                expected = [game.history.to_columns(hand_id) for hand_id, game in enumerate(hands)]
+                for name in events:
+                    self.assertTrue(np.array_equal(events[name],
+                                                   np.concatenate([columns['events'][name] for columns in expected])))
+                for name in seats:
+                    self.assertTrue(np.array_equal(seats[name],
+                                                   np.concatenate([columns['seats'][name] for columns in expected])))
+                shard = store.load_shards('hands')[0]
+                self.assertEqual(isinstance(shard['hand_id'], np.memmap), not compress)
+
+    def test_event_pots(self) -> None:
+        for seed in range(30):
+            game, decisions, _ = play_random_hand(2 + seed % 5, seed)
+            history = game.history
+            events = history.to_columns(0)['events']
+            # Blinds, then every chip put in by the actions so far
+            passive = [ACTION_CODES[PlayerAction.FOLD], ACTION_CODES[PlayerAction.CHECK]]
+            put = np.where(np.isin(events['action'], passive), 0, events['amount'])
+            self.assertEqual(events['pot'].tolist(), (history.posted.sum() + np.cumsum(put)).tolist())
+            if len(decisions):
+                self.assertEqual(events['pot'][-1], history.get_contributions().sum())
+
+
+class TestAsyncWriter(unittest.TestCase):
+
+    """
+    _summary_ : Tests of the background writer.
+    _description_ : Tables reach the disk after flush_interval while the writer is open, and every pending
+        table is written by close. Errors of the background thread are raised to the caller.
+    """
+
+    def test_flush(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            store = ColumnStore(directory, chunk_rows=1000)
+            writer = AsyncWriter(store, flush_interval=0.05)
+            writer.put({'rows': {'value': np.arange(10)}})
+            # Below chunk_rows : written on time
+            deadline = time.perf_counter() + 5
+            while not store.shard_names('rows') and time.perf_counter() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(store.load('rows')['value'].tolist(), list(range(10)))
+
+            writer.flush_interval = None
+            for i in range(1, 50):
+                writer.put({'rows': {'value': np.arange(10 * i, 10 * i + 10)}})
+            writer.close()
+            self.assertEqual(store.load('rows')['value'].tolist(), list(range(500)))
+            self.assertEqual(writer.get_stats()['puts'], 50)
+            self.assertGreater(writer.get_stats()['bytes_written'], 0)
+            with self.assertRaises(ValueError):
+                writer.put({'rows': {'value': np.arange(1)}})
+
+    def test_error(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            writer = AsyncWriter(ColumnStore(directory, chunk_rows=1), flush_interval=None)
+            writer.put({'rows': {'a': np.arange(2), 'b': np.arange(3)}})
+            with self.assertRaises(RuntimeError):
+                writer.close()
+
+
+class TestHistory(unittest.TestCase):
+
+    """
+    _summary_ : Tests of the history of a hand.
+    _description_ : The history is sized for the largest table and reused by smaller ones.
+    """
+
+    def test_short_table_export(self) -> None:
+        tournament = PokerTournament(num_tables=3, players_per_table=6, chips=200, seed=0)
+        short_tables = []
+
+        def callback(table) -> None:
+            history = table.history
+            if history.num_players < tournament.players_per_table:
+                short_tables.append(history.num_players)
+            stacks = history.get_round_stacks()
+            self.assertEqual(stacks.shape[1], history.num_players)
+            history.get()
+            history.export()
+            features, targets = extract_features(history)
+            self.assertEqual(len(features), history.num_events)
+
+        tournament.run(max_hands=200, callback=callback)
+        self.assertTrue(short_tables)
+
+    def test_hole_card_columns(self) -> None:
+        for game_type, num_hole_cards in (("Texas Hold'em", 2), ("Omaha Poker", 4)):
+            game, _, _ = play_random_hand(4, 0, game_type)
+            features, _ = extract_features(game.history)
+            seats = game.history.event_seats[:game.history.num_events]
+            for i in range(4):
+                values = features[:, FEATURE_SCHEMA.index[f'own_cards_value_{i}']].numpy()
+                if i < num_hole_cards:
+                    expected = [card_value_array[game.seats[seat].hand[i]] for seat in seats.tolist()]
+                    self.assertEqual(values.tolist(), expected)
+                else:
+                    self.assertTrue((values == -1).all())
+
+
+if __name__ == "__main__":
+    unittest.main()